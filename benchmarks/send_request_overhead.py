@@ -0,0 +1,92 @@
+"""
+    Micro-benchmark of the per-request overhead of `API.send_request`.
+
+    The session is stubbed out, so only the work done by instabot itself
+    (headers, cookie reads, `json_data`, signing, response parsing) is
+    timed. `legacy` re-implements the previous request path for comparison.
+
+    Usage:
+        python benchmarks/send_request_overhead.py [-n 20000]
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import timeit
+
+import requests.utils
+import six.moves.urllib as urllib
+
+sys.path.append(os.path.join(sys.path[0], '../'))
+from instabot.api import API, config  # noqa: E402
+
+
+class FakeResponse(object):
+    status_code = 200
+    headers = {}
+    text = '{"status": "ok"}'
+
+
+class FakeSession(object):
+    def __init__(self, session):
+        self.headers = session.headers
+        self.cookies = session.cookies
+
+    def post(self, url, data=None, **kwargs):
+        return FakeResponse()
+
+    def get(self, url, **kwargs):
+        return FakeResponse()
+
+
+def make_api():
+    api = API()
+    api.set_user('benchmark', 'password')
+    api.session = api.create_session()
+    requests.utils.add_dict_to_cookiejar(
+        api.session.cookies, {'csrftoken': 'a' * 32, 'ds_user_id': '1234567',
+                              'ds_user': 'benchmark', 'sessionid': 'b' * 40})
+    api.session = FakeSession(api.session)
+    api.is_logged_in = True
+    return api
+
+
+def legacy(api, data):
+    # The request path before headers, cookies and the HMAC key were cached
+    api.session.headers.update(config.REQUEST_HEADERS)
+    api.session.headers.update({'User-Agent': api.user_agent})
+    data.update({'_uuid': api.uuid,
+                 '_uid': api.session.cookies.get_dict()['ds_user_id'],
+                 '_csrftoken': api.session.cookies.get_dict()['csrftoken']})
+    data = json.dumps(data)
+    body = hmac.new(config.IG_SIG_KEY.encode('utf-8'), data.encode('utf-8'),
+                    hashlib.sha256).hexdigest() + '.' + urllib.parse.quote(data)
+    post = 'ig_sig_key_version={sig_key}&signed_body={body}'.format(
+        sig_key=config.SIG_KEY_VERSION, body=body)
+    response = api.session.post(config.API_URL + 'media/1/like/', data=post)
+    return json.loads(response.text)
+
+
+def current(api, data):
+    return api.send_request('media/1/like/', api.json_data(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=True)
+    parser.add_argument('-n', type=int, default=20000, help='requests per run')
+    args = parser.parse_args()
+
+    api = make_api()
+    api.logger.disabled = True
+    payload = {'media_id': '1', 'module_name': 'feed_timeline'}
+    for name, func in (('legacy', legacy), ('current', current)):
+        best = min(timeit.repeat(lambda: func(api, dict(payload)),
+                                 number=args.n, repeat=5))
+        print('{:8} {:6.2f} us/request'.format(name, best / args.n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+    Benchmark of `TermMatcher` against scanning once per term, the way
+    stop words and blacklisted hashtags used to be matched.
+
+    Usage:
+        python benchmarks/term_matcher.py [-terms 10000] [-texts 1000]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.append(os.path.join(sys.path[0], '../'))
+from instabot.matcher import TermMatcher  # noqa: E402
+
+
+def random_word(length):
+    return ''.join(random.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=True)
+    parser.add_argument('-terms', type=int, default=10000, help='number of terms')
+    parser.add_argument('-texts', type=int, default=1000, help='number of texts')
+    args = parser.parse_args()
+
+    random.seed(0)
+    terms = [random_word(random.randint(4, 10)) for _ in range(args.terms // 2)]
+    terms += ['#' + random_word(random.randint(4, 12)) for _ in range(args.terms // 2)]
+    # Biographies and captions of ~40 words, one in ten has a term
+    texts = []
+    for i in range(args.texts):
+        words = [random_word(random.randint(2, 9)) for _ in range(40)]
+        if i % 10 == 0:
+            words.append(random.choice(terms))
+        texts.append(' '.join(words))
+
+    start = time.time()
+    matcher = TermMatcher(terms)
+    compile_time = time.time() - start
+
+    start = time.time()
+    naive = [any(term in text.lower() for term in terms) for text in texts]
+    naive_time = time.time() - start
+
+    start = time.time()
+    compiled = [matcher.find(text) is not None for text in texts]
+    compiled_time = time.time() - start
+
+    print('{} terms, {} texts, {} matches'.format(len(terms), len(texts), sum(compiled)))
+    print('per-term scan  {:8.2f} ms/text'.format(naive_time / len(texts) * 1e3))
+    print('TermMatcher    {:8.2f} ms/text (compiled in {:.2f} s)'.format(
+        compiled_time / len(texts) * 1e3, compile_time))
+    if naive != compiled:
+        print('Note: hashtag terms only match whole hashtags, '
+              '{} texts differ'.format(sum(a != b for a, b in zip(naive, compiled))))
+
+
+if __name__ == '__main__':
+    main()
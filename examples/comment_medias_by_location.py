@@ -27,19 +27,18 @@ except NameError:
 
 
 def comment_location_feed(new_bot, new_location, amount=0):
+    # `amount` counts the commented medias, the feed is paged until then
     counter = 0
-    max_id = ''
+    medias = new_bot.iter_geotag_medias(new_location, is_comment=True)
     with tqdm(total=amount) as pbar:
         while counter < amount:
-            if new_bot.api.get_location_feed(new_location['location']['pk'], max_id=max_id):
-                location_feed = new_bot.api.last_json
-                for media in new_bot.filter_medias(location_feed["items"][:amount], quiet=True):
-                    if bot.comment(media, MESSAGE):
-                        counter += 1
-                        pbar.update(1)
-                if not location_feed.get('next_max_id'):
-                    return False
-                max_id = location_feed['next_max_id']
+            media = next(medias, None)
+            if media is None:
+                return False
+            if new_bot.comment(media, MESSAGE):
+                counter += 1
+                pbar.update(1)
+    medias.close()
     return True
 
 
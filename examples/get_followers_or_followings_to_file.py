@@ -27,6 +27,7 @@ parser.add_argument('-usernames', action="store_true", help="add this options to
 parser.add_argument('-filter_private', action="store_true", help="add this options to filter private acccounts")
 parser.add_argument('-filter_business', action="store_true", help="add this options to filter business accounts")
 parser.add_argument('-filter_verified', action="store_true", help="add this options to filter verified accounts")
+parser.add_argument('-cursor', type=str, help="file to save the progress to, an interrupted run resumes from it")
 args = parser.parse_args()
 
 if args.get != 'followers' and args.get != 'followings':
@@ -51,4 +52,6 @@ bot.api.get_total_followers_or_followings(user_id=user_id,
                                           usernames=args.usernames,
                                           filter_private=args.filter_private,
                                           filter_business=args.filter_business,
-                                          filter_verified=args.filter_verified)
+                                          filter_verified=args.filter_verified,
+                                          fields=[],
+                                          cursor_file=args.cursor)
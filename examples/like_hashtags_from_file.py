@@ -29,5 +29,4 @@ if not hashtags:
     exit()
 
 bot.login()
-for hashtag in hashtags:
-    bot.like_hashtag(hashtag)
+bot.like_hashtags(hashtags)
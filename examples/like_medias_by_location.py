@@ -27,20 +27,18 @@ except NameError:
 
 
 def like_location_feed(new_bot, new_location, amount=0):
+    # `amount` counts the liked medias, the feed is paged until then
     counter = 0
-    max_id = ''
+    medias = new_bot.iter_geotag_medias(new_location)
     with tqdm(total=amount) as pbar:
         while counter < amount:
-            if new_bot.api.get_location_feed(new_location['location']['pk'], max_id=max_id):
-                location_feed = new_bot.api.last_json
-                for media in new_bot.filter_medias(location_feed["items"][:amount], quiet=True):
-                    if bot.like(media):
-                        counter += 1
-                        pbar.update(1)
-                if location_feed.get('next_max_id'):
-                    max_id = location_feed['next_max_id']
-                else:
-                    return False
+            media = next(medias, None)
+            if media is None:
+                return False
+            if new_bot.like(media):
+                counter += 1
+                pbar.update(1)
+    medias.close()
     return True
 
 
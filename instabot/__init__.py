@@ -1,5 +1,5 @@
 from .api import API
-from .bot import Bot
+from .bot import Bot, BotPool
 from . import utils
 
-assert all((API, Bot, utils))  # silence pyflakes
+assert all((API, Bot, BotPool, utils))  # silence pyflakes
@@ -1,3 +1,10 @@
+import sys
+
 from .api import API
 
 assert API  # silence pyflakes
+
+if sys.version_info[0] >= 3:
+    from .api_async import AsyncAPI
+
+    assert AsyncAPI  # silence pyflakes
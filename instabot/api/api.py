@@ -4,9 +4,10 @@ import json
 import logging
 import os
 import sys
+import threading
 import time
 import uuid
-from random import uniform
+from contextlib import contextmanager
 
 try:
     from json.decoder import JSONDecodeError
@@ -16,45 +17,141 @@ except ImportError:
 import requests
 import requests.utils
 import six.moves.urllib as urllib
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 from . import config, devices
 from .api_photo import configure_photo, download_photo, upload_photo
 from .api_video import configure_video, download_video, upload_video
 from .prepare import delete_credentials, get_credentials
+from .rate_limit import AdaptiveRateLimiter, TokenBucket, parse_retry_after
+from .transport import VersionedCookieJar, create_session
 
 PY2 = sys.version_info[0] == 2
 
+# Times a throttled page is requested again before a paginator gives up
+PAGE_RETRIES = 5
+
+# Keyed once, `generate_signature` only copies the state
+SIG_HMAC = hmac.new(config.IG_SIG_KEY.encode('utf-8'), digestmod=hashlib.sha256)
+SIG_PREFIX = 'ig_sig_key_version={}&signed_body='.format(config.SIG_KEY_VERSION)
+
+
+def load_cursor(fname):
+    """Returns the `next_max_id` saved in cursor file `fname` or ''."""
+    if fname is None or not os.path.isfile(fname):
+        return ''
+    with open(fname, 'r') as f:
+        return json.load(f).get('next_max_id') or ''
+
+
+def save_cursor(fname, next_max_id):
+    if fname is None:
+        return
+    tmp_fname = fname + '.tmp'
+    with open(tmp_fname, 'w') as f:
+        json.dump({'next_max_id': next_max_id, 'saved_at': time.time()}, f)
+    if os.path.exists(fname):
+        os.remove(fname)
+    os.rename(tmp_fname, fname)
+
+
+def remove_cursor(fname):
+    if fname is not None and os.path.isfile(fname):
+        os.remove(fname)
+
+
+class ApiResponse(object):
+    """
+        Outcome of one `API.send_request` call.
+
+        `result` is what `send_request` returns (True, False or
+        'feedback_required'), `json` is the parsed body or None.
+    """
+
+    __slots__ = ('status_code', 'json', 'headers', 'result')
+
+    def __init__(self, status_code=None, json=None, headers=None, result=False):
+        self.status_code = status_code
+        self.json = json
+        self.headers = headers or {}
+        self.result = result
+
+    @property
+    def ok(self):
+        return self.result is True
+
+    def get(self, key, default=None):
+        if not isinstance(self.json, dict):
+            return default
+        return self.json.get(key, default)
+
+    def __bool__(self):
+        return self.ok
+
+    __nonzero__ = __bool__
+
+    def to_requests_response(self):
+        """
+            A `requests.Response` with the same status, headers and body,
+            so that `API.last_response` has one type for cached responses too.
+        """
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.headers.update(self.headers)
+        response.encoding = 'utf-8'
+        response._content = b''
+        if self.json is not None:
+            response._content = json.dumps(self.json).encode('utf-8')
+        return response
+
+    def __repr__(self):
+        return '<ApiResponse [{}]>'.format(self.status_code)
+
 
 class API(object):
-    def __init__(self, device=None):
+    def __init__(self, device=None, pool_connections=10, pool_maxsize=10,
+                 share_connections=False, rate_limiter=None, response_cache=None,
+                 log_handlers=None):
         # Setup device and user_agent
         device = device or devices.DEFAULT_DEVICE
         self.device_settings = devices.DEVICES[device]
         self.user_agent = config.USER_AGENT_BASE.format(**self.device_settings)
 
         self.is_logged_in = False
-        self.last_response = None
+        self._local = threading.local()
         self.total_requests = 0
+        self.user_infos = None  # Optional `user_id` -> user info cache
+        self.locations = None  # Optional `instabot.geo.LocationIndex`
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        # Optional `instabot.cache.ResponseCache` for public GET endpoints
+        self.response_cache = response_cache
+        self.proxy = None
+        self._prepared_session = None
+        self._cookie_cache = (None, None, None)
+        self._default_data_cache = (None, None)
+        self.transport_options = {'pool_connections': pool_connections,
+                                  'pool_maxsize': pool_maxsize,
+                                  'share_connections': share_connections}
 
         # Setup logging
         self.logger = logging.getLogger('[instabot_{}]'.format(id(self)))
 
-        fh = logging.FileHandler(filename='instabot.log')
-        fh.setLevel(logging.INFO)
-        fh.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        if log_handlers is None:
+            fh = logging.FileHandler(filename='instabot.log')
+            fh.setLevel(logging.INFO)
+            fh.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
 
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        ch.setFormatter(logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s'))
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.DEBUG)
+            ch.setFormatter(logging.Formatter(
+                '%(asctime)s - %(levelname)s - %(message)s'))
+            log_handlers = [fh, ch]
 
-        self.logger.addHandler(fh)
-        self.logger.addHandler(ch)
+        for handler in log_handlers:
+            self.logger.addHandler(handler)
         self.logger.setLevel(logging.DEBUG)
 
-        self.last_json = None
-
     def set_user(self, username, password):
         self.username = username
         self.password = password
@@ -86,7 +183,7 @@ class API(object):
                       " will create it for you using your login details.")
 
         if not cookie_is_loaded and (not self.is_logged_in or force):
-            self.session = requests.Session()
+            self.session = self.create_session()
             self.set_proxy()  # Only happens if `self.proxy`
             url = 'si/fetch_headers/?challenge_type=signup&guid={uuid}'
             url = url.format(uuid=self.generate_UUID(False))
@@ -120,8 +217,9 @@ class API(object):
 
         try:
             with open(fname, 'r') as f:
-                self.session = requests.Session()
-                self.session.cookies = requests.utils.cookiejar_from_dict(json.load(f))
+                self.session = self.create_session()
+                self.session.cookies = requests.utils.cookiejar_from_dict(
+                    json.load(f), cookiejar=VersionedCookieJar())
             cookie_username = self.cookie_dict['ds_user']
             assert cookie_username == self.username
         except FileNotFoundError:
@@ -145,6 +243,9 @@ class API(object):
         self.is_logged_in = not self.send_request('accounts/logout/')
         return not self.is_logged_in
 
+    def create_session(self):
+        return create_session(self.proxy, **self.transport_options)
+
     def set_proxy(self):
         if self.proxy:
             parsed = urllib.parse.urlparse(self.proxy)
@@ -152,14 +253,117 @@ class API(object):
             self.session.proxies['http'] = scheme + self.proxy
             self.session.proxies['https'] = scheme + self.proxy
 
+    @property
+    def last_response(self):
+        # For compatibility, kept per thread
+        return getattr(self._local, 'last_response', None)
+
+    @last_response.setter
+    def last_response(self, value):
+        self._local.last_response = value
+
+    @property
+    def last_json(self):
+        # For compatibility, kept per thread
+        return getattr(self._local, 'last_json', None)
+
+    @last_json.setter
+    def last_json(self, value):
+        self._local.last_json = value
+
+    @property
+    def last_api_response(self):
+        """`ApiResponse` of the latest request sent from this thread."""
+        return getattr(self._local, 'response', None) or ApiResponse()
+
+    def call(self, method, *args, **kwargs):
+        """
+            Calls the endpoint method named `method` and returns the
+            `ApiResponse` of the last request it sent, e.g.
+            `api.call('media_info', media_id).json`.
+        """
+        self._local.response = ApiResponse()
+        getattr(self, method)(*args, **kwargs)
+        return self._local.response
+
+    @contextmanager
+    def screening_context(self):
+        """
+            Within the block identical GET requests from this thread are
+            sent once and their `ApiResponse` is reused, e.g. the
+            `media_info` that `check_media`, `get_media_info` and
+            `get_media_owner` all ask for. Contexts can be nested, the
+            outermost one decides when the memo is dropped.
+        """
+        outermost = getattr(self._local, 'memo', None) is None
+        if outermost:
+            self._local.memo = {}
+        try:
+            yield
+        finally:
+            if outermost:
+                self._local.memo = None
+
     def send_request(self, endpoint, post=None, login=False, with_signature=True):
+        response = self._send_request(endpoint, post, login, with_signature)
+        self._local.response = response
+        return response.result
+
+    def _send_request(self, endpoint, post=None, login=False, with_signature=True):
         if (not self.is_logged_in and not login):
             msg = "Not logged in!"
             self.logger.critical(msg)
             raise Exception(msg)
 
-        self.session.headers.update(config.REQUEST_HEADERS)
-        self.session.headers.update({'User-Agent': self.user_agent})
+        memo = getattr(self._local, 'memo', None)
+        if post is None and not login and memo is not None:
+            if endpoint in memo:
+                response = memo[endpoint]
+                self._remember(response)
+                return response
+            response = self._send_get(endpoint)
+            if response.ok:
+                memo[endpoint] = response
+            return response
+        if post is None and not login:
+            return self._send_get(endpoint)
+        return self._fetch(endpoint, post, with_signature)
+
+    def _is_own(self, endpoint):
+        """Whether `endpoint` is about the logged in account."""
+        path = endpoint.partition('?')[0].split('/')
+        if len(path) < 2 or path[0] not in ('friendships', 'users'):
+            return False
+        return path[1] in (self.user_id, getattr(self, 'username', None))
+
+    def _send_get(self, endpoint):
+        # The bot's own followings and counts must be fresh, see `follow_sync`
+        if self.response_cache is not None and not self._is_own(endpoint):
+            fetched = []
+
+            def request():
+                fetched.append(self._fetch(endpoint))
+                return fetched[0]
+            response = self.response_cache.fetch(endpoint, request)
+            if not fetched:
+                # From the cache or another thread's request
+                self._remember(response)
+            return response
+        return self._fetch(endpoint)
+
+    def _remember(self, response):
+        """Sets `last_response` and `last_json` for a reused `ApiResponse`."""
+        self.last_response = response.to_requests_response()
+        if response.json is not None:
+            self.last_json = response.json
+
+    def _fetch(self, endpoint, post=None, with_signature=True):
+        if self._prepared_session is not self.session:
+            # Static headers are set once per session
+            self.session.headers.update(config.REQUEST_HEADERS)
+            self.session.headers.update({'User-Agent': self.user_agent})
+            self._prepared_session = self.session
+        self.rate_limiter.wait()
         try:
             self.total_requests += 1
             if post is not None:  # POST
@@ -173,46 +377,62 @@ class API(object):
                     config.API_URL + endpoint)
         except Exception as e:
             self.logger.warning(str(e))
-            return False
+            return ApiResponse()
+
+        try:
+            response_data = json.loads(response.text)
+        except (JSONDecodeError, ValueError):
+            response_data = None
+        result = ApiResponse(response.status_code, response_data, response.headers)
 
         if response.status_code == 200:
+            self.rate_limiter.on_success()
             self.last_response = response
-            try:
-                self.last_json = json.loads(response.text)
-                return True
-            except JSONDecodeError:
-                return False
+            if response_data is None:
+                return result
+            self.last_json = response_data
+            result.result = True
+            return result
         else:
             self.logger.error("Request returns {} error!".format(response.status_code))
-            response_data = json.loads(response.text)
-            if "feedback_required" in str(response_data.get('message')):
+            message = (response_data or {}).get('message')
+            if "feedback_required" in str(message):
                 self.logger.error("ATTENTION!: `feedback_required`, your action could have been blocked")
-                return "feedback_required"
+                self.rate_limiter.on_throttle()
+                result.result = "feedback_required"
+                return result
             if response.status_code == 429:
-                sleep_minutes = 5
+                delay = self.rate_limiter.on_throttle(
+                    parse_retry_after(response.headers.get('Retry-After')))
                 self.logger.warning(
-                    "That means 'too many requests'. I'll go to sleep "
-                    "for {} minutes.".format(sleep_minutes))
-                time.sleep(sleep_minutes * 60)
-            elif response.status_code == 400:
-                response_data = json.loads(response.text)
+                    "That means 'too many requests'. Holding requests back "
+                    "for {:.0f} seconds, then {:.2f} requests/s.".format(
+                        delay, self.rate_limiter.rate))
+            elif response.status_code == 400 and response_data is not None:
                 msg = "Instagram's error message: {}"
-                self.logger.info(msg.format(response_data.get('message')))
+                self.logger.info(msg.format(message))
                 if 'error_type' in response_data:
                     msg = 'Error type: {}'.format(response_data['error_type'])
                     self.logger.info(msg)
 
             # For debugging
-            try:
-                self.last_response = response
-                self.last_json = json.loads(response.text)
-            except Exception:
-                pass
-            return False
+            self.last_response = response
+            if response_data is not None:
+                self.last_json = response_data
+            return result
 
     @property
     def cookie_dict(self):
-        return self.session.cookies.get_dict()
+        cookies = self.session.cookies
+        version = getattr(cookies, 'version', None)
+        if version is None:
+            # Not a `VersionedCookieJar`, we can't tell when it changes
+            return cookies.get_dict()
+        jar, cached_version, cookie_dict = self._cookie_cache
+        if jar is not cookies or cached_version != version:
+            cookie_dict = cookies.get_dict()
+            self._cookie_cache = (cookies, version, cookie_dict)
+        return cookie_dict
 
     @property
     def token(self):
@@ -228,11 +448,16 @@ class API(object):
 
     @property
     def default_data(self):
-        return {
-            '_uuid': self.uuid,
-            '_uid': self.user_id,
-            '_csrftoken': self.token,
-        }
+        cookie_dict = self.cookie_dict
+        cached_from, default_data = self._default_data_cache
+        if cached_from is not cookie_dict or default_data['_uuid'] != self.uuid:
+            default_data = {
+                '_uuid': self.uuid,
+                '_uid': cookie_dict['ds_user_id'],
+                '_csrftoken': cookie_dict['csrftoken'],
+            }
+            self._default_data_cache = (cookie_dict, default_data)
+        return dict(default_data)
 
     def json_data(self, data=None):
         """Adds the default_data to data and dumps it to a json."""
@@ -550,10 +775,10 @@ class API(object):
 
     @staticmethod
     def generate_signature(data):
-        body = hmac.new(config.IG_SIG_KEY.encode('utf-8'), data.encode('utf-8'),
-                        hashlib.sha256).hexdigest() + '.' + urllib.parse.quote(data)
-        signature = 'ig_sig_key_version={sig_key}&signed_body={body}'
-        return signature.format(sig_key=config.SIG_KEY_VERSION, body=body)
+        data = data.encode('utf-8')
+        signer = SIG_HMAC.copy()
+        signer.update(data)
+        return SIG_PREFIX + signer.hexdigest() + '.' + urllib.parse.quote(data)
 
     @staticmethod
     def generate_device_id(seed):
@@ -580,6 +805,39 @@ class API(object):
         url = 'feed/liked/?max_id={max_id}'.format(max_id=max_id)
         return self.send_request(url)
 
+    def iter_followers_or_followings(self, user_id, which='followers',
+                                     cursor_file=None):
+        """
+            Yields the pages of `which` ('followers' or 'followings') of
+            `user_id` as they arrive, paced by `self.rate_limiter`; a page
+            that was throttled is requested again once the limiter lets it
+            through. With `cursor_file` the `next_max_id`
+            of the next page is saved there once the caller is done with a
+            page, and a later call resumes from it. The cursor is removed
+            when the list is exhausted.
+        """
+        get = 'get_user_followers' if which == 'followers' else 'get_user_followings'
+        next_max_id = load_cursor(cursor_file)
+        retries = 0
+        while True:
+            response = self.call(get, user_id, next_max_id)
+            throttled = response.status_code == 429 or response.result == 'feedback_required'
+            if throttled and retries < PAGE_RETRIES:
+                # The limiter holds requests back for the backoff it just set
+                retries += 1
+                self.rate_limiter.wait()
+                continue
+            last_json = response.json
+            if not last_json or 'users' not in last_json:
+                raise Exception("Can't get {} of {}".format(which, user_id))
+            retries = 0
+            yield last_json['users']
+            next_max_id = last_json.get('next_max_id')
+            if not last_json['users'] or last_json.get('big_list') is False or not next_max_id:
+                break
+            save_cursor(cursor_file, next_max_id)
+        remove_cursor(cursor_file)
+
     def get_total_followers_or_followings(self,
                                           user_id,
                                           amount=None,
@@ -589,21 +847,32 @@ class API(object):
                                           filter_verified=False,
                                           usernames=False,
                                           to_file=None,
-                                          overwrite=False):
-        from io import StringIO
-
+                                          overwrite=False,
+                                          fields=None,
+                                          cursor_file=None,
+                                          enrich_workers=4,
+                                          enrich_rate=2):
+        """
+            Returns the followers or followings of `user_id`.
+
+            `fields` projects the returned user dicts to those keys, e.g.
+            `['pk']`; `fields=[]` keeps nothing, which with `to_file` streams
+            the users straight to the file. With `cursor_file` an
+            interrupted download resumes where it stopped and keeps
+            appending to `to_file`.
+
+            `filter_business` needs the full user info of each follower,
+            these are looked up page by page on `enrich_workers` threads
+            limited to `enrich_rate` requests per second.
+        """
         if which == 'followers':
             key = 'follower_count'
-            get = self.get_user_followers
         elif which == 'followings':
             key = 'following_count'
-            get = self.get_user_followings
 
-        sleep_track = 0
         result = []
-        next_max_id = ''
-        self.get_username_info(user_id)
-        username_info = self.last_json
+        count = 0
+        username_info = self.call('get_username_info', user_id).json or {}
         if "user" in username_info:
             total = amount or username_info["user"][key]
 
@@ -614,58 +883,113 @@ class API(object):
             return False
         if filter_business:
             print("--> You are going to filter business accounts. This will take time! <--")
-            from random import random
+            bucket = TokenBucket(enrich_rate, enrich_workers)
+            lookups = {'cached': 0, 'fetched': 0}
+        resume = cursor_file is not None and os.path.isfile(cursor_file)
         if to_file is not None:
-            if os.path.isfile(to_file):
-                if not overwrite:
-                    print("File `{}` already exists. Not overwriting.".format(to_file))
-                    return False
-                else:
-                    print("Overwriting file `{}`".format(to_file))
-            with open(to_file, 'w'):
-                pass
+            if resume and os.path.isfile(to_file):
+                with open(to_file, 'r') as f:
+                    count = sum(1 for line in f if line.strip())
+                print("Resuming `{}` after {} items".format(to_file, count))
+            else:
+                if os.path.isfile(to_file):
+                    if not overwrite:
+                        print("File `{}` already exists. Not overwriting.".format(to_file))
+                        return False
+                    else:
+                        print("Overwriting file `{}`".format(to_file))
+                with open(to_file, 'w'):
+                    pass
         desc = "Getting {} of {}".format(which, user_id)
-        with tqdm(total=total, desc=desc, leave=True) as pbar:
-            while True:
-                get(user_id, next_max_id)
-                last_json = self.last_json
-                try:
-                    with open(to_file, 'a') if to_file is not None else StringIO() as f:
-                        for item in last_json["users"]:
-                            if filter_private and item['is_private']:
-                                continue
-                            if filter_business:
-                                time.sleep(2 * random())
-                                self.get_username_info(item['pk'])
-                                item_info = self.last_json
-                                if item_info['user']['is_business']:
-                                    continue
-                            if filter_verified and item['is_verified']:
-                                continue
-                            if to_file is not None:
-                                if usernames:
-                                    f.write("{}\n".format(item['username']))
-                                else:
-                                    f.write("{}\n".format(item['pk']))
+        # The bar counts the screened users, the kept ones are shown aside
+        filtering = filter_private or filter_business or filter_verified
+        screen_total = username_info["user"][key] if filtering else total
+        f = open(to_file, 'a') if to_file is not None else None
+        try:
+            with tqdm(total=screen_total, initial=count, desc=desc, leave=True) as pbar:
+                pages = self.iter_followers_or_followings(user_id, which, cursor_file)
+                for page in pages:
+                    screened = len(page)
+                    # The listing already tells private and verified users
+                    page = [item for item in page
+                            if not any((filter_private and item['is_private'],
+                                        filter_verified and item['is_verified']))]
+                    if filter_business:
+                        infos = self._enrich_user_infos(
+                            page, enrich_workers, bucket, lookups)
+                        page = [item for item in page
+                                if not infos.get(str(item['pk']), {}).get('is_business', True)]
+                    for item in page:
+                        if f is not None:
+                            if usernames:
+                                f.write("{}\n".format(item['username']))
+                            else:
+                                f.write("{}\n".format(item['pk']))
+                        if fields is None:
                             result.append(item)
-                            pbar.update(1)
-                            sleep_track += 1
-                            if sleep_track >= 20000:
-                                sleep_time = uniform(120, 180)
-                                msg = "\nWaiting {:.2f} min. due to too many requests."
-                                print(msg.format(sleep_time / 60))
-                                time.sleep(sleep_time)
-                                sleep_track = 0
-                    if not last_json["users"] or len(result) >= total:
-                        return result[:total]
-                except Exception as e:
-                    print("ERROR: {}".format(e))
-                    return result[:total]
-
-                if last_json["big_list"] is False:
-                    return result[:total]
-
-                next_max_id = last_json.get("next_max_id", "")
+                        elif fields:
+                            result.append(dict((k, item.get(k)) for k in fields))
+                        count += 1
+                    pbar.update(screened)
+                    if filtering:
+                        postfix = dict(lookups) if filter_business else {}
+                        postfix['kept'] = count
+                        pbar.set_postfix(postfix)
+                    if f is not None:
+                        f.flush()
+                    if count >= total:
+                        pages.close()
+                        remove_cursor(cursor_file)
+                        break
+        except Exception as e:
+            print("ERROR: {}".format(e))
+            self.logger.exception("Stopped getting {} of {} after {} users.".format(
+                which, user_id, count))
+        finally:
+            if f is not None:
+                f.close()
+        return result[:total]
+
+    def _enrich_user_infos(self, items, workers, bucket, lookups):
+        """
+            Returns `{pk: user_info}` for the user dicts in `items`. Infos
+            are taken from the listing when it has `is_business`, then from
+            `self.user_infos`, the rest is fetched concurrently.
+        """
+        infos = {}
+        missing = []
+        for item in items:
+            pk = str(item['pk'])
+            if 'is_business' in item:
+                infos[pk] = item
+                continue
+            cached = None
+            if self.user_infos is not None:
+                cached = self.user_infos.get(pk, fields=['is_business'])
+            # Infos cached from other endpoints may lack the field
+            if cached is not None and 'is_business' in cached:
+                infos[pk] = cached
+                lookups['cached'] += 1
+            else:
+                missing.append(pk)
+
+        def fetch(pk):
+            bucket.consume()
+            return self.call('get_username_info', pk).json
+
+        if missing:
+            executor = ThreadPoolExecutor(max_workers=workers)
+            try:
+                for pk, last_json in zip(missing, executor.map(fetch, missing)):
+                    lookups['fetched'] += 1
+                    if not last_json or 'user' not in last_json:
+                        continue  # Unknown users are filtered out
+                    infos[pk] = last_json['user']
+                    if self.user_infos is not None:
+                        self.user_infos[pk] = last_json['user']
+            finally:
+                executor.shutdown(wait=True)
+        return infos
 
     def get_total_followers(self, user_id, amount=None):
         return self.get_total_followers_or_followings(
@@ -685,8 +1009,7 @@ class API(object):
             if len(user_feed) >= float(amount):
                 # one request returns max 13 items
                 return user_feed[:amount]
-            self.get_user_feed(user_id, next_max_id, min_timestamp)
-            last_json = self.last_json
+            last_json = self.call('get_user_feed', user_id, next_max_id, min_timestamp).json or {}
             if 'items' not in last_json:
                 return user_feed
             user_feed += last_json["items"]
@@ -694,25 +1017,40 @@ class API(object):
                 return user_feed
             next_max_id = last_json.get("next_max_id", "")
 
+    def _iter_feed(self, endpoint, feed_id):
+        next_max_id = ''
+        while True:
+            last_json = self.call(endpoint, feed_id, next_max_id).json or {}
+            if not last_json.get('items'):
+                return
+            yield last_json['items']
+            next_max_id = last_json.get('next_max_id')
+            if last_json.get('more_available') is False or not next_max_id:
+                return
+
+    def iter_hashtag_feed(self, hashtag):
+        """
+            Yields the pages of the feed of `hashtag`, each page is fetched
+            only once the caller asks for it.
+        """
+        return self._iter_feed('get_hashtag_feed', hashtag)
+
+    def iter_location_feed(self, location_id):
+        """Yields the pages of the feed of `location_id`, fetched lazily."""
+        return self._iter_feed('get_location_feed', location_id)
+
     def get_total_hashtag_feed(self, hashtag_str, amount=100):
         hashtag_feed = []
-        next_max_id = ''
 
         with tqdm(total=amount, desc="Getting hashtag media.", leave=False) as pbar:
-            while True:
-                self.get_hashtag_feed(hashtag_str, next_max_id)
-                last_json = self.last_json
-                if 'items' not in last_json:
-                    return hashtag_feed[:amount]
-                items = last_json['items']
-                try:
-                    pbar.update(len(items))
-                    hashtag_feed += items
-                    if not items or len(hashtag_feed) >= amount:
-                        return hashtag_feed[:amount]
-                except Exception:
-                    return hashtag_feed[:amount]
-                next_max_id = last_json.get("next_max_id", "")
+            pages = self.iter_hashtag_feed(hashtag_str)
+            for items in pages:
+                pbar.update(len(items))
+                hashtag_feed += items
+                if amount is None or len(hashtag_feed) >= amount:
+                    pages.close()
+                    break
+        return hashtag_feed[:amount]
 
     def get_total_self_user_feed(self, min_timestamp=None):
         return self.get_total_user_feed(self.user_id, min_timestamp)
@@ -727,8 +1065,7 @@ class API(object):
         next_id = ''
         liked_items = []
         for _ in range(scan_rate):
-            self.get_liked_media(next_id)
-            last_json = self.last_json
+            last_json = self.call('get_liked_media', next_id).json
             next_id = last_json.get("next_max_id", "")
             liked_items += last_json["items"]
         return liked_items
@@ -791,7 +1128,10 @@ class API(object):
     def search_location(self, query='', lat=None, lng=None):
         url = 'fbsearch/places/?rank_token={rank_token}&query={query}&lat={lat}&lng={lng}'
         url = url.format(rank_token=self.rank_token, query=query, lat=lat, lng=lng)
-        return self.send_request(url)
+        result = self.send_request(url)
+        if result and self.locations is not None:
+            self.locations.add(self._local.response.json.get('items') or [])
+        return result
 
     def get_user_reel(self, user_id):
         url = 'feed/user/{}/reel_media/'.format(user_id)
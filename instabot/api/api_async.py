@@ -0,0 +1,171 @@
+"""
+    Asyncio transport for read-only API calls (Python 3 only).
+
+    Usage:
+        api = API()
+        api.login(username, password)
+        async_api = AsyncAPI(api, concurrency=8, rate=2)
+        likers = async_api.run(async_api.gather(
+            async_api.get_media_likers(media_id) for media_id in media_ids))
+
+    Requests go through the logged-in `API.session` on a thread pool. A
+    semaphore bounds how many are in flight and a per-account token bucket
+    bounds how many start per second. Throttled responses are reported to
+    `API.rate_limiter`, which both transports wait on. Write actions keep
+    using `API` and its own pacing.
+"""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from .rate_limit import TokenBucket, parse_retry_after
+
+
+class AsyncAPI(object):
+    def __init__(self, api, concurrency=8, rate=2.0, burst=5):
+        self.api = api
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._semaphore = None
+
+        self.api.session.headers.update(config.REQUEST_HEADERS)
+        self.api.session.headers.update({'User-Agent': self.api.user_agent})
+
+    @property
+    def logger(self):
+        return self.api.logger
+
+    @property
+    def semaphore(self):
+        # Created lazily so it binds to the loop that runs the requests
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def _get(self, endpoint):
+        return self.api.session.get(config.API_URL + endpoint)
+
+    async def send_request(self, endpoint):
+        """Returns the parsed JSON of a GET request or None on errors."""
+        if not self.api.is_logged_in:
+            msg = "Not logged in!"
+            self.logger.critical(msg)
+            raise Exception(msg)
+
+        async with self.semaphore:
+            wait = max(self.bucket.reserve(), self.api.rate_limiter.reserve())
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.api.total_requests += 1
+            loop = asyncio.get_event_loop()
+            try:
+                response = await loop.run_in_executor(
+                    self.executor, self._get, endpoint)
+            except Exception as e:
+                self.logger.warning(str(e))
+                return None
+
+        if response.status_code == 429:
+            self.api.rate_limiter.on_throttle(
+                parse_retry_after(response.headers.get('Retry-After')))
+        if response.status_code != 200:
+            self.logger.error("Request returns {} error!".format(response.status_code))
+            return None
+        self.api.rate_limiter.on_success()
+        try:
+            return json.loads(response.text)
+        except ValueError:
+            return None
+
+    async def gather(self, coroutines):
+        return await asyncio.gather(*coroutines)
+
+    def run(self, coroutine):
+        """Runs `coroutine` to completion from synchronous code."""
+        loop = asyncio.new_event_loop()
+        try:
+            self._semaphore = None
+            return loop.run_until_complete(coroutine)
+        finally:
+            self._semaphore = None
+            loop.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    async def media_info(self, media_id):
+        url = 'media/{media_id}/info/'.format(media_id=media_id)
+        return await self.send_request(url)
+
+    async def get_username_info(self, user_id):
+        url = 'users/{user_id}/info/'.format(user_id=user_id)
+        return await self.send_request(url)
+
+    async def search_username(self, username):
+        url = 'users/{username}/usernameinfo/'.format(username=username)
+        return await self.send_request(url)
+
+    async def get_media_likers(self, media_id):
+        url = 'media/{media_id}/likers/?'.format(media_id=media_id)
+        return await self.send_request(url)
+
+    async def get_media_comments(self, media_id, max_id=''):
+        url = 'media/{media_id}/comments/'.format(media_id=media_id)
+        if max_id:
+            url += '?max_id={max_id}'.format(max_id=max_id)
+        return await self.send_request(url)
+
+    async def get_timeline_feed(self):
+        return await self.send_request('feed/timeline/')
+
+    async def get_user_feed(self, user_id, max_id='', min_timestamp=None):
+        url = 'feed/user/{user_id}/?max_id={max_id}&min_timestamp={min_timestamp}&rank_token={rank_token}&ranked_content=true'
+        url = url.format(
+            user_id=user_id,
+            max_id=max_id,
+            min_timestamp=min_timestamp,
+            rank_token=self.api.rank_token
+        )
+        return await self.send_request(url)
+
+    async def get_hashtag_feed(self, hashtag, max_id=''):
+        url = 'feed/tag/{hashtag}/?max_id={max_id}&rank_token={rank_token}&ranked_content=true&'
+        url = url.format(
+            hashtag=hashtag,
+            max_id=max_id,
+            rank_token=self.api.rank_token
+        )
+        return await self.send_request(url)
+
+    async def get_location_feed(self, location_id, max_id=''):
+        url = 'feed/location/{location_id}/?max_id={max_id}&rank_token={rank_token}&ranked_content=true&'
+        url = url.format(
+            location_id=location_id,
+            max_id=max_id,
+            rank_token=self.api.rank_token
+        )
+        return await self.send_request(url)
+
+    async def get_popular_feed(self):
+        url = 'feed/popular/?people_teaser_supported=1&rank_token={rank_token}&ranked_content=true&'
+        return await self.send_request(url.format(rank_token=self.api.rank_token))
+
+    async def get_user_followings(self, user_id, max_id=''):
+        url = 'friendships/{user_id}/following/?max_id={max_id}&ig_sig_key_version={sig_key}&rank_token={rank_token}'
+        url = url.format(
+            user_id=user_id,
+            max_id=max_id,
+            sig_key=config.SIG_KEY_VERSION,
+            rank_token=self.api.rank_token
+        )
+        return await self.send_request(url)
+
+    async def get_user_followers(self, user_id, max_id=''):
+        url = 'friendships/{user_id}/followers/?rank_token={rank_token}'
+        url = url.format(user_id=user_id, rank_token=self.api.rank_token)
+        if max_id:
+            url += '&max_id={max_id}'.format(max_id=max_id)
+        return await self.send_request(url)
@@ -12,10 +12,10 @@ from . import config
 
 def download_photo(self, media_id, filename, media=False, folder='photos'):
     if not media:
-        self.media_info(media_id)
-        if not self.last_json.get('items'):
+        response = self.call('media_info', media_id)
+        if not response.get('items'):
             return True
-        media = self.last_json['items'][0]
+        media = response.json['items'][0]
     if media['media_type'] == 2:
         return True
     elif media['media_type'] == 1:
@@ -103,16 +103,16 @@ def upload_photo(self, photo, caption=None, upload_id=None, from_video=False):
         'photo': ('pending_media_%s.jpg' % upload_id, open(photo, 'rb'), 'application/octet-stream', {'Content-Transfer-Encoding': 'binary'})
     }
     m = MultipartEncoder(data, boundary=self.uuid)
-    self.session.headers.update({'X-IG-Capabilities': '3Q4=',
-                                 'X-IG-Connection-Type': 'WIFI',
-                                 'Cookie2': '$Version=1',
-                                 'Accept-Language': 'en-US',
-                                 'Accept-Encoding': 'gzip, deflate',
-                                 'Content-type': m.content_type,
-                                 'Connection': 'close',
-                                 'User-Agent': self.user_agent})
+    # Passed per request so the session keeps its keep-alive headers
+    headers = {'X-IG-Capabilities': '3Q4=',
+               'X-IG-Connection-Type': 'WIFI',
+               'Cookie2': '$Version=1',
+               'Accept-Language': 'en-US',
+               'Accept-Encoding': 'gzip, deflate',
+               'Content-type': m.content_type,
+               'User-Agent': self.user_agent}
     response = self.session.post(
-        config.API_URL + "upload/photo/", data=m.to_string())
+        config.API_URL + "upload/photo/", data=m.to_string(), headers=headers)
     if response.status_code == 200:
         if self.configure_photo(upload_id, photo, caption):
             self.expose()
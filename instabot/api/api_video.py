@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 import json
 import os
 import re
@@ -14,8 +13,7 @@ from . import config
 
 def download_video(self, media_id, filename, media=False, folder='videos'):
     if not media:
-        self.media_info(media_id)
-        media = self.last_json['items'][0]
+        media = self.call('media_info', media_id).json['items'][0]
     filename = '{0}_{1}.mp4'.format(media['user']['username'], media_id) if not filename else '{0}.mp4'.format(filename)
     try:
         clips = media['video_versions']
@@ -69,16 +67,17 @@ def upload_video(self, video, caption=None, upload_id=None):
         '_uuid': self.uuid,
     }
     m = MultipartEncoder(data, boundary=self.uuid)
-    self.session.headers.update({'X-IG-Capabilities': '3Q4=',
-                                 'X-IG-Connection-Type': 'WIFI',
-                                 'Host': 'i.instagram.com',
-                                 'Cookie2': '$Version=1',
-                                 'Accept-Language': 'en-US',
-                                 'Accept-Encoding': 'gzip, deflate',
-                                 'Content-type': m.content_type,
-                                 'Connection': 'keep-alive',
-                                 'User-Agent': self.user_agent})
-    response = self.session.post(config.API_URL + "upload/video/", data=m.to_string())
+    # Passed per request so the session keeps its own headers
+    headers = {'X-IG-Capabilities': '3Q4=',
+               'X-IG-Connection-Type': 'WIFI',
+               'Host': 'i.instagram.com',
+               'Cookie2': '$Version=1',
+               'Accept-Language': 'en-US',
+               'Accept-Encoding': 'gzip, deflate',
+               'Content-type': m.content_type,
+               'Connection': 'keep-alive',
+               'User-Agent': self.user_agent}
+    response = self.session.post(config.API_URL + "upload/video/", data=m.to_string(), headers=headers)
     if response.status_code == 200:
         body = json.loads(response.text)
         upload_url = body['video_upload_urls'][3]['url']
@@ -90,8 +89,7 @@ def upload_video(self, video, caption=None, upload_id=None):
         request_size = len(video_data) // 4
         last_request_extra = len(video_data) - 3 * request_size
 
-        headers = copy.deepcopy(self.session.headers)
-        self.session.headers.update({
+        headers = {
             'X-IG-Capabilities': '3Q4=',
             'X-IG-Connection-Type': 'WIFI',
             'Cookie2': '$Version=1',
@@ -104,7 +102,7 @@ def upload_video(self, video, caption=None, upload_id=None):
             'job': upload_job,
             'Host': 'upload.instagram.com',
             'User-Agent': self.user_agent
-        })
+        }
         for i in range(4):
             start = i * request_size
             if i == 3:
@@ -115,9 +113,8 @@ def upload_video(self, video, caption=None, upload_id=None):
             content_range = "bytes {start}-{end}/{len_video}".format(
                 start=start, end=end - 1, len_video=len(video_data)).encode('utf-8')
 
-            self.session.headers.update({'Content-Length': str(end - start), 'Content-Range': content_range})
-            response = self.session.post(upload_url, data=video_data[start:start + length])
-        self.session.headers = headers
+            headers.update({'Content-Length': str(end - start), 'Content-Range': content_range})
+            response = self.session.post(upload_url, data=video_data[start:start + length], headers=headers)
 
         if response.status_code == 200:
             if self.configure_video(upload_id, video, thumbnail, width, height, duration, caption):
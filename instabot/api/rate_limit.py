@@ -0,0 +1,153 @@
+"""
+    Request pacing primitives shared by the sync and async transports.
+"""
+
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket(object):
+    """
+        Thread-safe token bucket: `rate` tokens per second, at most `burst`
+        tokens saved up.
+
+        `reserve()` takes a token and returns how many seconds the caller
+        has to wait before using it, so it works both with `time.sleep` and
+        `asyncio.sleep`.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens=1):
+        with self.lock:
+            self._refill(time.time())
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def consume(self):
+        """Blocks until a token is available."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveRateLimiter(object):
+    """
+        Per-account request pacing tuned from the server's answers.
+
+        Requests are not paced (`rate=None`) until the first 429 or
+        `feedback_required`, which sets the rate to `decrease` times the
+        rate observed over the last `window` requests. Every later one
+        multiplies it by `decrease` again and every successful response
+        adds `increase` requests per second back, so the rate settles just
+        below what the account is allowed.
+
+        A throttled response also holds all requests back: for the
+        `Retry-After` the server sent or else for an exponential backoff
+        starting at `backoff` seconds, randomized by +-`jitter`.
+    """
+
+    def __init__(self, rate=None, burst=5, min_rate=1.0 / 60, increase=0.01,
+                 decrease=0.5, backoff=60, max_backoff=30 * 60, jitter=0.2,
+                 window=50):
+        self.burst = burst
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.blocked_until = 0.0
+        self.throttles = 0  # In a row
+        self.history = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    @property
+    def rate(self):
+        """Requests per second currently allowed, None if not paced."""
+        return self.bucket.rate if self.bucket is not None else None
+
+    def _observed_rate(self):
+        if len(self.history) < 2:
+            return None
+        span = self.history[-1] - self.history[0]
+        return (len(self.history) - 1) / span if span > 0 else None
+
+    def reserve(self):
+        """Returns how many seconds the caller has to wait to send a request."""
+        with self.lock:
+            now = time.time()
+            self.history.append(now)
+            wait = max(0.0, self.blocked_until - now)
+            bucket = self.bucket
+        if bucket is not None:
+            wait = max(wait, bucket.reserve())
+        return wait
+
+    def wait(self):
+        """Blocks until a request may be sent."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_success(self):
+        with self.lock:
+            self.throttles = 0
+            if self.bucket is not None:
+                with self.bucket.lock:
+                    self.bucket.rate += self.increase
+
+    def on_throttle(self, retry_after=None):
+        """
+            Slows down after a 429 or `feedback_required` and returns for
+            how many seconds requests are held back.
+        """
+        with self.lock:
+            self.throttles += 1
+            if self.bucket is None:
+                rate = self._observed_rate() or 1.0
+                self.bucket = TokenBucket(
+                    max(self.min_rate, rate * self.decrease), self.burst)
+            else:
+                with self.bucket.lock:
+                    self.bucket.rate = max(
+                        self.min_rate, self.bucket.rate * self.decrease)
+            if retry_after is None:
+                delay = min(self.max_backoff,
+                            self.backoff * 2 ** (self.throttles - 1))
+                delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            else:
+                delay = retry_after
+            self.blocked_until = max(self.blocked_until, time.time() + delay)
+            return delay
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a `Retry-After` header, None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
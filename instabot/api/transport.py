@@ -0,0 +1,69 @@
+"""
+    HTTP sessions for `API` with tunable keep-alive connection pools.
+
+    Every `API` mounts an `HTTPAdapter` with `pool_connections` host pools
+    of up to `pool_maxsize` kept-alive connections each. With
+    `share_connections=True` all accounts going through the same proxy
+    mount one adapter, so a TCP/TLS connection opened by one account is
+    reused by the others. Cookies live on each session, not on the adapter,
+    so accounts don't see each other's login.
+
+    Sessions get a `VersionedCookieJar`, whose `version` changes whenever a
+    cookie is set or cleared, so `API` can cache values derived from the
+    cookies instead of re-reading the jar on every request.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+
+_shared_adapters = {}
+_shared_adapters_lock = threading.Lock()
+
+
+class VersionedCookieJar(RequestsCookieJar):
+    """`RequestsCookieJar` that counts its modifications in `version`."""
+
+    version = 0
+
+    def set_cookie(self, cookie, *args, **kwargs):
+        self.version += 1
+        return super(VersionedCookieJar, self).set_cookie(cookie, *args, **kwargs)
+
+    def clear(self, domain=None, path=None, name=None):
+        self.version += 1
+        return super(VersionedCookieJar, self).clear(domain, path, name)
+
+    def clear_session_cookies(self):
+        self.version += 1
+        return super(VersionedCookieJar, self).clear_session_cookies()
+
+    def clear_expired_cookies(self):
+        self.version += 1
+        return super(VersionedCookieJar, self).clear_expired_cookies()
+
+
+def get_adapter(proxy=None, pool_connections=10, pool_maxsize=10,
+                share_connections=False):
+    if not share_connections:
+        return HTTPAdapter(pool_connections=pool_connections,
+                           pool_maxsize=pool_maxsize)
+    key = (proxy or '', pool_connections, pool_maxsize)
+    with _shared_adapters_lock:
+        if key not in _shared_adapters:
+            _shared_adapters[key] = HTTPAdapter(
+                pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        return _shared_adapters[key]
+
+
+def create_session(proxy=None, pool_connections=10, pool_maxsize=10,
+                   share_connections=False):
+    session = requests.Session()
+    session.cookies = VersionedCookieJar()
+    adapter = get_adapter(proxy, pool_connections, pool_maxsize,
+                          share_connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -0,0 +1,123 @@
+"""
+    Bloom filter kept in a memory-mapped file.
+
+    Usage:
+        seen = BloomFilter('processed.bloom', capacity=10 ** 7)
+        seen.add('1234567')
+        '1234567' in seen  # True
+        '7654321' in seen  # False, or True with probability `error_rate`
+
+    A negative answer is certain, a positive one may be wrong at the rate
+    given at creation, so positives need an exact check elsewhere. The
+    bits live in the file and the OS pages in only what lookups touch, a
+    10 million item filter at 1% takes 12 MB on disk. `path=None` keeps
+    the bits in memory.
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+MAGIC = b'IBBLOOM1'
+HEADER = struct.Struct('<8sQIQ16s')
+HEADER_SIZE = 64
+
+
+class BloomFilter(object):
+    def __init__(self, path=None, capacity=10 ** 7, error_rate=0.01):
+        """An existing file is opened as is, `capacity` only sizes new ones."""
+        self.path = path
+        if path is not None and os.path.isfile(path) and os.path.getsize(path) > HEADER_SIZE:
+            self._file = open(path, 'r+b')
+            self._bits = mmap.mmap(self._file.fileno(), 0)
+            magic, self.size, self.hashes, self.count, self._signature = \
+                HEADER.unpack(self._bits[:HEADER.size])
+            if magic != MAGIC:
+                raise ValueError('`{}` is not a Bloom filter file'.format(path))
+            return
+
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / float(capacity) * math.log(2))))
+        self.count = 0
+        self._signature = b'\0' * 16
+        length = HEADER_SIZE + (self.size + 7) // 8
+        if path is None:
+            self._file = None
+            self._bits = bytearray(length)
+        else:
+            with open(path, 'wb') as f:
+                f.truncate(length)
+            self._file = open(path, 'r+b')
+            self._bits = mmap.mmap(self._file.fileno(), 0)
+        self._write_header()
+
+    def _write_header(self):
+        self._bits[:HEADER.size] = HEADER.pack(
+            MAGIC, self.size, self.hashes, self.count, self._signature)
+
+    def _positions(self, item):
+        if not isinstance(item, bytes):
+            item = str(item).encode('utf-8')
+        h1, h2 = struct.unpack('<QQ', hashlib.md5(item).digest())
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def _byte(self, index):
+        byte = self._bits[index]
+        return byte if isinstance(byte, int) else ord(byte)
+
+    def add(self, item):
+        """Adds `item`, returns False if it was (probably) there already."""
+        new = False
+        for position in self._positions(item):
+            index = HEADER_SIZE + position // 8
+            byte = self._byte(index)
+            mask = 1 << (position % 8)
+            if not byte & mask:
+                new = True
+                self._bits[index:index + 1] = struct.pack('B', byte | mask)
+        if new:
+            self.count += 1
+        return new
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        for position in self._positions(item):
+            if not self._byte(HEADER_SIZE + position // 8) & (1 << (position % 8)):
+                return False
+        return True
+
+    def __len__(self):
+        """Approximate number of distinct items added."""
+        return self.count
+
+    @property
+    def signature(self):
+        """16 bytes the owner stores with the bits, e.g. what they were built from."""
+        return self._signature
+
+    @signature.setter
+    def signature(self, value):
+        self._signature = value
+        self._write_header()
+
+    def clear(self):
+        self._bits[HEADER_SIZE:] = b'\0' * (len(self._bits) - HEADER_SIZE)
+        self.count = 0
+        self._write_header()
+
+    def flush(self):
+        self._write_header()
+        if self._file is not None:
+            self._bits.flush()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._bits.close()
+            self._file.close()
+            self._file = None
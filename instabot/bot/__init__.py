@@ -1,3 +1,4 @@
 from .bot import Bot
+from .pool import BotPool
 
-assert Bot  # silence pyflakes
+assert all((Bot, BotPool))  # silence pyflakes
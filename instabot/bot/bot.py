@@ -2,26 +2,37 @@ import atexit
 import datetime
 import random
 import signal
+import threading
 import time
 
 from .. import utils
 from ..api import API
+from ..cache import (LOCATIONS_TTL, USER_INFO_FIELD_TTLS, USER_INFO_TTL,
+                     USERNAME_TTL, SQLiteCacheBackend, TTLCache)
+from ..geo import LocationIndex
+from ..storage import open_storage
 from .bot_archive import archive, archive_medias, unarchive_medias
 from .bot_block import block, block_bots, block_users, unblock, unblock_users
 from .bot_checkpoint import load_checkpoint, save_checkpoint
 from .bot_comment import (comment, comment_geotag, comment_hashtag,
                           comment_medias, comment_user, comment_users,
                           is_commented, reply_to_comment)
+from .bot_crawl import crawl_hashtags
 from .bot_delete import delete_comment, delete_media, delete_medias
 from .bot_direct import (send_hashtag, send_like, send_media, send_medias,
                          send_message, send_messages, send_profile)
-from .bot_filter import check_media, check_not_bot, check_user, filter_medias
+from .bot_filter import (check_media, check_not_bot, check_user,
+                         compile_user_filter, filter_medias,
+                         filter_users_batch, screen_users)
 from .bot_follow import (follow, follow_followers, follow_following,
                          follow_users)
-from .bot_get import (convert_to_user_id, get_archived_medias, get_comment,
-                      get_comment_likers, get_geotag_medias, get_geotag_users,
+from .bot_get import (LOCATION_RADIUS, MAX_LOCATION_SEARCHES, MAX_LOCATIONS,
+                      convert_to_user_id, get_archived_medias, get_comment,
+                      get_comment_likers, get_geotag_locations,
+                      get_geotag_medias, get_geotag_users,
                       get_hashtag_medias, get_hashtag_users,
                       get_last_user_medias, get_locations_from_coordinates,
+                      get_locations_in_bbox,
                       get_media_commenters, get_media_comments,
                       get_media_comments_all, get_media_id_from_link,
                       get_link_from_media_id, get_media_info, get_media_likers,
@@ -31,9 +42,12 @@ from .bot_get import (convert_to_user_id, get_archived_medias, get_comment,
                       get_user_followers, get_user_following,
                       get_user_id_from_username, get_user_info,
                       get_user_likers, get_user_medias, get_user_tags_medias,
-                      get_username_from_user_id, get_your_medias, search_users)
+                      get_username_from_user_id, get_your_medias,
+                      iter_geotag_medias, iter_hashtag_medias,
+                      iter_location_medias, search_users)
 from .bot_like import (like, like_comment, like_followers, like_following,
-                       like_geotag, like_hashtag, like_media_comments,
+                       like_geotag, like_hashtag, like_hashtags,
+                       like_media_comments,
                        like_medias, like_timeline, like_user, like_users)
 from .bot_photo import download_photo, download_photos, upload_photo
 from .bot_stats import save_user_stats
@@ -44,6 +58,10 @@ from .bot_unfollow import (unfollow, unfollow_everyone, unfollow_non_followers,
 from .bot_unlike import (unlike, unlike_comment, unlike_media_comments,
                          unlike_medias, unlike_user)
 from .bot_video import upload_video
+from .follow_sync import refresh_user_ids
+from .processed import GuardedList, filter_path
+from .resolved_list import ResolvedList
+from .scheduler import ActionScheduler
 
 
 class Bot(object):
@@ -92,9 +110,29 @@ class Bot(object):
                  blacklist_hashtags=['#shop', '#store', '#free'],
                  blocked_actions_protection=True,
                  verbosity=True,
-                 device=None
+                 device=None,
+                 storage=None,
+                 screening_workers=4,
+                 screening_rate=2,
+                 cache_file=None,
+                 cache_max_entries=10000,
+                 pool_connections=10,
+                 pool_maxsize=10,
+                 share_connections=False,
+                 response_cache=None,
+                 stop_words_whole_words=False,
+                 snapshot_file=None,
+                 processed_filter=None,
+                 user_infos=None,
+                 usernames=None,
+                 locations=None,
+                 log_handlers=None
                  ):
-        self.api = API(device=device)
+        self.api = API(device=device, pool_connections=pool_connections,
+                       pool_maxsize=pool_maxsize,
+                       share_connections=share_connections,
+                       response_cache=response_cache,
+                       log_handlers=log_handlers)
 
         self.total = {'likes': 0,
                       'unlikes': 0,
@@ -119,6 +157,7 @@ class Bot(object):
                        'message': message_delay}
 
         self.last = {key: 0 for key in self.delays.keys()}
+        self.scheduler = ActionScheduler(self.delays, self.last)
 
         # limits - follow
         self.filter_users = filter_users
@@ -127,6 +166,8 @@ class Bot(object):
         self.filter_business_accounts = filter_business_accounts
         self.filter_verified_accounts = filter_verified_accounts
         self.filter_previously_followed = filter_previously_followed
+        # `check_user` rules, reordered as they learn which ones reject most
+        self.user_filter = compile_user_filter()
 
         self.max_per_day = {'likes': max_likes_per_day,
                             'unlikes': max_unlikes_per_day,
@@ -157,8 +198,12 @@ class Bot(object):
         self.max_followers_to_following_ratio = max_followers_to_following_ratio
         self.max_following_to_followers_ratio = max_following_to_followers_ratio
         self.min_media_count_to_follow = min_media_count_to_follow
+        self.screening_workers = screening_workers
+        self.screening_rate = screening_rate
         self.stop_words = stop_words
+        self.stop_words_whole_words = stop_words_whole_words
         self.blacklist_hashtags = blacklist_hashtags
+        self._matchers = {}  # Compiled `stop_words` and `blacklist_hashtags`
 
         # limits - block
         self.max_following_to_block = max_following_to_block
@@ -166,17 +211,49 @@ class Bot(object):
         # current following and followers
         self._following = None
         self._followers = None
-        self._user_infos = {}  # User info cache
-        self._usernames = {}  # `username` to `user_id` mapping
-
-        # Database files
-        self.followed_file = utils.file(followed_file)
-        self.unfollowed_file = utils.file(unfollowed_file)
-        self.skipped_file = utils.file(skipped_file)
-        self.friends_file = utils.file(friends_file)
-        self.comments_file = utils.file(comments_file)
-        self.blacklist_file = utils.file(blacklist_file)
-        self.whitelist_file = utils.file(whitelist_file)
+        self._sync_lock = threading.RLock()  # One sync at a time
+        self.snapshot_file = snapshot_file
+        # User info cache and `username` to `user_id` mapping, kept on disk
+        # between restarts when `cache_file` is set, unless given (shared)
+        if user_infos is None:
+            user_infos = TTLCache(
+                cache_max_entries, USER_INFO_TTL, USER_INFO_FIELD_TTLS,
+                SQLiteCacheBackend(cache_file, 'user_infos') if cache_file else None)
+        if usernames is None:
+            usernames = TTLCache(
+                cache_max_entries, USERNAME_TTL,
+                backend=SQLiteCacheBackend(cache_file, 'usernames') if cache_file else None)
+        # Every location `search_location` returned, by coordinates
+        if locations is None:
+            locations = LocationIndex(cache_file, ttl=LOCATIONS_TTL)
+        self._user_infos = user_infos
+        self._usernames = usernames
+        self._locations = locations
+        self.api.user_infos = self._user_infos
+        self.api.locations = self._locations
+
+        # Database files, `storage='sqlite:///state.db'` keeps them in SQLite
+        self.storage = open_storage(storage)
+        self.followed_file = self._open_list('followed', followed_file)
+        self.unfollowed_file = self._open_list('unfollowed', unfollowed_file)
+        self.skipped_file = self._open_list('skipped', skipped_file)
+        self.friends_file = self._open_list('friends', friends_file)
+        self.comments_file = self._open_list('comments', comments_file)
+        self.blacklist_file = self._open_list('blacklist', blacklist_file)
+        self.whitelist_file = self._open_list('whitelist', whitelist_file)
+        # Resolved to user ids once, refreshed when the files change
+        self._whitelist = ResolvedList(self, self.whitelist_file)
+        self._blacklist = ResolvedList(self, self.blacklist_file)
+        # Bloom filters answering `user_id in bot.followed_file` and co.
+        self.processed_users = []
+        if processed_filter is not None:
+            self.followed_file, self.unfollowed_file, self.skipped_file = [
+                GuardedList(list_file, filter_path(processed_filter, name))
+                for name, list_file in (('followed', self.followed_file),
+                                        ('unfollowed', self.unfollowed_file),
+                                        ('skipped', self.skipped_file))]
+            self.processed_users = [
+                self.followed_file, self.unfollowed_file, self.skipped_file]
 
         self.proxy = proxy
         self.verbosity = verbosity
@@ -184,6 +261,13 @@ class Bot(object):
         self.logger = self.api.logger
         self.logger.info('Instabot Started')
 
+    def _open_list(self, name, fname):
+        if self.storage is None:
+            return utils.file(fname)
+        # The text file is imported only the first time it's seen
+        self.storage.import_file(name, fname)
+        return self.storage.table(name)
+
     @property
     def user_id(self):
         # For compatibility
@@ -204,37 +288,39 @@ class Bot(object):
         # For compatibility
         return self.api.last_json
 
+    @property
+    def filter_stats(self):
+        """Calls, hits and seconds spent of each `check_user` rule."""
+        return self.user_filter.stats()
+
+    @property
+    def cache_stats(self):
+        return {'user_infos': self._user_infos.stats(),
+                'usernames': self._usernames.stats()}
+
     @property
     def blacklist(self):
-        # This is a fast operation because `get_user_id_from_username` is cached.
-        return [self.convert_to_user_id(i) for i in self.blacklist_file.list
-                if i is not None]
+        """Frozen set of the blacklisted user ids."""
+        return self._blacklist.ids
 
     @property
     def whitelist(self):
-        # This is a fast operation because `get_user_id_from_username` is cached.
-        return [self.convert_to_user_id(i) for i in self.whitelist_file.list
-                if i is not None]
+        """Frozen set of the whitelisted user ids."""
+        return self._whitelist.ids
 
     @property
     def following(self):
-        now = time.time()
-        last = self.last.get('updated_following', now)
-        if self._following is None or now - last > 7200:
-            self.console_print('`bot.following` is empty, will download.', 'green')
-            self._following = self.get_user_following(self.user_id)
-            self.last['updated_following'] = now
-        return self._following
+        """Ids the account follows, see `follow_sync`."""
+        with self._sync_lock:
+            self._following = refresh_user_ids(self, 'followings', self._following)
+            return self._following
 
     @property
     def followers(self):
-        now = time.time()
-        last = self.last.get('updated_followers', now)
-        if self._followers is None or now - last > 7200:
-            self.console_print('`bot.followers` is empty, will download.', 'green')
-            self._followers = self.get_user_followers(self.user_id)
-            self.last['updated_followers'] = now
-        return self._followers
+        """Ids following the account, see `follow_sync`."""
+        with self._sync_lock:
+            self._followers = refresh_user_ids(self, 'followers', self._followers)
+            return self._followers
 
     def version(self):
         try:
@@ -245,6 +331,8 @@ class Bot(object):
 
     def logout(self, *args, **kwargs):
         save_checkpoint(self)
+        for guarded_list in self.processed_users:
+            guarded_list.flush()
         self.api.logout()
         self.logger.info("Bot stopped. "
                          "Worked: %s", datetime.datetime.now() - self.start_time)
@@ -276,13 +364,19 @@ class Bot(object):
         self.logger.info("Total requests: {}".format(self.api.total_requests))
 
     def delay(self, key):
-        """Sleep only if elapsed time since `self.last[key]` < `self.delay[key]`."""
-        last_action, target_delay = self.last[key], self.delays[key]
-        elapsed_time = time.time() - last_action
-        if elapsed_time < target_delay:
-            t_remaining = target_delay - elapsed_time
-            time.sleep(t_remaining * random.uniform(0.25, 1.25))
-        self.last[key] = time.time()
+        """Sleep only until the `key` lane of `self.scheduler` opens."""
+        self.scheduler.wait(key)
+
+    def schedule(self, key, func, *args, **kwargs):
+        """Queues `func(*args, **kwargs)` on the `key` lane, see `run_scheduled`."""
+        self.scheduler.submit(key, func, *args, **kwargs)
+
+    def run_scheduled(self):
+        """
+            Runs the queued actions, each as soon as its own lane's delay
+            allows, and returns `(key, result)` pairs in the order they ran.
+        """
+        return self.scheduler.run()
 
     def error_delay(self):
         time.sleep(10)
@@ -350,11 +444,35 @@ class Bot(object):
     def get_total_hashtag_medias(self, hashtag, amount=100, filtration=False):
         return get_total_hashtag_medias(self, hashtag, amount, filtration)
 
-    def get_geotag_medias(self, geotag, filtration=True):
-        return get_geotag_medias(self, geotag, filtration)
+    def iter_hashtag_medias(self, hashtag, amount=None, filtration=True, is_comment=False):
+        return iter_hashtag_medias(self, hashtag, amount, filtration, is_comment)
 
-    def get_locations_from_coordinates(self, latitude, longitude):
-        return get_locations_from_coordinates(self, latitude, longitude)
+    def iter_location_medias(self, location_id, amount=None, filtration=True, is_comment=False):
+        return iter_location_medias(self, location_id, amount, filtration, is_comment)
+
+    def crawl_hashtags(self, hashtags, amount=None, score=None, pages=1,
+                       filtration=True, is_comment=False, workers=4):
+        return crawl_hashtags(self, hashtags, amount, score, pages,
+                              filtration, is_comment, workers)
+
+    def get_geotag_locations(self, geotag):
+        return get_geotag_locations(self, geotag)
+
+    def iter_geotag_medias(self, geotag, amount=None, filtration=True, is_comment=False, pages=None):
+        return iter_geotag_medias(self, geotag, amount, filtration, is_comment, pages)
+
+    def get_geotag_medias(self, geotag, filtration=True, amount=100):
+        return get_geotag_medias(self, geotag, filtration, amount)
+
+    def get_locations_from_coordinates(self, latitude, longitude, radius=LOCATION_RADIUS,
+                                       max_searches=MAX_LOCATION_SEARCHES,
+                                       limit=MAX_LOCATIONS):
+        return get_locations_from_coordinates(self, latitude, longitude, radius,
+                                              max_searches, limit)
+
+    def get_locations_in_bbox(self, south, west, north, east,
+                              max_searches=MAX_LOCATION_SEARCHES):
+        return get_locations_in_bbox(self, south, west, north, east, max_searches)
 
     def get_media_info(self, media_id):
         return get_media_info(self, media_id)
@@ -365,8 +483,8 @@ class Bot(object):
     def get_hashtag_users(self, hashtag):
         return get_hashtag_users(self, hashtag)
 
-    def get_geotag_users(self, geotag):
-        return get_geotag_users(self, geotag)
+    def get_geotag_users(self, geotag, pages=1):
+        return get_geotag_users(self, geotag, pages)
 
     def get_user_id_from_username(self, username):
         return get_user_id_from_username(self, username)
@@ -377,8 +495,8 @@ class Bot(object):
     def get_username_from_user_id(self, user_id):
         return get_username_from_user_id(self, user_id)
 
-    def get_user_info(self, user_id, use_cache=True):
-        return get_user_info(self, user_id, use_cache)
+    def get_user_info(self, user_id, use_cache=True, fields=None):
+        return get_user_info(self, user_id, use_cache, fields)
 
     def get_user_followers(self, user_id, nfollows=None):
         return get_user_followers(self, user_id, nfollows)
@@ -442,12 +560,15 @@ class Bot(object):
     def like_media_comments(self, media_id):
         return like_media_comments(self, media_id)
 
-    def like_user(self, user_id, amount=None, filtration=True):
-        return like_user(self, user_id, amount, filtration)
+    def like_user(self, user_id, amount=None, filtration=True, check_user=True):
+        return like_user(self, user_id, amount, filtration, check_user)
 
     def like_hashtag(self, hashtag, amount=None):
         return like_hashtag(self, hashtag, amount)
 
+    def like_hashtags(self, hashtags, amount=None):
+        return like_hashtags(self, hashtags, amount)
+
     def like_geotag(self, geotag, amount=None):
         return like_geotag(self, geotag, amount)
 
@@ -495,8 +616,8 @@ class Bot(object):
 
     # follow
 
-    def follow(self, user_id):
-        return follow(self, user_id)
+    def follow(self, user_id, check_user=True):
+        return follow(self, user_id, check_user)
 
     def follow_users(self, user_ids):
         return follow_users(self, user_ids)
@@ -589,8 +710,8 @@ class Bot(object):
     def comment_users(self, user_ids, ncomments=None):
         return comment_users(self, user_ids, ncomments)
 
-    def comment_geotag(self, geotag):
-        return comment_geotag(self, geotag)
+    def comment_geotag(self, geotag, amount=None):
+        return comment_geotag(self, geotag, amount)
 
     def is_commented(self, media_id):
         return is_commented(self, media_id)
@@ -620,8 +741,14 @@ class Bot(object):
     def check_media(self, media):
         return check_media(self, media)
 
-    def check_user(self, user, unfollowing=False):
-        return check_user(self, user, unfollowing)
+    def check_user(self, user, unfollowing=False, skip_skipped=False):
+        return check_user(self, user, unfollowing, skip_skipped)
+
+    def screen_users(self, user_ids, unfollowing=False, skip_skipped=False):
+        return screen_users(self, user_ids, unfollowing, skip_skipped)
+
+    def filter_users_batch(self, user_infos, batch_size=100000):
+        return filter_users_batch(self, user_infos, batch_size)
 
     def check_not_bot(self, user):
         return check_not_bot(self, user)
@@ -68,14 +68,20 @@ def reply_to_comment(self, media_id, comment_text, parent_comment_id):
 
 def comment_medias(self, medias):
     broken_items = []
-    self.logger.info("Going to comment %d medias." % (len(medias)))
+    if hasattr(medias, '__len__'):
+        self.logger.info("Going to comment %d medias." % (len(medias)))
+    else:
+        self.logger.info("Going to comment medias as they are found.")
     for media in tqdm(medias):
         if not self.is_commented(media):
             text = self.get_comment()
             self.logger.info("Commented with text: %s" % text)
             if not self.comment(media, text):
                 self.delay('comment')
-                broken_items = medias[medias.index(media):]
+                if isinstance(medias, list):
+                    broken_items = medias[medias.index(media):]
+                else:
+                    broken_items = [media]  # The rest wasn't fetched
                 break
     self.logger.info("DONE: Total commented on %d medias. " %
                      self.total['comments'])
@@ -84,7 +90,10 @@ def comment_medias(self, medias):
 
 def comment_hashtag(self, hashtag, amount=None):
     self.logger.info("Going to comment medias by %s hashtag" % hashtag)
-    medias = self.get_total_hashtag_medias(hashtag, amount)
+    if amount is None:
+        medias = self.get_total_hashtag_medias(hashtag, amount)
+    else:
+        medias = self.iter_hashtag_medias(hashtag, amount, is_comment=True)
     return self.comment_medias(medias)
 
 
@@ -110,9 +119,11 @@ def comment_users(self, user_ids, ncomments=None):
         self.comment_user(user_id, amount=ncomments)
 
 
-def comment_geotag(self, geotag):
-    # TODO: comment every media from geotag
-    pass
+def comment_geotag(self, geotag, amount=None):
+    self.logger.info("Going to comment medias from geotag %s." % (geotag,))
+    medias = self.iter_geotag_medias(
+        geotag, amount, is_comment=True, pages=1 if amount is None else None)
+    return self.comment_medias(medias)
 
 
 def is_commented(self, media_id):
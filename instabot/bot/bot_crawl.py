@@ -0,0 +1,106 @@
+"""
+    Crawls several hashtags at once into one ranked stream of medias.
+
+    Usage:
+        medias = bot.crawl_hashtags(['cat', 'kitten', 'catsofinstagram'], 100)
+        bot.like_medias(medias)
+
+    The feeds are fetched concurrently, a page of every tag per round. A
+    media carrying several of the tags is filtered and yielded once. Each
+    round's new medias are ranked by `score(media, tags)`, higher first,
+    before they go to the caller; the next round is only fetched when the
+    caller wants more.
+"""
+
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class MediaScore(object):
+    """
+        Default ranking: newer medias first, halving every `half_life`
+        seconds, halved again outside the `like_window` of
+        `(min_likes, max_likes)` and boosted by `tag_weight` for every
+        extra crawled tag the media carries.
+    """
+
+    def __init__(self, half_life=6 * 3600, like_window=None, tag_weight=0.5):
+        self.half_life = half_life
+        self.like_window = like_window
+        self.tag_weight = tag_weight
+
+    def __call__(self, media, tags):
+        age = max(0, time.time() - media.get('taken_at', time.time()))
+        score = 0.5 ** (float(age) / self.half_life)
+        if self.like_window is not None:
+            low, high = self.like_window
+            if not low <= media.get('like_count', 0) <= high:
+                score *= 0.5
+        return score * (1 + self.tag_weight * (len(tags) - 1))
+
+
+def _next_page(feed):
+    try:
+        return next(feed)
+    except StopIteration:
+        return None
+
+
+def _fetch_round(executor, feeds, tags):
+    """
+        The next page of every tag's feed, fetched concurrently. If a fetch
+        fails, the others are cancelled or waited for before raising, so no
+        feed is still running when the caller closes them.
+    """
+    futures = [executor.submit(_next_page, feeds[tag]) for tag in tags]
+    try:
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        raise
+
+
+def crawl_hashtags(self, hashtags, amount=None, score=None, pages=1,
+                   filtration=True, is_comment=False, workers=4):
+    """
+        Yields up to `amount` media ids from the feeds of `hashtags`, at
+        most `pages` pages per tag (`None` for all of them).
+    """
+    score = score or MediaScore()
+    feeds = dict((tag, self.api.iter_hashtag_feed(tag)) for tag in hashtags)
+    fetched = dict.fromkeys(feeds, 0)
+    seen = set()
+    yielded = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while feeds:
+            tags = list(feeds)
+            candidates = {}  # pk -> (media, tags it was found with)
+            for tag, page in zip(tags, _fetch_round(executor, feeds, tags)):
+                fetched[tag] += 1
+                if page is None or (pages is not None and fetched[tag] >= pages):
+                    feeds.pop(tag).close()
+                for media in page or ():
+                    if media.get('pk') is None or media['pk'] in seen:
+                        continue
+                    candidates.setdefault(media['pk'], (media, []))[1].append(tag)
+            seen.update(candidates)
+            accepted = set(self.filter_medias(
+                [media for media, _ in candidates.values()],
+                filtration, quiet=True, is_comment=is_comment))
+            ranked = sorted((pair for pk, pair in candidates.items() if pk in accepted),
+                            key=lambda pair: -score(*pair))
+            self.logger.info("Crawled {} new medias of {}, {} left after filtration.".format(
+                len(candidates), ', '.join('#' + tag for tag in tags), len(ranked)))
+            for media, _ in ranked:
+                yield media['pk']
+                yielded += 1
+                if amount is not None and yielded >= amount:
+                    return
+    finally:
+        for feed in feeds.values():
+            feed.close()
+        executor.shutdown(wait=False)
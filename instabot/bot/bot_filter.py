@@ -2,6 +2,19 @@
     Filter functions for media and user lists.
 """
 
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from ..api.rate_limit import TokenBucket
+from ..matcher import TermMatcher
+from .rules import Rule, RulePipeline
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # `filter_users_batch` falls back to pure Python
+
 
 def filter_medias(self, media_items, filtration=True, quiet=False, is_comment=False):
     if filtration:
@@ -58,18 +71,21 @@ def _get_media_ids(media_items):
 
 
 def check_media(self, media_id):
-    if self.api.media_info(media_id):
-        medias = self.api.last_json["items"]
-
-        if search_blacklist_hashtags_in_media(self, media_id):
-            msg = 'Blacklist hashtag found in media, skipping!'
-            self.console_print(msg, 'red')
+    # `media_info` is fetched once for this check and every helper below
+    with self.api.screening_context():
+        response = self.api.call('media_info', media_id)
+        if response:
+            medias = response.json["items"]
+
+            if search_blacklist_hashtags_in_media(self, media_id):
+                msg = 'Blacklist hashtag found in media, skipping!'
+                self.console_print(msg, 'red')
+                return False
+
+            if self.filter_medias(medias, quiet=True):
+                return check_user(self, self.get_media_owner(media_id))
             return False
 
-        if self.filter_medias(medias, quiet=True):
-            return check_user(self, self.get_media_owner(media_id))
-        return False
-
     msg = 'Media ID error!'
     self.console_print(msg, 'red')
     return False
@@ -77,154 +93,335 @@ def check_media(self, media_id):
 
 # Filter users
 
-def search_stop_words_in_user(self, user_info):
-    text = ''
-    if 'biography' in user_info:
-        text += user_info['biography'].lower()
-
-    if 'username' in user_info:
-        text += user_info['username'].lower()
+def _get_matcher(self, name, whole_words=False):
+    """`TermMatcher` of the list `self.<name>`, recompiled when it changes."""
+    terms = tuple(getattr(self, name))
+    matcher = self._matchers.get(name)
+    if matcher is None or matcher.terms != terms or matcher.whole_words != whole_words:
+        matcher = self._matchers[name] = TermMatcher(terms, whole_words)
+    return matcher
 
-    if 'full_name' in user_info:
-        text += user_info['full_name'].lower()
 
-    for stop_word in self.stop_words:
-        if stop_word in text:
-            return True
-
-    return False
+def search_stop_words_in_user(self, user_info):
+    text = '\n'.join(user_info[key] for key in ('biography', 'username', 'full_name')
+                     if user_info.get(key))
+    matcher = _get_matcher(self, 'stop_words', self.stop_words_whole_words)
+    return matcher.find(text) is not None
 
 
 def search_blacklist_hashtags_in_media(self, media_id):
     media_info = self.get_media_info(media_id)
-    text = media_info[0]['caption']['text'] if media_info[0]['caption'] else ''
+    texts = [media_info[0]['caption']['text'] if media_info[0]['caption'] else '']
 
     media_comments = self.get_media_comments(media_id)
-    comments_number = min(6, len(media_comments))
-
-    for i in range(0, comments_number):
-        text += ''.join(media_comments[i]['text'])
+    texts += [comment['text'] for comment in media_comments[:6]]
 
-    return any((h in text) for h in self.blacklist_hashtags)
+    matcher = _get_matcher(self, 'blacklist_hashtags')
+    return matcher.find('\n'.join(texts)) is not None
 
 
-def check_user(self, user_id, unfollowing=False):
+def check_user(self, user_id, unfollowing=False, skip_skipped=False):
+    """
+        Whether `user_id` passes the user filter. With `skip_skipped`, as
+        when following, users in `skipped_file` are rejected too.
+    """
     if not self.filter_users and not unfollowing:
         return True
 
     self.small_delay()
+    return _check_user(self, user_id, unfollowing, skip_skipped)
+
+
+def _check_user(self, user_id, unfollowing=False, skip_skipped=False):
     user_id = self.convert_to_user_id(user_id)
 
     if not user_id:
         self.console_print('not user_id, skipping!', 'red')
         return False
-    if user_id in self.whitelist:
-        self.console_print('`user_id` in `self.whitelist`.', 'green')
-        return True
-    if user_id in self.blacklist:
-        self.console_print('`user_id` in `self.blacklist`.', 'red')
-        return False
-
-    if user_id == str(self.user_id):
-        self.console_print("`user_id` equals bot's `user_id`, skipping!", 'green')
-        return False
+    context = {'unfollowing': unfollowing, 'skip_skipped': skip_skipped and not unfollowing}
+    return self.user_filter.run(self, user_id, context)
 
-    if user_id in self.following:
-        if not unfollowing:
-            # Log to Console
-            self.console_print('Already following, skipping!', 'red')
-        return False
 
+def _load_user_info(self, user_id, context):
     user_info = self.get_user_info(user_id)
     if not user_info:
         self.console_print('not `user_info`, skipping!', 'red')
         return False
-
     msg = 'USER_NAME: {username}, FOLLOWER: {followers}, FOLLOWING: {following}'
-    follower_count = user_info["follower_count"]
-    following_count = user_info["following_count"]
     self.console_print(msg.format(
         username=user_info["username"],
-        followers=follower_count,
-        following=following_count
+        followers=user_info["follower_count"],
+        following=user_info["following_count"]
     ))
+    context['user_info'] = user_info
+    return True
 
-    skipped = self.skipped_file
-    followed = self.followed_file
 
-    if not unfollowing:
-        if self.filter_previously_followed and user_id in followed.list:
-            self.console_print('info: account previously followed, skipping!', 'red')
-            return False
-    if "has_anonymous_profile_picture" in user_info and self.filter_users_without_profile_photo:
-        if user_info["has_anonymous_profile_picture"]:
-            self.console_print('info: account DOES NOT HAVE A PROFILE PHOTO, skipping! ', 'red')
-            skipped.append(user_id)
-            return False
-    if "is_private" in user_info and self.filter_private_users:
-        if user_info["is_private"]:
-            self.console_print('info: account is PRIVATE, skipping! ', 'red')
-            skipped.append(user_id)
-            return False
-    if "is_business" in user_info and self.filter_business_accounts:
-        if user_info["is_business"]:
-            self.console_print('info: is BUSINESS, skipping!', 'red')
-            skipped.append(user_id)
-            return False
-    if "is_verified" in user_info and self.filter_verified_accounts:
-        if user_info["is_verified"]:
-            self.console_print('info: is VERIFIED, skipping !', 'red')
-            skipped.append(user_id)
-            return False
+def _skip(self, user_id, context):
+    self.skipped_file.append(user_id)
 
-    if follower_count < self.min_followers_to_follow:
-        msg = 'follower_count < bot.min_followers_to_follow, skipping!'
-        self.console_print(msg, 'red')
-        skipped.append(user_id)
-        return False
-    if follower_count > self.max_followers_to_follow:
-        msg = 'follower_count > bot.max_followers_to_follow, skipping!'
-        self.console_print(msg, 'red')
-        skipped.append(user_id)
-        return False
-    if user_info["following_count"] < self.min_following_to_follow:
-        msg = 'following_count < bot.min_following_to_follow, skipping!'
-        self.console_print(msg, 'red')
-        skipped.append(user_id)
-        return False
-    if user_info["following_count"] > self.max_following_to_follow:
-        msg = 'following_count > bot.max_following_to_follow, skipping!'
-        self.console_print(msg, 'red')
-        skipped.append(user_id)
-        return False
-    try:
-        if follower_count / following_count > self.max_followers_to_following_ratio:
-            msg = 'follower_count / following_count > bot.max_followers_to_following_ratio, skipping!'
-            self.console_print(msg, 'red')
-            skipped.append(user_id)
-            return False
-        if following_count / follower_count > self.max_following_to_followers_ratio:
-            msg = 'following_count / follower_count > bot.max_following_to_followers_ratio, skipping!'
-            self.console_print(msg, 'red')
-            skipped.append(user_id)
-            return False
-    except ZeroDivisionError:
-        self.console_print('ZeroDivisionError: division by zero', 'red')
+
+def _print_following(self, user_id, context):
+    if not context['unfollowing']:
+        self.console_print('Already following, skipping!', 'red')
+
+
+def _is_following(self, user_id, context):
+    # Synced again once older than `follow_sync.SYNC_INTERVAL`
+    return user_id in self.following
+
+
+def _previously_followed(self, user_id, context):
+    if context['unfollowing'] or not self.filter_previously_followed:
         return False
+    return user_id in self.followed_file
 
-    if 'media_count' in user_info and user_info["media_count"] < self.min_media_count_to_follow:
-        msg = 'media_count < bot.min_media_count_to_follow, BOT or INACTIVE, skipping!'
-        self.console_print(msg, 'red')
-        skipped.append(user_id)
+
+def _previously_skipped(self, user_id, context):
+    return context['skip_skipped'] and user_id in self.skipped_file
+
+
+def _followers_to_following_ratio(self, info):
+    if not info['following_count']:
         return False
+    ratio = float(info['follower_count']) / info['following_count']
+    return ratio > self.max_followers_to_following_ratio
 
-    if search_stop_words_in_user(self, user_info):
-        msg = '`bot.search_stop_words_in_user` found in user, skipping!'
-        self.console_print(msg, 'red')
-        skipped.append(user_id)
+
+def _following_to_followers_ratio(self, info):
+    if not info['follower_count']:
         return False
+    ratio = float(info['following_count']) / info['follower_count']
+    return ratio > self.max_following_to_followers_ratio
+
+
+def _info_rule(name, check, message, on_fire=_skip):
+    return Rule(name, lambda self, user_id, context: check(self, context['user_info']),
+                stage=1, message=message, on_fire=on_fire)
+
+
+def _flag_rule(name, key, setting, message):
+    return _info_rule(name, lambda self, info: getattr(self, setting) and info.get(key),
+                      message)
+
+
+def compile_user_filter(reorder_every=100):
+    """
+        The rules of `check_user` as a `RulePipeline`: set lookups first,
+        then the rules on the user info, which is only fetched when the
+        former let the user through.
+    """
+    rules = [
+        Rule('whitelist', lambda self, user_id, context: user_id in self.whitelist,
+             outcome=True, message='`user_id` in `self.whitelist`.', color='green',
+             fixed=True),
+        Rule('blacklist', lambda self, user_id, context: user_id in self.blacklist,
+             message='`user_id` in `self.blacklist`.'),
+        Rule('self', lambda self, user_id, context: user_id == str(self.user_id),
+             message="`user_id` equals bot's `user_id`, skipping!", color='green'),
+        Rule('following', _is_following, on_fire=_print_following),
+        Rule('previously_followed', _previously_followed,
+             message='info: account previously followed, skipping!'),
+        Rule('previously_skipped', _previously_skipped,
+             message='info: account was skipped before, skipping!'),
+
+        _flag_rule('no_profile_photo', 'has_anonymous_profile_picture',
+                   'filter_users_without_profile_photo',
+                   'info: account DOES NOT HAVE A PROFILE PHOTO, skipping! '),
+        _flag_rule('private', 'is_private', 'filter_private_users',
+                   'info: account is PRIVATE, skipping! '),
+        _flag_rule('business', 'is_business', 'filter_business_accounts',
+                   'info: is BUSINESS, skipping!'),
+        _flag_rule('verified', 'is_verified', 'filter_verified_accounts',
+                   'info: is VERIFIED, skipping !'),
+        _info_rule('min_followers',
+                   lambda self, info: info['follower_count'] < self.min_followers_to_follow,
+                   'follower_count < bot.min_followers_to_follow, skipping!'),
+        _info_rule('max_followers',
+                   lambda self, info: info['follower_count'] > self.max_followers_to_follow,
+                   'follower_count > bot.max_followers_to_follow, skipping!'),
+        _info_rule('min_following',
+                   lambda self, info: info['following_count'] < self.min_following_to_follow,
+                   'following_count < bot.min_following_to_follow, skipping!'),
+        _info_rule('max_following',
+                   lambda self, info: info['following_count'] > self.max_following_to_follow,
+                   'following_count > bot.max_following_to_follow, skipping!'),
+        _info_rule('zero_division',
+                   lambda self, info: not info['follower_count'] or not info['following_count'],
+                   'ZeroDivisionError: division by zero', on_fire=None),
+        _info_rule('followers_to_following_ratio', _followers_to_following_ratio,
+                   'follower_count / following_count > bot.max_followers_to_following_ratio, skipping!'),
+        _info_rule('following_to_followers_ratio', _following_to_followers_ratio,
+                   'following_count / follower_count > bot.max_following_to_followers_ratio, skipping!'),
+        _info_rule('min_media_count',
+                   lambda self, info: info.get('media_count', float('inf')) < self.min_media_count_to_follow,
+                   'media_count < bot.min_media_count_to_follow, BOT or INACTIVE, skipping!'),
+        _info_rule('stop_words', search_stop_words_in_user,
+                   '`bot.search_stop_words_in_user` found in user, skipping!'),
+    ]
+    return RulePipeline(rules, loaders={1: _load_user_info}, reorder_every=reorder_every)
+
+
+def screen_users(self, user_ids, unfollowing=False, skip_skipped=False):
+    """
+        Yields the `user_ids` that pass `check_user`, in their original
+        order. Candidates are checked ahead of the consumer on a pool of
+        `self.screening_workers` threads which share a read budget of
+        `self.screening_rate` lookups per second instead of `small_delay`.
+    """
+    if not self.filter_users and not unfollowing:
+        for user_id in user_ids:
+            yield user_id
+        return
+    if self.screening_workers <= 1:
+        for user_id in user_ids:
+            if self.check_user(user_id, unfollowing, skip_skipped):
+                yield user_id
+        return
+
+    self.following  # Downloaded once here instead of in every worker
+    bucket = TokenBucket(self.screening_rate, self.screening_workers)
+    lookahead = 4 * self.screening_workers
+
+    def screen(user_id):
+        bucket.consume()
+        try:
+            return _check_user(self, user_id, unfollowing, skip_skipped)
+        except Exception as e:
+            self.logger.warning("Can't check user %s: %s", user_id, e)
+            return False
 
-    return True
+    user_ids = iter(user_ids)
+    executor = ThreadPoolExecutor(max_workers=self.screening_workers)
+    pending = deque((user_id, executor.submit(screen, user_id))
+                    for user_id in islice(user_ids, lookahead))
+    try:
+        while pending:
+            user_id, future = pending.popleft()
+            for next_user_id in islice(user_ids, 1):
+                pending.append((next_user_id, executor.submit(screen, next_user_id)))
+            if future.result():
+                yield user_id
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _ratio(numerator, denominator):
+    if np is not None and isinstance(denominator, np.ndarray):
+        return numerator / np.where(denominator == 0, 1, denominator)
+    return float(numerator) / denominator if denominator else 0.0
+
+
+def _user_rules(self):
+    """
+        `(name, rule)` in the order `check_user` applies them. A rule takes
+        columns of user info fields, either NumPy arrays or single values,
+        and is true where the user is rejected.
+    """
+    rules = []
+    if self.filter_users_without_profile_photo:
+        rules.append(('no_profile_photo', lambda c: c['has_anonymous_profile_picture']))
+    if self.filter_private_users:
+        rules.append(('private', lambda c: c['is_private']))
+    if self.filter_business_accounts:
+        rules.append(('business', lambda c: c['is_business']))
+    if self.filter_verified_accounts:
+        rules.append(('verified', lambda c: c['is_verified']))
+    rules += [
+        ('min_followers', lambda c: c['follower_count'] < self.min_followers_to_follow),
+        ('max_followers', lambda c: c['follower_count'] > self.max_followers_to_follow),
+        ('min_following', lambda c: c['following_count'] < self.min_following_to_follow),
+        ('max_following', lambda c: c['following_count'] > self.max_following_to_follow),
+        ('zero_division', lambda c: (c['follower_count'] == 0) | (c['following_count'] == 0)),
+        ('followers_to_following_ratio', lambda c: _ratio(
+            c['follower_count'], c['following_count']) > self.max_followers_to_following_ratio),
+        ('following_to_followers_ratio', lambda c: _ratio(
+            c['following_count'], c['follower_count']) > self.max_following_to_followers_ratio),
+        ('min_media_count', lambda c: c['media_count'] < self.min_media_count_to_follow),
+    ]
+    return rules
+
+
+USER_FLAGS = ('has_anonymous_profile_picture', 'is_private', 'is_business', 'is_verified')
+
+
+def _user_columns(user_infos):
+    """Numeric and flag fields of `user_infos`, missing ones never reject."""
+    columns = {}
+    for key in ('follower_count', 'following_count'):
+        columns[key] = [info[key] for info in user_infos]
+    columns['media_count'] = [info.get('media_count', float('inf')) for info in user_infos]
+    for key in USER_FLAGS:
+        columns[key] = [bool(info.get(key)) for info in user_infos]
+    return columns
+
+
+def _filter_users_chunk(self, user_infos, rules, rejections):
+    if not user_infos:
+        return []
+    if np is not None:
+        # Explicit dtypes, the flags must stay booleans for `&` and `~`
+        columns = dict((key, np.array(values, dtype=bool if key in USER_FLAGS else float))
+                       for key, values in _user_columns(user_infos).items())
+        accepted = np.ones(len(user_infos), dtype=bool)
+        for name, rule in rules:
+            rejected = rule(columns) & accepted
+            rejections[name] += int(rejected.sum())
+            accepted &= ~rejected
+        candidates = [info for info, ok in zip(user_infos, accepted) if ok]
+    else:
+        candidates = []
+        for info in user_infos:
+            columns = dict((key, values[0]) for key, values in _user_columns([info]).items())
+            for name, rule in rules:
+                if rule(columns):
+                    rejections[name] += 1
+                    break
+            else:
+                candidates.append(info)
+
+    accepted_ids = []
+    for info in candidates:
+        if search_stop_words_in_user(self, info):
+            rejections['stop_words'] += 1
+        else:
+            accepted_ids.append(str(info['pk']))
+    return accepted_ids
+
+
+def filter_users_batch(self, user_infos, batch_size=100000):
+    """
+        Applies the user info rules of `check_user` (account flags, the
+        follower and following limits and ratios, `min_media_count_to_follow`
+        and stop words) to many cached user infos at once, with NumPy when
+        it is installed. Whitelist, blacklist and following are not looked
+        at. Returns the accepted `pk`s and the number of users each rule
+        rejected first; infos missing counts are rejected as 'missing_fields'.
+    """
+    rules = _user_rules(self)
+    rejections = OrderedDict((name, 0) for name, _ in rules)
+    rejections['stop_words'] = 0
+    rejections['missing_fields'] = 0
+    accepted_ids = []
+    total = 0
+    user_infos = iter(user_infos)
+    while True:
+        chunk = list(islice(user_infos, batch_size))
+        if not chunk:
+            break
+        total += len(chunk)
+        complete = [info for info in chunk
+                    if 'follower_count' in info and 'following_count' in info]
+        rejections['missing_fields'] += len(chunk) - len(complete)
+        accepted_ids += _filter_users_chunk(self, complete, rules, rejections)
+        self.logger.info("Screened {} users, {} accepted so far.".format(
+            total, len(accepted_ids)))
+
+    self.logger.info("Rejected: {}".format(', '.join(
+        '{} {}'.format(count, name) for name, count in rejections.items() if count)))
+    return accepted_ids, rejections
 
 
 def check_not_bot(self, user_id):
@@ -1,29 +1,32 @@
-import time
-
 from tqdm import tqdm
 
 
-def follow(self, user_id):
+def follow(self, user_id, check_user=True):
     user_id = self.convert_to_user_id(user_id)
     msg = ' ===> Going to follow `user_id`: {}.'.format(user_id)
     self.console_print(msg)
-    if not self.check_user(user_id):
+    if check_user and not self.check_user(user_id, skip_skipped=True):
         return False
     if not self.reached_limit('follows'):
-        self.delay('follow')
-        if self.api.follow(user_id):
-            msg = '===> FOLLOWED <==== `user_id`: {}.'.format(user_id)
-            self.console_print(msg, 'green')
-            self.total['follows'] += 1
-            self.followed_file.append(user_id)
-            if user_id not in self.following:
-                self.following.append(user_id)
-            return True
-    else:
-        self.logger.info("Out of follows for today.")
+        return bool(_follow(self, user_id))
+    self.logger.info("Out of follows for today.")
     return False
 
 
+def _follow(self, user_id):
+    """ Follows `user_id`, returns the `ApiResponse` of the request """
+    self.delay('follow')
+    response = self.api.call('follow', user_id)
+    if response:
+        msg = '===> FOLLOWED <==== `user_id`: {}.'.format(user_id)
+        self.console_print(msg, 'green')
+        self.total['follows'] += 1
+        self.followed_file.append(user_id)
+        if user_id not in self.following:
+            self.following.append(user_id)
+    return response
+
+
 def follow_users(self, user_ids):
     broken_items = []
     if self.reached_limit('follows'):
@@ -37,30 +40,38 @@ def follow_users(self, user_ids):
     self.console_print(msg, 'green')
 
     # Remove skipped and already followed and unfollowed list from user_ids
-    user_ids = list(set(user_ids) - skipped.set - followed.set - unfollowed.set)
+    user_ids = skipped.difference(user_ids)
+    user_ids = list(unfollowed.difference(followed.difference(user_ids)))
     msg = 'After filtering followed, unfollowed and `{}`, {} user_ids left to follow.'
     msg = msg.format(skipped.fname, len(user_ids))
     self.console_print(msg, 'green')
-    for user_id in tqdm(user_ids, desc='Processed users'):
-        if self.reached_limit('follows'):
-            self.logger.info("Out of follows for today.")
-            break
-        if not self.follow(user_id):
-            if self.api.last_response.status_code == 404:
+    # Candidates are screened ahead on a worker pool, `follow` only paces
+    approved_user_ids = self.screen_users(user_ids, skip_skipped=True)
+    try:
+        for user_id in tqdm(approved_user_ids, total=len(user_ids), desc='Processed users'):
+            if self.reached_limit('follows'):
+                self.logger.info("Out of follows for today.")
+                break
+            self.console_print(' ===> Going to follow `user_id`: {}.'.format(user_id))
+            response = _follow(self, user_id)
+            if response:
+                continue
+            if response.status_code == 404:
                 self.console_print("404 error user {user_id} doesn't exist.", 'red')
                 broken_items.append(user_id)
 
-            elif self.api.last_response.status_code == 200:
+            elif response.status_code == 200:
                 broken_items.append(user_id)
 
-            elif self.api.last_response.status_code not in (400, 429):
+            elif response.status_code not in (400, 429):
                 # 400 (block to follow) and 429 (many request error)
                 # which is like the 500 error.
                 try_number = 3
                 error_pass = False
                 for _ in range(try_number):
-                    time.sleep(60)
-                    error_pass = self.follow(user_id)
+                    # Backs off through the limiter, the retry waits on it
+                    self.api.rate_limiter.on_throttle()
+                    error_pass = self.follow(user_id, check_user=False)
                     if error_pass:
                         break
                 if not error_pass:
@@ -68,6 +79,8 @@ def follow_users(self, user_ids):
                     i = user_ids.index(user_id)
                     broken_items += user_ids[i:]
                     break
+    finally:
+        approved_user_ids.close()
 
     self.logger.info("DONE: Now following {} users in total.".format(self.total['follows']))
     return broken_items
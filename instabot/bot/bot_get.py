@@ -3,50 +3,57 @@
     passed into e.g. like() or comment() functions.
 """
 
+import numbers
+from collections import deque
+
 from tqdm import tqdm
 
+from ..api.rate_limit import TokenBucket
+from ..geo import cell_center, cells_in_bbox, geohash, radius_bbox
+
 
 def get_media_owner(self, media_id):
-    self.api.media_info(media_id)
+    response = self.api.call('media_info', media_id)
     try:
-        return str(self.api.last_json["items"][0]["user"]["pk"])
+        return str(response.json["items"][0]["user"]["pk"])
     except Exception as ex:
         self.logger.error("Error: get_media_owner(%s)\n%s", media_id, ex)
         return False
 
 
 def get_user_tags_medias(self, user_id):
-    self.api.get_user_tags(user_id)
-    return [str(media['pk']) for media in self.api.last_json['items']]
+    response = self.api.call('get_user_tags', user_id)
+    return [str(media['pk']) for media in response.json['items']]
 
 
 def get_popular_medias(self):
-    self.api.get_popular_feed()
-    return [str(media['pk']) for media in self.api.last_json['items']]
+    response = self.api.call('get_popular_feed')
+    return [str(media['pk']) for media in response.json['items']]
 
 
 def get_your_medias(self, as_dict=False):
-    self.api.get_self_user_feed()
+    response = self.api.call('get_self_user_feed')
     if as_dict:
-        return self.api.last_json["items"]
-    return self.filter_medias(self.api.last_json["items"], False)
+        return response.json["items"]
+    return self.filter_medias(response.json["items"], False)
 
 
 def get_archived_medias(self, as_dict=False):
-    self.api.get_archive_feed()
+    response = self.api.call('get_archive_feed')
     if as_dict:
-        return self.api.last_json["items"]
-    return self.filter_medias(self.api.last_json["items"], False)
+        return response.json["items"]
+    return self.filter_medias(response.json["items"], False)
 
 
 def get_timeline_medias(self, filtration=True):
-    if not self.api.get_timeline_feed():
+    response = self.api.call('get_timeline_feed')
+    if not response:
         self.logger.warning("Error while getting timeline feed.")
         return []
 
     feed_items = [
         item["media_or_ad"]
-        for item in self.api.last_json["feed_items"]
+        for item in response.json["feed_items"]
         if item.get("media_or_ad")
     ]
     return self.filter_medias(feed_items, filtration)
@@ -54,17 +61,17 @@ def get_timeline_medias(self, filtration=True):
 
 def get_user_medias(self, user_id, filtration=True, is_comment=False):
     user_id = self.convert_to_user_id(user_id)
-    self.api.get_user_feed(user_id)
-    if self.api.last_json["status"] == 'fail':
+    response = self.api.call('get_user_feed', user_id)
+    if response.get("status") == 'fail':
         self.logger.warning("This is a closed account.")
         return []
-    return self.filter_medias(self.api.last_json["items"], filtration, is_comment=is_comment)
+    return self.filter_medias(response.json["items"], filtration, is_comment=is_comment)
 
 
 def get_total_user_medias(self, user_id):
     user_id = self.convert_to_user_id(user_id)
     medias = self.api.get_total_user_feed(user_id)
-    if self.api.last_json["status"] == 'fail':
+    if self.api.last_api_response.get("status") == 'fail':
         self.logger.warning("This is a closed account.")
         return []
     return self.filter_medias(medias, filtration=False)
@@ -73,7 +80,7 @@ def get_total_user_medias(self, user_id):
 def get_last_user_medias(self, user_id, amount):
     user_id = self.convert_to_user_id(user_id)
     medias = self.api.get_last_user_feed(user_id, amount)
-    if self.api.last_json["status"] == 'fail':
+    if self.api.last_api_response.get("status") == 'fail':
         self.logger.warning("This is a closed account.")
         return []
     return self.filter_medias(medias, filtration=False)
@@ -93,10 +100,11 @@ def get_user_likers(self, user_id, media_count=10):
 
 
 def get_hashtag_medias(self, hashtag, filtration=True):
-    if not self.api.get_hashtag_feed(hashtag):
+    response = self.api.call('get_hashtag_feed', hashtag)
+    if not response:
         self.logger.warning("Error while getting hashtag feed.")
         return []
-    return self.filter_medias(self.api.last_json["items"], filtration)
+    return self.filter_medias(response.json["items"], filtration)
 
 
 def get_total_hashtag_medias(self, hashtag, amount=100, filtration=False):
@@ -105,88 +113,272 @@ def get_total_hashtag_medias(self, hashtag, amount=100, filtration=False):
     return self.filter_medias(medias, filtration=filtration)
 
 
-def get_geotag_medias(self, geotag, filtration=True):
-    # TODO: returns list of medias from geotag
-    pass
-
-
-def get_locations_from_coordinates(self, latitude, longitude):
-    self.api.search_location(lat=latitude, lng=longitude)
-    all_locations = self.api.last_json["items"]
-    filtered_locations = []
-
-    for location in all_locations:
-        location_lat = location["location"]["lat"]
-        location_lng = location["location"]["lng"]
-
-        if int(location_lat) == int(latitude) and int(location_lng) == int(longitude):
-            filtered_locations.append(location)
+def _iter_feed_medias(self, pages, amount, filtration, is_comment):
+    """
+        Yields the ids of the medias of `pages` that pass `filter_medias`,
+        page by page, and stops fetching once `amount` were yielded
+        (`amount=0` fetches nothing, `None` goes through every page).
+    """
+    seen = set()
 
-    return filtered_locations
+    def wanted():
+        return amount is None or len(seen) < amount
+    try:
+        while wanted():
+            page = next(pages, None)
+            if page is None:
+                return
+            media_ids = self.filter_medias(
+                page, filtration, quiet=True, is_comment=is_comment)
+            for media_id in media_ids:
+                if not wanted():
+                    return
+                if media_id not in seen:
+                    seen.add(media_id)
+                    yield media_id
+    finally:
+        pages.close()
+
+
+def iter_hashtag_medias(self, hashtag, amount=None, filtration=True, is_comment=False):
+    """
+        Yields up to `amount` media ids of `hashtag` as the feed pages
+        arrive, e.g. `bot.like_medias(bot.iter_hashtag_medias('cat', 50))`
+        likes from the first page on. `amount=None` goes through the whole
+        feed.
+    """
+    return _iter_feed_medias(
+        self, self.api.iter_hashtag_feed(hashtag), amount, filtration, is_comment)
+
+
+def iter_location_medias(self, location_id, amount=None, filtration=True, is_comment=False):
+    """Same as `iter_hashtag_medias` for the feed of `location_id`."""
+    return _iter_feed_medias(
+        self, self.api.iter_location_feed(location_id), amount, filtration, is_comment)
+
+
+def _interleave_pages(feeds, pages=None):
+    """
+        Yields one page of each feed in turn, at most `pages` per feed, so
+        the first pages of every location come first.
+    """
+    feeds = deque((feed, 0) for feed in feeds)
+    try:
+        while feeds:
+            feed, count = feeds.popleft()
+            try:
+                page = next(feed)
+            except StopIteration:
+                continue
+            yield page
+            if pages is not None and count + 1 >= pages:
+                feed.close()
+            else:
+                feeds.append((feed, count + 1))
+    finally:
+        for feed, _ in feeds:
+            feed.close()
+
+
+def _is_coordinates(pair):
+    """Whether `pair` is a `(latitude, longitude)`, not two location ids."""
+    if len(pair) != 2:
+        return False
+    if not all(isinstance(x, numbers.Real) and not isinstance(x, bool) for x in pair):
+        return False
+    return -90 <= pair[0] <= 90 and -180 <= pair[1] <= 180
+
+
+def get_geotag_locations(self, geotag):
+    """
+        Returns the location ids `geotag` stands for. A geotag is a
+        location id, a location from `search_location`, a
+        `(latitude, longitude)` pair of numbers (every location found
+        there), a place name (its best match) or a list of those.
+    """
+    if isinstance(geotag, dict):
+        location = geotag.get('location', geotag)
+        return [str(location['pk'])]
+    if isinstance(geotag, (list, tuple)):
+        if _is_coordinates(geotag):
+            locations = self.get_locations_from_coordinates(*geotag)
+            return [str(location['location']['pk']) for location in locations]
+        location_ids = []
+        for item in geotag:
+            for location_id in get_geotag_locations(self, item):
+                if location_id not in location_ids:
+                    location_ids.append(location_id)
+        return location_ids
+    if str(geotag).isdigit():
+        return [str(geotag)]
+    response = self.api.call('search_location', geotag)
+    if not (response.json or {}).get('items'):
+        self.logger.info("Location `%s` not found." % geotag)
+        return []
+    return [str(response.json['items'][0]['location']['pk'])]
+
+
+def iter_geotag_medias(self, geotag, amount=None, filtration=True, is_comment=False, pages=None):
+    """
+        Yields up to `amount` media ids posted at `geotag` (see
+        `get_geotag_locations`). The feeds of its locations are paged in
+        turn, at most `pages` pages each, and a media found at two nearby
+        locations is yielded once.
+    """
+    feeds = [self.api.iter_location_feed(location_id)
+             for location_id in get_geotag_locations(self, geotag)]
+    return _iter_feed_medias(
+        self, _interleave_pages(feeds, pages), amount, filtration, is_comment)
+
+
+def get_geotag_medias(self, geotag, filtration=True, amount=100):
+    return list(iter_geotag_medias(self, geotag, amount, filtration))
+
+
+# Most `search_location` calls a single lookup may make, and how fast
+MAX_LOCATION_SEARCHES = 25
+LOCATION_SEARCH_RATE = 1.0  # per second
+# Default area and size of a coordinates lookup
+LOCATION_RADIUS = 500  # meters
+MAX_LOCATIONS = 20
+
+
+def _search_precision(index, south, west, north, east, max_searches):
+    """The finest geohash precision covering the box in `max_searches` cells."""
+    for precision in range(index.precision, 1, -1):
+        cells = cells_in_bbox(south, west, north, east, precision, limit=max_searches + 1)
+        if len(cells) <= max_searches:
+            return precision
+    return 1
+
+
+def _search_missing_cells(self, south, west, north, east, center=None,
+                          max_searches=MAX_LOCATION_SEARCHES):
+    """
+        Runs `search_location` for the cells of the box that the location
+        index hasn't seen, the cell of `center` at `center` itself, at most
+        `max_searches` of them at `LOCATION_SEARCH_RATE` per second. A cell
+        whose results were cut short (`has_more`) isn't marked as searched.
+    """
+    index = self._locations
+    precision = _search_precision(index, south, west, north, east, max_searches)
+    own_cell = geohash(center[0], center[1], precision) if center else None
+    missing = index.missing_cells(south, west, north, east, precision)
+    if len(missing) > max_searches:
+        self.logger.warning("Searching {} of the {} location cells left.".format(
+            max_searches, len(missing)))
+    bucket = TokenBucket(LOCATION_SEARCH_RATE)
+    for cell in missing[:max_searches]:
+        lat, lng = center if cell == own_cell else cell_center(cell)
+        bucket.consume()
+        # The index is filled by `search_location` itself
+        response = self.api.call('search_location', lat=lat, lng=lng)
+        if "items" not in (response.json or {}):
+            self.logger.warning("Error while searching locations.")
+        elif not response.json.get('has_more'):
+            index.mark_searched([cell])
+
+
+def get_locations_from_coordinates(self, latitude, longitude, radius=LOCATION_RADIUS,
+                                   max_searches=MAX_LOCATION_SEARCHES,
+                                   limit=MAX_LOCATIONS):
+    """
+        The `limit` nearest locations within `radius` meters of the
+        coordinates, nearest first (`limit=None` for all of them).
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    _search_missing_cells(
+        self, *radius_bbox(latitude, longitude, radius),
+        center=(latitude, longitude), max_searches=max_searches)
+    return self._locations.radius(latitude, longitude, radius)[:limit]
+
+
+def get_locations_in_bbox(self, south, west, north, east,
+                          max_searches=MAX_LOCATION_SEARCHES):
+    """Locations inside the box, searching only the cells not seen yet."""
+    _search_missing_cells(self, south, west, north, east, max_searches=max_searches)
+    return self._locations.bbox(south, west, north, east)
 
 
 def get_media_info(self, media_id):
     if isinstance(media_id, dict):
         return media_id
-    self.api.media_info(media_id)
-    if "items" not in self.api.last_json:
+    response = self.api.call('media_info', media_id)
+    if "items" not in (response.json or {}):
         self.logger.info("Media with %s not found." % media_id)
         return []
-    return self.api.last_json["items"]
+    return response.json["items"]
 
 
 def get_timeline_users(self):
-    if not self.api.get_timeline_feed():
+    response = self.api.call('get_timeline_feed')
+    if not response:
         self.logger.warning("Error while getting timeline feed.")
         return []
-    if 'items' in self.api.last_json:
-        return [str(i['user']['pk']) for i in self.api.last_json['items'] if i.get('user')]
-    elif 'feed_items' in self.api.last_json:
-        return [str(i['media_or_ad']['user']['pk']) for i in self.api.last_json['feed_items'] if i.get('media_or_ad', {}).get('user')]
+    if 'items' in response.json:
+        return [str(i['user']['pk']) for i in response.json['items'] if i.get('user')]
+    elif 'feed_items' in response.json:
+        return [str(i['media_or_ad']['user']['pk']) for i in response.json['feed_items'] if i.get('media_or_ad', {}).get('user')]
     self.logger.info("Users for timeline not found.")
     return []
 
 
 def get_hashtag_users(self, hashtag):
-    if not self.api.get_hashtag_feed(hashtag):
+    response = self.api.call('get_hashtag_feed', hashtag)
+    if not response:
         self.logger.warning("Error while getting hashtag feed.")
         return []
-    return [str(i['user']['pk']) for i in self.api.last_json['items']]
+    return [str(i['user']['pk']) for i in response.json['items']]
 
 
-def get_geotag_users(self, geotag):
-    # TODO: returns list user_ids who just posted on this geotag
-    pass
+def get_geotag_users(self, geotag, pages=1):
+    """Ids of the users who just posted at `geotag`, newest first."""
+    feeds = [self.api.iter_location_feed(location_id)
+             for location_id in get_geotag_locations(self, geotag)]
+    user_ids = []
+    seen = set()
+    for page in _interleave_pages(feeds, pages):
+        for item in page:
+            user_id = str(item['user']['pk'])
+            if user_id not in seen:
+                seen.add(user_id)
+                user_ids.append(user_id)
+    return user_ids
 
 
 def get_user_id_from_username(self, username):
-    if username not in self._usernames:
-        self.api.search_username(username)
+    user_id = self._usernames.get(username)
+    if user_id is None:
+        response = self.api.call('search_username', username)
         self.very_small_delay()
-        if "user" in self.api.last_json:
-            self._usernames[username] = str(self.api.last_json["user"]["pk"])
-        else:
+        if "user" not in (response.json or {}):
             return None
-    return self._usernames[username]
+        user_id = str(response.json["user"]["pk"])
+        self._usernames[username] = user_id
+    return user_id
 
 
 def get_username_from_user_id(self, user_id):
-    user_info = self.get_user_info(user_id)
+    user_info = self.get_user_info(user_id, fields=['username'])
     if user_info and "username" in user_info:
         return str(user_info["username"])
     return None  # Not found
 
 
-def get_user_info(self, user_id, use_cache=True):
+def get_user_info(self, user_id, use_cache=True, fields=None):
+    """
+        `fields` lists the keys the caller needs, a cached info is reused
+        while those are within their TTL (all keys by default).
+    """
     user_id = self.convert_to_user_id(user_id)
-    if not use_cache or user_id not in self._user_infos:
-        self.api.get_username_info(user_id)
-        last_json = self.api.last_json
+    user_info = self._user_infos.get(user_id, fields=fields) if use_cache else None
+    if user_info is None:
+        last_json = self.api.call('get_username_info', user_id).json
         if last_json is None or 'user' not in last_json:
             return False
         user_info = last_json['user']
         self._user_infos[user_id] = user_info
-    return self._user_infos[user_id]
+    return user_info
 
 
 def get_user_followers(self, user_id, nfollows):
@@ -202,28 +394,28 @@ def get_user_following(self, user_id, nfollows=None):
 
 
 def get_comment_likers(self, comment_id):
-    self.api.get_comment_likers(comment_id)
-    if "users" not in self.api.last_json:
+    response = self.api.call('get_comment_likers', comment_id)
+    if "users" not in (response.json or {}):
         self.logger.info("Comment with %s not found." % comment_id)
         return []
-    return list(map(lambda user: str(user['pk']), self.api.last_json["users"]))
+    return list(map(lambda user: str(user['pk']), response.json["users"]))
 
 
 def get_media_likers(self, media_id):
-    self.api.get_media_likers(media_id)
-    if "users" not in self.api.last_json:
+    response = self.api.call('get_media_likers', media_id)
+    if "users" not in (response.json or {}):
         self.logger.info("Media with %s not found." % media_id)
         return []
-    return list(map(lambda user: str(user['pk']), self.api.last_json["users"]))
+    return list(map(lambda user: str(user['pk']), response.json["users"]))
 
 
 def get_media_comments(self, media_id, only_text=False):
-    self.api.get_media_comments(media_id)
-    if 'comments' not in self.api.last_json:
+    response = self.api.call('get_media_comments', media_id)
+    if 'comments' not in (response.json or {}):
         return []
     if only_text:
-        return [str(item["text"]) for item in self.api.last_json['comments']]
-    return self.api.last_json['comments']
+        return [str(item["text"]) for item in response.json['comments']]
+    return response.json['comments']
 
 
 def get_media_comments_all(self, media_id, only_text=False, count=False):
@@ -232,16 +424,16 @@ def get_media_comments_all(self, media_id, only_text=False, count=False):
     comments = []
 
     while has_more_comments:
-        self.api.get_media_comments(media_id, max_id=max_id)
-        for comment in self.api.last_json['comments']:
+        last_json = self.api.call('get_media_comments', media_id, max_id=max_id).json
+        for comment in last_json['comments']:
             comments.append(comment)
-        has_more_comments = self.api.last_json['has_more_comments']
+        has_more_comments = last_json['has_more_comments']
         if count and len(comments) >= count:
             comments = comments[:count]
             has_more_comments = False
             self.logger.info("Getting comments stopped by count (%s)." % count)
         if has_more_comments:
-            max_id = self.api.last_json['next_max_id']
+            max_id = last_json['next_max_id']
 
     if only_text:
         return [str(item["text"]) for item in sorted(
@@ -250,18 +442,16 @@ def get_media_comments_all(self, media_id, only_text=False, count=False):
 
 
 def get_media_commenters(self, media_id):
-    self.get_media_comments(media_id)
-    if 'comments' not in self.api.last_json:
-        return []
-    return [str(item["user"]["pk"]) for item in self.api.last_json['comments']]
+    comments = self.get_media_comments(media_id)
+    return [str(item["user"]["pk"]) for item in comments]
 
 
 def search_users(self, query):
-    self.api.search_users(query)
-    if "users" not in self.api.last_json:
+    response = self.api.call('search_users', query)
+    if "users" not in (response.json or {}):
         self.logger.info("Users with %s not found." % query)
         return []
-    return [str(user['pk']) for user in self.api.last_json['users']]
+    return [str(user['pk']) for user in response.json['users']]
 
 
 def get_comment(self):
@@ -316,8 +506,9 @@ def get_link_from_media_id(self, media_id):
 
 
 def get_messages(self):
-    if self.api.getv2Inbox():
-        return self.api.last_json
+    response = self.api.call('getv2Inbox')
+    if response:
+        return response.json
     else:
         self.logger.info("Messages were not found, something went wrong.")
         return None
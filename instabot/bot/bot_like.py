@@ -76,7 +76,10 @@ def like_medias(self, medias, check_media=True):
     if not medias:
         self.logger.info("Nothing to like.")
         return broken_items
-    self.logger.info("Going to like %d medias." % (len(medias)))
+    if hasattr(medias, '__len__'):
+        self.logger.info("Going to like %d medias." % (len(medias)))
+    else:
+        self.logger.info("Going to like medias as they are found.")
     for media in tqdm(medias):
         if not self.like(media, check_media):
             self.error_delay()
@@ -91,9 +94,9 @@ def like_timeline(self, amount=None):
     return self.like_medias(medias, check_media=False)
 
 
-def like_user(self, user_id, amount=None, filtration=True):
+def like_user(self, user_id, amount=None, filtration=True, check_user=True):
     """ Likes last user_id's medias """
-    if filtration:
+    if filtration and check_user:
         if not self.check_user(user_id):
             return False
     self.logger.info("Liking user_%s's feed:" % user_id)
@@ -107,23 +110,42 @@ def like_user(self, user_id, amount=None, filtration=True):
 
 
 def like_users(self, user_ids, nlikes=None, filtration=True):
+    if filtration:
+        # Candidates are screened ahead on a worker pool
+        user_ids = self.screen_users(user_ids)
     for user_id in user_ids:
         if self.reached_limit('likes'):
             self.logger.info("Out of likes for today.")
             return
-        self.like_user(user_id, amount=nlikes, filtration=filtration)
+        self.like_user(user_id, amount=nlikes, filtration=filtration,
+                       check_user=False)
 
 
 def like_hashtag(self, hashtag, amount=None):
-    """ Likes last medias from hashtag """
+    """ Likes last medias from hashtag, from the first page on """
     self.logger.info("Going to like media with hashtag #%s." % hashtag)
-    medias = self.get_total_hashtag_medias(hashtag, amount)
+    if amount is None:
+        medias = self.get_total_hashtag_medias(hashtag, amount)
+    else:
+        medias = self.iter_hashtag_medias(hashtag, amount)
+    return self.like_medias(medias)
+
+
+def like_hashtags(self, hashtags, amount=None):
+    """ Likes the best new medias of several hashtags, each screened once, the first page of each by default """
+    self.logger.info("Going to like media with hashtags %s." % ', '.join(
+        '#' + hashtag for hashtag in hashtags))
+    medias = self.crawl_hashtags(
+        hashtags, amount, pages=1 if amount is None else None)
     return self.like_medias(medias)
 
 
 def like_geotag(self, geotag, amount=None):
-    # TODO: like medias by geotag
-    pass
+    """ Likes last medias from geotag, the first page of each location by default """
+    self.logger.info("Going to like media from geotag %s." % (geotag,))
+    medias = self.iter_geotag_medias(
+        geotag, amount, pages=1 if amount is None else None)
+    return self.like_medias(medias)
 
 
 def like_followers(self, user_id, nlikes=None, nfollows=None):
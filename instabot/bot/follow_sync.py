@@ -0,0 +1,183 @@
+"""
+    Incremental sync of the bot's own followers and followings.
+
+    `Bot.following` and `Bot.followers` are `UserIdSet`s: hash sets of
+    user ids that keep the order the users were added in, oldest first,
+    like the lists they replace. When one is older than `SYNC_INTERVAL`
+    it is brought up to date by paging from the newest entries and
+    stopping at the first page that overlaps the known ids, so a refresh
+    costs the profile lookup plus a page or two. The list can only be
+    trusted this way while the profile's count agrees with it; when users
+    were removed (or the overlap was a false one) it is downloaded again.
+
+    With `Bot(snapshot_file=...)` the ids are saved there after every sync
+    and loaded on the next start, keyed by the logged in user id.
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+
+SYNC_INTERVAL = 7200
+
+# Known ids a page must hold for the sync to stop there
+SYNC_OVERLAP = 10
+
+COUNT_KEYS = {'followers': 'follower_count', 'followings': 'following_count'}
+NAMES = {'followers': 'followers', 'followings': 'following'}
+
+
+class UserIdSet(object):
+    """Set of user ids that keeps their insertion order, usable as a list."""
+
+    def __init__(self, ids=()):
+        self._ids = OrderedDict((user_id, None) for user_id in ids)
+
+    def __contains__(self, user_id):
+        return user_id in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __reversed__(self):
+        return reversed(list(self._ids))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        return list(self._ids)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (set, frozenset)):
+            return set(self._ids) == other
+        if isinstance(other, (UserIdSet, list, tuple)):
+            return list(self._ids) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'UserIdSet({!r})'.format(list(self._ids))
+
+    def append(self, user_id):
+        self._ids[user_id] = None
+
+    add = append
+
+    def extend(self, user_ids):
+        for user_id in user_ids:
+            self._ids[user_id] = None
+
+    def remove(self, user_id):
+        if user_id not in self._ids:
+            raise ValueError('{} is not in the set'.format(user_id))
+        del self._ids[user_id]
+
+    def discard(self, user_id):
+        self._ids.pop(user_id, None)
+
+
+def load_snapshot(fname, user_id, which):
+    """Returns `(ids, updated_at)` saved for `user_id` or `(None, 0)`."""
+    if fname is None or not os.path.isfile(fname):
+        return None, 0
+    try:
+        with open(fname, 'r') as f:
+            saved = json.load(f).get(str(user_id), {}).get(which)
+    except ValueError:
+        return None, 0
+    if not saved:
+        return None, 0
+    return UserIdSet(saved['ids']), saved['updated_at']
+
+
+def save_snapshot(fname, user_id, which, ids, updated_at):
+    if fname is None:
+        return
+    snapshot = {}
+    if os.path.isfile(fname):
+        try:
+            with open(fname, 'r') as f:
+                snapshot = json.load(f)
+        except ValueError:
+            pass
+    snapshot.setdefault(str(user_id), {})[which] = {
+        'ids': list(ids), 'updated_at': updated_at}
+    tmp_fname = fname + '.tmp'
+    with open(tmp_fname, 'w') as f:
+        json.dump(snapshot, f)
+    if os.path.exists(fname):
+        os.remove(fname)
+    os.rename(tmp_fname, fname)
+
+
+def _new_ids(self, which, known):
+    """Ids added since `known`, newest first, or None if it can't tell."""
+    new_ids = []
+    pages = self.api.iter_followers_or_followings(self.user_id, which)
+    try:
+        for page in pages:
+            overlap = 0
+            for item in page:
+                user_id = str(item['pk'])
+                if user_id in known:
+                    overlap += 1
+                else:
+                    new_ids.append(user_id)
+            if overlap and overlap >= min(SYNC_OVERLAP, len(known), len(page)):
+                return new_ids
+    except Exception as e:
+        self.logger.warning("Can't sync {}: {}".format(which, e))
+        return None
+    finally:
+        pages.close()
+    return new_ids  # The whole list was paged through
+
+
+def sync_user_ids(self, which, known=None):
+    """
+        Returns the `UserIdSet` of `which` ('followers' or 'followings') of
+        the bot's account, updating `known` from the newest entries when
+        possible and downloading everything otherwise.
+    """
+    name = NAMES[which]
+    if known:
+        if not isinstance(known, UserIdSet):
+            known = UserIdSet(known)
+        user = (self.api.call('get_username_info', self.user_id).json or {}).get('user')
+        new_ids = _new_ids(self, which, known) if user else None
+        if new_ids is not None and len(known) + len(new_ids) == user[COUNT_KEYS[which]]:
+            known.extend(reversed(new_ids))
+            self.logger.info("Synced {}: {} new.".format(which, len(new_ids)))
+            return known
+        self.console_print('`bot.{}` changed, will download again.'.format(name), 'green')
+    else:
+        self.console_print('`bot.{}` is empty, will download.'.format(name), 'green')
+    if which == 'followers':
+        return UserIdSet(self.get_user_followers(self.user_id))
+    return UserIdSet(self.get_user_following(self.user_id))
+
+
+def refresh_user_ids(self, which, known, max_age=SYNC_INTERVAL):
+    """
+        Returns the ids of `which` no older than `max_age`: `known`, the
+        snapshot saved on disk or a sync of either.
+    """
+    now = time.time()
+    key = 'updated_' + NAMES[which]
+    if known is None:
+        known, updated_at = load_snapshot(self.snapshot_file, self.user_id, which)
+        if known is not None:
+            self.last[key] = updated_at
+    if known is not None and now - self.last.get(key, now) <= max_age:
+        return known
+    ids = sync_user_ids(self, which, known)
+    self.last[key] = now
+    save_snapshot(self.snapshot_file, self.user_id, which, ids, now)
+    return ids
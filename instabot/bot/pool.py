@@ -0,0 +1,237 @@
+"""
+    Runs many accounts in one process.
+
+    Usage:
+        pool = BotPool(workers=4, cache_file='cache.db')
+        pool.add('account1', proxy='1.2.3.4:8080', max_likes_per_day=500)
+        pool.add('account2')
+        pool.login('account1', password='...')
+        pool.login('account2', password='...')
+        pool.schedule('account1', 'like', pool['account1'].like, media_id)
+        pool.schedule('account2', 'follow', pool['account2'].follow, user_id)
+        results = pool.run()
+        print(pool.memory_report())
+
+    The accounts share the user info, username and location caches, a
+    `ResponseCache` of public endpoints (other users' infos and
+    followers, media likers, searches) unless `response_cache=False`, the HTTP
+    connection pools of accounts behind the same proxy, the log handlers
+    and one thread pool. Each account keeps its own session, proxy
+    (`Bot.proxy`), `max_per_day` limits and files, the latter (and the
+    followers/followings snapshot) in `<base_path>/<username>/`.
+
+    `run` gives every account at most one action in flight. Among the
+    accounts whose next lane is open it picks the one that has run the
+    fewest actions, so a busy account can't starve the others.
+"""
+
+import logging
+import os
+import sys
+import time
+import types
+from collections import Counter, OrderedDict, deque
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ..api import transport
+from ..cache import (LOCATIONS_TTL, USER_INFO_FIELD_TTLS, USER_INFO_TTL,
+                     USERNAME_TTL, ResponseCache, SQLiteCacheBackend, TTLCache)
+from ..geo import LocationIndex
+from .bot import Bot
+
+FILE_KWARGS = ('whitelist_file', 'blacklist_file', 'comments_file',
+               'followed_file', 'unfollowed_file', 'skipped_file',
+               'friends_file')
+
+# Shared or process-wide objects are not counted per account
+_NOT_OWNED = (type, types.ModuleType, types.FunctionType,
+              types.BuiltinFunctionType, logging.Logger, logging.Handler)
+
+
+def _deep_sizeof(root, seen):
+    """Bytes used by `root` and the objects it refers to, minus `seen`."""
+    size = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _NOT_OWNED):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj, 0)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        for slot in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, slot):
+                stack.append(getattr(obj, slot))
+    return size
+
+
+class BotPool(object):
+    def __init__(self, workers=4, base_path='accounts', cache_file=None,
+                 cache_max_entries=50000, share_connections=True,
+                 response_cache=True):
+        self.workers = workers
+        self.base_path = base_path
+        self.share_connections = share_connections
+        self.bots = OrderedDict()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.runs = Counter()
+
+        # Public data shared by every account
+        self.user_infos = TTLCache(
+            cache_max_entries, USER_INFO_TTL, USER_INFO_FIELD_TTLS,
+            SQLiteCacheBackend(cache_file, 'user_infos') if cache_file else None)
+        self.usernames = TTLCache(
+            cache_max_entries, USERNAME_TTL,
+            backend=SQLiteCacheBackend(cache_file, 'usernames') if cache_file else None)
+        self.locations = LocationIndex(cache_file, ttl=LOCATIONS_TTL)
+        self.response_cache = None
+        if response_cache:
+            self.response_cache = ResponseCache(
+                cache_max_entries,
+                backend=SQLiteCacheBackend(cache_file, 'responses') if cache_file else None)
+
+        fh = logging.FileHandler(filename='instabot.log')
+        fh.setLevel(logging.INFO)
+        fh.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        ch = logging.StreamHandler()
+        ch.setLevel(logging.DEBUG)
+        ch.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        self.handlers = [fh, ch]
+
+    def __getitem__(self, username):
+        return self.bots[username]
+
+    def __contains__(self, username):
+        return username in self.bots
+
+    def __len__(self):
+        return len(self.bots)
+
+    def add(self, username, proxy=None, **bot_kwargs):
+        """Creates the `Bot` of `username`, `bot_kwargs` go to `Bot`."""
+        if username in self.bots:
+            raise ValueError('Account `{}` is already in the pool'.format(username))
+        folder = os.path.join(self.base_path, username)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        for key in FILE_KWARGS:
+            if key not in bot_kwargs:
+                fname = key[:-len('_file')] + '.txt'
+                bot_kwargs[key] = os.path.join(folder, fname)
+        bot_kwargs.setdefault('snapshot_file', os.path.join(folder, 'snapshot.json'))
+        bot_kwargs.setdefault('share_connections', self.share_connections)
+        bot_kwargs.setdefault('response_cache', self.response_cache)
+        bot_kwargs.setdefault('user_infos', self.user_infos)
+        bot_kwargs.setdefault('usernames', self.usernames)
+        bot_kwargs.setdefault('locations', self.locations)
+        bot_kwargs.setdefault('log_handlers', self.handlers)
+        bot = Bot(proxy=proxy, **bot_kwargs)
+        bot.logger.name = '[instabot_{}]'.format(username)
+
+        self.bots[username] = bot
+        return bot
+
+    def login(self, username, password=None, **kwargs):
+        return self.bots[username].login(
+            username=username, password=password, **kwargs)
+
+    def logout(self):
+        for bot in self.bots.values():
+            bot.logout()
+
+    def schedule(self, username, key, func, *args, **kwargs):
+        """Queues `func(*args, **kwargs)` on lane `key` of account `username`."""
+        self.bots[username].schedule(key, func, *args, **kwargs)
+
+    def pending(self):
+        return sum(bot.scheduler.pending() for bot in self.bots.values())
+
+    def _lanes(self, busy, results):
+        """`(opens_at, username, key)` of the lanes that can run next."""
+        lanes = []
+        for username, bot in self.bots.items():
+            if username in busy:
+                continue
+            for key in bot.scheduler.ready_lanes():
+                if bot.reached_limit(key + 's'):
+                    queue = bot.scheduler.queues[key]
+                    bot.logger.info("Out of {}s for today, dropping {} queued.".format(
+                        key, len(queue)))
+                    results[username].extend((key, False) for _ in queue)
+                    queue.clear()
+                    continue
+                lanes.append((bot.scheduler.opens_at(key), username, key))
+        return lanes
+
+    def run(self):
+        """
+            Runs the queued actions of all accounts and returns
+            `{username: [(key, result), ...]}` in the order they ran. An
+            action that raises is logged and recorded as False.
+        """
+        results = dict((username, []) for username in self.bots)
+        running = {}  # future -> (username, key)
+        while True:
+            busy = set(username for username, _ in running.values())
+            lanes = self._lanes(busy, results)
+            if not lanes and not running:
+                return results
+            now = time.time()
+            open_lanes = [lane for lane in lanes if lane[0] <= now]
+            if open_lanes and len(running) < self.workers:
+                # Fewest actions run first, then the longest open lane
+                _, username, key = min(
+                    open_lanes, key=lambda lane: (self.runs[lane[1]], lane[0]))
+                self.runs[username] += 1
+                future = self.executor.submit(
+                    self.bots[username].scheduler.run_next, key)
+                running[future] = (username, key)
+                continue
+            timeout = None
+            if lanes and len(running) < self.workers:
+                timeout = max(0, min(lane[0] for lane in lanes) - now)
+            if running:
+                done, _ = wait(list(running), timeout, FIRST_COMPLETED)
+                for future in done:
+                    username, key = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception:
+                        self.bots[username].logger.exception(
+                            "Queued {} failed.".format(key))
+                        result = False
+                    results[username].append((key, result))
+            else:
+                time.sleep(timeout)
+
+    def memory_report(self):
+        """
+            Approximate bytes held by each account, plus what the accounts
+            share, e.g. `{'accounts': {'account1': 52000}, 'shared': 80000,
+            'per_account': 52000}`.
+        """
+        shared = [self.user_infos, self.usernames, self.locations,
+                  self.response_cache] + list(
+            transport._shared_adapters.values())
+        seen = set()
+        shared_size = sum(_deep_sizeof(obj, seen) for obj in shared)
+        accounts = OrderedDict()
+        for username, bot in self.bots.items():
+            accounts[username] = _deep_sizeof(bot, set(seen))
+        return {'accounts': accounts,
+                'shared': shared_size,
+                'per_account': (sum(accounts.values()) // len(accounts)
+                                if accounts else 0)}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for handler in self.handlers:
+            handler.close()
@@ -0,0 +1,112 @@
+"""
+    Bloom filter guards for the followed, unfollowed and skipped lists.
+
+    With `Bot(processed_filter='processed.bloom')` each of these lists is
+    wrapped in a `GuardedList` with a filter of its own
+    (`processed.followed.bloom`, ...), and `user_id in bot.followed_file`
+    first asks that filter: a user id it has never seen is answered without
+    touching the list. Only positives are looked up exactly, with an
+    indexed query for SQLite lists (`storage=`) and a streaming scan of the
+    text file otherwise, so a text list is never loaded into memory for
+    these checks or for the bot's own appends. `difference` passes only the
+    positives of a batch on, in one scan.
+
+    A filter is rebuilt from its list when the list changed since the
+    filter was last saved, e.g. edited by hand or by another process.
+"""
+
+import hashlib
+import os
+
+from huepy import bold, orange
+
+from ..bloom import BloomFilter
+from ..utils import file
+
+
+def filter_path(path, name):
+    """`processed.bloom` -> `processed.<name>.bloom`"""
+    root, ext = os.path.splitext(path)
+    return '{}.{}{}'.format(root, name, ext)
+
+
+class GuardedList(object):
+    """A user list whose `in` and `difference` ask a Bloom filter first."""
+
+    def __init__(self, list_file, path, capacity=10 ** 7, error_rate=0.01):
+        self.list_file = list_file
+        self.streamed = isinstance(list_file, file)
+        self.bloom = BloomFilter(path, capacity, error_rate)
+        if self.bloom.signature != self._signature():
+            self.rebuild()
+
+    def _signature(self):
+        return hashlib.md5(repr(self.list_file.version).encode('utf-8')).digest()
+
+    def _items(self):
+        return self.list_file.iter_items() if self.streamed else self.list_file.list
+
+    def rebuild(self):
+        self.bloom.clear()
+        self.bloom.update(self._items())
+        self.bloom.signature = self._signature()
+        self.bloom.flush()
+
+    def __contains__(self, item):
+        item = str(item)
+        if item not in self.bloom:
+            return False
+        if self.streamed:
+            return any(x == item for x in self.list_file.iter_items())
+        return item in self.list_file
+
+    def difference(self, items):
+        """Returns the items of `items` that are not in the list."""
+        new = set()
+        maybe = []
+        for item in items:
+            if str(item) in self.bloom:
+                maybe.append(item)
+            else:
+                new.add(item)
+        if not maybe:
+            return new
+        if not self.streamed:
+            return new | set(self.list_file.difference(maybe))
+        wanted = set(str(item) for item in maybe)
+        found = set()
+        for x in self.list_file.iter_items():
+            if x in wanted:
+                found.add(x)
+                if len(found) == len(wanted):
+                    break
+        return new | set(item for item in maybe if str(item) not in found)
+
+    def append(self, item, allow_duplicates=False, **kwargs):
+        if self.streamed and not allow_duplicates:
+            # Checked here, `utils.file` would load the list for it
+            if item in self:
+                msg = "'{}' already in `{}`.".format(item, self.list_file.fname)
+                print(bold(orange(msg)))
+                return
+            allow_duplicates = True
+        result = self.list_file.append(item, allow_duplicates=allow_duplicates, **kwargs)
+        self.bloom.add(str(item))
+        self.bloom.signature = self._signature()
+        return result
+
+    def __iter__(self):
+        return iter(self.list_file)
+
+    def __len__(self):
+        return len(self.list_file)
+
+    def __getattr__(self, name):
+        return getattr(self.list_file, name)
+
+    def flush(self):
+        self.bloom.flush()
+
+    def close(self):
+        self.bloom.close()
+        self.list_file.close()
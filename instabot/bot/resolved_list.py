@@ -0,0 +1,82 @@
+"""
+    A user list file (whitelist, blacklist) kept as a frozen set of user ids.
+
+    The file holds user ids and usernames. The set is rebuilt only when the
+    file's `version` changes, which is checked at most every
+    `check_interval` seconds, so membership tests are O(1) without I/O.
+    Usernames are resolved to ids once, in bulk: synchronously the first
+    time so the set is complete from the start, then on a background
+    thread while the previous set stays in use. There is no endpoint taking
+    several usernames, so a bulk resolves them on `bot.screening_workers`
+    threads.
+"""
+
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ResolvedList(object):
+    def __init__(self, bot, list_file, check_interval=5):
+        self.bot = bot
+        self.list_file = list_file
+        self.check_interval = check_interval
+        self._ids = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self._resolving = None
+
+    @property
+    def ids(self):
+        now = time.time()
+        if self._ids is not None and now - self._checked_at < self.check_interval:
+            return self._ids
+        with self._lock:
+            self._checked_at = now
+            version = self.list_file.version
+            if version == self._version:
+                return self._ids
+            if self._ids is None:
+                self._ids = self._resolve(self.list_file.list)
+                self._version = version
+            elif self._resolving is None or not self._resolving.is_alive():
+                self._resolving = threading.Thread(target=self._refresh, args=(version,))
+                self._resolving.daemon = True
+                self._resolving.start()
+        return self._ids
+
+    def _refresh(self, version):
+        ids = self._resolve(self.list_file.list)
+        with self._lock:
+            self._ids, self._version = ids, version
+
+    def _resolve(self, entries):
+        ids = set()
+        usernames = []
+        for entry in entries:
+            entry = str(entry)
+            if entry.isdigit():
+                ids.add(entry)
+            else:
+                usernames.append(entry)
+        if usernames:
+            workers = max(1, min(self.bot.screening_workers, len(usernames)))
+            executor = ThreadPoolExecutor(max_workers=workers)
+            try:
+                for user_id in executor.map(self.bot.convert_to_user_id, usernames):
+                    if user_id:
+                        ids.add(user_id)
+            finally:
+                executor.shutdown(wait=True)
+        return frozenset(ids)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self.ids
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
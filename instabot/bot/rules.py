@@ -0,0 +1,124 @@
+"""
+    Declarative filter rules compiled into a self-tuning pipeline.
+
+    A `Rule` looks at a candidate and decides whether it settles the
+    check: `check(bot, item, context)` returns True when the rule fires,
+    and the rule's `outcome` (True to accept, False to reject) is then the
+    result. Rules are grouped in stages; what a stage needs (e.g. the user
+    info) is only loaded into `context` once the cheaper stages before it
+    let the candidate through. Within a stage rules are reordered every
+    `reorder_every` runs so the ones that fire most often go first, but a
+    rule only moves past neighbours with the same outcome and `on_fire`:
+    the order never changes a result or what a rejection writes.
+"""
+
+import threading
+import time
+
+
+class Rule(object):
+    def __init__(self, name, check, stage=0, outcome=False, message=None,
+                 color='red', fixed=False, on_fire=None):
+        self.name = name
+        self.check = check
+        self.stage = stage
+        self.outcome = outcome
+        self.message = message
+        self.color = color
+        self.fixed = fixed  # Keeps its place, e.g. a whitelist that must go first
+        self.on_fire = on_fire
+        self.calls = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+    @property
+    def hit_rate(self):
+        # Smoothed so a rule isn't moved on its first few results
+        return (self.hits + 1.0) / (self.calls + 2.0)
+
+    def stats(self):
+        return {'name': self.name,
+                'stage': self.stage,
+                'calls': self.calls,
+                'hits': self.hits,
+                'hit_rate': float(self.hits) / self.calls if self.calls else 0.0,
+                'seconds': self.seconds}
+
+
+def _interchangeable(first, second):
+    """Whether the two rules can swap places without changing anything."""
+    if first.fixed or second.fixed:
+        return False
+    return (first.outcome, first.on_fire) == (second.outcome, second.on_fire)
+
+
+class RulePipeline(object):
+    def __init__(self, rules, loaders=None, reorder_every=100):
+        """
+            `loaders[stage](bot, item, context)` adds what the rules of
+            `stage` need to `context` and returns False to reject the
+            candidate instead.
+        """
+        self.rules = list(rules)
+        self.loaders = loaders or {}
+        self.reorder_every = reorder_every
+        self.runs = 0
+        self.lock = threading.Lock()
+        self.compile()
+
+    def compile(self):
+        """Orders each run of interchangeable rules by observed hit rate."""
+        stages = {}
+        for rule in self.rules:
+            stages.setdefault(rule.stage, []).append(rule)
+        self.stages = []
+        for stage in sorted(stages):
+            runs = []
+            for rule in stages[stage]:
+                if runs and _interchangeable(runs[-1][0], rule):
+                    runs[-1].append(rule)
+                else:
+                    runs.append([rule])
+            ordered = []
+            for run in runs:
+                ordered += sorted(run, key=lambda rule: -rule.hit_rate)
+            self.stages.append((stage, tuple(ordered)))
+
+    def run(self, bot, item, context=None):
+        with self.lock:
+            self.runs += 1
+            if self.runs % self.reorder_every == 0:
+                self.compile()
+            stages = self.stages
+        context = {} if context is None else context
+        for stage, rules in stages:
+            loader = self.loaders.get(stage)
+            if loader is not None and not loader(bot, item, context):
+                return False
+            for rule in rules:
+                start = time.time()
+                fired = rule.check(bot, item, context)
+                elapsed = time.time() - start
+                with self.lock:
+                    rule.calls += 1
+                    rule.seconds += elapsed
+                    if fired:
+                        rule.hits += 1
+                if fired:
+                    if rule.on_fire is not None:
+                        rule.on_fire(bot, item, context)
+                    if rule.message:
+                        bot.console_print(rule.message, rule.color)
+                    return rule.outcome
+        return True
+
+    def stats(self):
+        """Per-rule counters and total seconds, in the current order."""
+        with self.lock:
+            return [rule.stats() for _, rules in self.stages for rule in rules]
+
+    def reset_stats(self):
+        with self.lock:
+            for rule in self.rules:
+                rule.calls = rule.hits = 0
+                rule.seconds = 0.0
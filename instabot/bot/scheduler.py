@@ -0,0 +1,97 @@
+"""
+    Per-action pacing lanes for write actions.
+
+    Usage:
+        bot.schedule('like', bot.like, media_id)
+        bot.schedule('follow', bot.follow, user_id)
+        results = bot.run_scheduled()
+
+    Every key of `bot.delays` ('like', 'follow', ...) is a lane. A lane
+    opens `delays[key]` seconds (times a random 0.25-1.25 factor) after its
+    last action in `bot.last[key]`. Queued actions run in order within
+    their lane, and whichever lane opens first goes next, so a follow never
+    waits on the like delay. Read-only lookups don't go through the
+    scheduler at all.
+"""
+
+import random
+import sched
+import time
+from collections import deque
+
+
+class ActionScheduler(object):
+    def __init__(self, delays, last, jitter=(0.25, 1.25)):
+        self.delays = delays
+        self.last = last
+        self.jitter = jitter
+        self.queues = {}
+        self._opens_at = {}
+
+    def opens_at(self, key):
+        """Time at which lane `key` accepts its next action."""
+        if key not in self._opens_at:
+            delay = self.delays[key] * random.uniform(*self.jitter)
+            self._opens_at[key] = self.last.get(key, 0) + delay
+        return self._opens_at[key]
+
+    def mark(self, key):
+        """Records that an action of lane `key` starts now."""
+        self.last[key] = time.time()
+        self._opens_at.pop(key, None)
+
+    def wait(self, key):
+        """Sleeps until lane `key` is open, then marks it."""
+        remaining = self.opens_at(key) - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+        self.mark(key)
+
+    def submit(self, key, func, *args, **kwargs):
+        if key not in self.delays:
+            raise ValueError('Unknown action `{}`, expected one of {}'.format(
+                key, sorted(self.delays)))
+        self.queues.setdefault(key, deque()).append((func, args, kwargs))
+
+    def pending(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def ready_lanes(self):
+        """Keys of the lanes with queued actions."""
+        return [key for key, queue in self.queues.items() if queue]
+
+    def run_next(self, key):
+        """Runs the next action queued on lane `key` and returns its result."""
+        func, args, kwargs = self.queues[key].popleft()
+        started = time.time()
+        # Bot actions mark their lane in `Bot.delay`, which doesn't sleep
+        # because the lane is already open
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # A failed action still waits out the lane's delay
+            if self.last.get(key, 0) < started:
+                self.last[key] = started
+                self._opens_at.pop(key, None)
+
+    def run(self):
+        """
+            Runs every queued action as soon as its lane opens and returns
+            `(key, result)` pairs in the order they ran.
+        """
+        # `time.sleep` is looked up on every call so it can be patched
+        loop = sched.scheduler(time.time, lambda seconds: time.sleep(seconds))
+        results = []
+
+        def run_next(key):
+            results.append((key, self.run_next(key)))
+            enter(key)
+
+        def enter(key):
+            if self.queues.get(key):
+                loop.enterabs(self.opens_at(key), 1, run_next, (key,))
+
+        for key in list(self.queues):
+            enter(key)
+        loop.run()
+        return results
@@ -0,0 +1,302 @@
+"""
+    Size-bounded LRU caches with TTLs and optional SQLite persistence.
+
+    Usage:
+        infos = TTLCache(max_entries=10000, ttl=3 * 24 * 3600,
+                         field_ttls={'follower_count': 6 * 3600},
+                         backend=SQLiteCacheBackend('cache.db', 'user_infos'))
+        infos[user_id] = user_info
+        infos.get(user_id)                      # all fields must be fresh
+        infos.get(user_id, fields=['username'])  # only `username` must be
+
+        responses = ResponseCache(backend=SQLiteCacheBackend('cache.db', 'responses'))
+        api = API(response_cache=responses)     # share it between accounts
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import six.moves.urllib as urllib
+
+from .api.api import ApiResponse
+
+# Counters go stale fast, account flags and names slowly
+USER_INFO_TTL = 3 * 24 * 3600
+USER_INFO_FIELD_TTLS = {
+    'follower_count': 6 * 3600,
+    'following_count': 6 * 3600,
+    'media_count': 6 * 3600,
+    'usertags_count': 6 * 3600,
+    'biography': 24 * 3600,
+}
+USERNAME_TTL = 30 * 24 * 3600
+LOCATIONS_TTL = 7 * 24 * 3600
+
+# Read-only endpoints that answer the same to every account:
+# (family, endpoint pattern, TTL in seconds). Media feeds, media info and
+# comments are left out, they tell whether the viewer liked them.
+RESPONSE_FAMILIES = (
+    ('followers', r'^friendships/\d+/follow(ers|ing)/', 6 * 3600),
+    ('user_info', r'^users/\d+/info/', 6 * 3600),
+    ('username_info', r'^users/[^/]+/usernameinfo/', 6 * 3600),
+    ('media_likers', r'^media/[\d_]+/likers/', 30 * 60),
+    ('search', r'^(users|tags|fbsearch)/(search|topsearch|places)/', 24 * 3600),
+)
+# Per-account query parameters left out of the cache key
+PRIVATE_PARAMS = ('rank_token',)
+
+
+class SQLiteCacheBackend(object):
+    """Stores JSON-serializable cache entries in a SQLite table."""
+
+    def __init__(self, path, table='cache', timeout=30):
+        self.path = path
+        self.table = table
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, timeout=timeout, check_same_thread=False,
+            isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS "{}" ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'stored_at REAL NOT NULL)'.format(table))
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT value, stored_at FROM "{}" WHERE key = ?'.format(self.table),
+                (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, stored_at):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO "{}" VALUES (?, ?, ?)'.format(self.table),
+                (key, json.dumps(value), stored_at))
+
+    def delete(self, key):
+        with self.lock:
+            self.connection.execute(
+                'DELETE FROM "{}" WHERE key = ?'.format(self.table), (key,))
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM "{}"'.format(self.table))
+
+    def purge(self, older_than):
+        """Deletes the entries stored before the `older_than` timestamp."""
+        with self.lock:
+            self.connection.execute(
+                'DELETE FROM "{}" WHERE stored_at < ?'.format(self.table),
+                (older_than,))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class TTLCache(object):
+    """
+        Thread-safe LRU cache holding at most `max_entries` items in memory.
+
+        Entries expire after `ttl` seconds. For dict values `field_ttls`
+        gives shorter or longer lifetimes per key: an entry is fresh for a
+        caller if every field it asks for (all fields by default) is
+        younger than its TTL. With a `backend` every write goes through to
+        disk and memory misses are looked up there.
+    """
+
+    def __init__(self, max_entries=10000, ttl=None, field_ttls=None, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.field_ttls = field_ttls or {}
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _max_age(self, value, fields=None):
+        ttls = [self.ttl] if self.ttl is not None else []
+        if isinstance(value, dict):
+            keys = value if fields is None else fields
+            ttls += [self.field_ttls[k] for k in keys if k in self.field_ttls]
+        return min(ttls) if ttls else None
+
+    def _is_fresh(self, value, stored_at, fields=None):
+        max_age = self._max_age(value, fields)
+        return max_age is None or time.time() - stored_at < max_age
+
+    def _remember(self, key, value, stored_at):
+        self._entries.pop(key, None)
+        self._entries[key] = (value, stored_at)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._entries[key] = entry
+            return entry
+        if self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None:
+                self._remember(key, entry[0], entry[1])
+        return entry
+
+    def get(self, key, default=None, fields=None):
+        key = str(key)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and self._is_fresh(entry[0], entry[1], fields):
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        key = str(key)
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, value, stored_at)
+            if self.backend is not None:
+                self.backend.set(key, value, stored_at)
+
+    def delete(self, key):
+        key = str(key)
+        with self._lock:
+            self._entries.pop(key, None)
+            if self.backend is not None:
+                self.backend.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.backend is not None:
+                self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': float(self.hits) / total if total else 0.0,
+                    'size': len(self._entries)}
+
+    def __contains__(self, key):
+        key = str(key)
+        with self._lock:
+            entry = self._lookup(key)
+            return entry is not None and self._is_fresh(entry[0], entry[1])
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        self.delete(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseCache(object):
+    """
+        Cache of GET responses to public endpoints, meant to be shared by
+        the `API`s of many accounts and, with a `backend`, by processes.
+
+        Only endpoints matching one of `families` are cached, each family
+        for its own TTL (`ttls` overrides them by family name). The cache
+        key is the endpoint, cursor included, without per-account
+        parameters like `rank_token`. Concurrent identical requests are
+        coalesced: one of them goes to the server and the others wait for
+        its response.
+    """
+
+    def __init__(self, max_entries=10000, ttls=None, backend=None,
+                 families=RESPONSE_FAMILIES):
+        ttls = ttls or {}
+        self.families = [(name, re.compile(pattern), ttls.get(name, ttl))
+                         for name, pattern, ttl in families]
+        # An entry is `{family: json}`, so the family TTLs apply as field TTLs
+        self.cache = TTLCache(max_entries, field_ttls=dict(
+            (name, ttl) for name, _, ttl in self.families), backend=backend)
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def family(self, endpoint):
+        for name, pattern, ttl in self.families:
+            if ttl and pattern.match(endpoint):
+                return name
+        return None
+
+    @staticmethod
+    def key(endpoint):
+        path, _, query = endpoint.partition('?')
+        params = [(k, v) for k, v in urllib.parse.parse_qsl(query, keep_blank_values=True)
+                  if k not in PRIVATE_PARAMS]
+        return path + '?' + urllib.parse.urlencode(sorted(params))
+
+    def fetch(self, endpoint, request):
+        """
+            Returns the cached `ApiResponse` of `endpoint` or the one of
+            `request()`, which is cached when it is ok.
+        """
+        family = self.family(endpoint)
+        if family is None:
+            return request()
+        key = self.key(endpoint)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return ApiResponse(200, cached[family], result=True)
+
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = {'done': threading.Event()}
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight['done'].wait()
+            if 'response' in flight:
+                return flight['response']
+            return request()  # The leader's request raised
+
+        try:
+            response = request()
+            if response.ok:
+                self.cache.set(key, {family: response.json})
+            flight['response'] = response
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight['done'].set()
+
+    def purge(self):
+        """Drops the expired entries from the backend."""
+        if self.cache.backend is not None:
+            max_ttl = max(ttl for _, _, ttl in self.families)
+            self.cache.backend.purge(time.time() - max_ttl)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['coalesced'] = self.coalesced
+        return stats
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,202 @@
+"""
+    Local index of the locations returned by `search_location`.
+
+    Usage:
+        index = LocationIndex('locations.db')
+        index.add(api.last_json['items'])
+        index.radius(52.5200, 13.4050, 500)          # nearest first
+        index.bbox(52.51, 13.39, 52.53, 13.42)
+        index.missing_cells(*radius_bbox(52.5200, 13.4050, 500))
+
+    Locations are stored by coordinates, the area around them is tracked in
+    geohash cells of `precision` characters (6 is about 1.2 x 0.6 km; a
+    larger area can be tracked in coarser cells). A cell marked as searched
+    is trusted for `ttl` seconds, so a sweep over many coordinates only
+    needs a `search_location` per unseen cell.
+"""
+
+import json
+import math
+import sqlite3
+import threading
+import time
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS = 6371000.0  # meters
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def geohash(latitude, longitude, precision=6):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            rng[0] = middle
+        else:
+            rng[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_bbox(cell):
+    """`(south, west, north, east)` of geohash `cell`."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            middle = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = middle
+            else:
+                rng[1] = middle
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def cell_center(cell):
+    south, west, north, east = cell_bbox(cell)
+    return (south + north) / 2, (west + east) / 2
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    dlat = math.sin((lat2 - lat1) / 2) ** 2
+    dlng = math.sin((lng2 - lng1) / 2) ** 2
+    a = dlat + math.cos(lat1) * math.cos(lat2) * dlng
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(latitude, longitude, radius):
+    """`(south, west, north, east)` around the circle of `radius` meters."""
+    dlat = radius / METERS_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    dlng = min(180.0, dlat / cos_lat)
+    return (max(-90.0, latitude - dlat), max(-180.0, longitude - dlng),
+            min(90.0, latitude + dlat), min(180.0, longitude + dlng))
+
+
+def cells_in_bbox(south, west, north, east, precision=6, limit=None):
+    """
+        Geohash cells covering the box, from its south-west corner. With
+        `limit` it stops after that many, e.g. to tell the box is too big.
+    """
+    s, w, n, e = cell_bbox(geohash(south, west, precision))
+    lat_step, lng_step = n - s, e - w
+    cells = []
+    lat = s + lat_step / 2
+    while lat - lat_step / 2 <= north:
+        lng = w + lng_step / 2
+        while lng - lng_step / 2 <= east:
+            if limit is not None and len(cells) >= limit:
+                return cells
+            cells.append(geohash(min(lat, 90.0), min(lng, 180.0), precision))
+            lng += lng_step
+        lat += lat_step
+    return cells
+
+
+class LocationIndex(object):
+    def __init__(self, path=None, precision=6, ttl=None, timeout=30):
+        """`path=None` keeps the index in memory."""
+        self.path = path
+        self.precision = precision
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path or ':memory:', timeout=timeout, check_same_thread=False,
+            isolation_level=None)
+        if path:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS location_index ('
+            'pk TEXT PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL, '
+            'value TEXT NOT NULL)')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS location_index_lat_lng ON location_index (lat, lng)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS location_cells ('
+            'cell TEXT PRIMARY KEY, searched_at REAL NOT NULL)')
+
+    def add(self, items):
+        """Stores the `search_location` items that have coordinates."""
+        rows = []
+        for item in items:
+            location = item.get('location', item)
+            if location.get('lat') is None or location.get('lng') is None:
+                continue
+            rows.append((str(location['pk']), float(location['lat']),
+                         float(location['lng']), json.dumps(item)))
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO location_index VALUES (?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def mark_searched(self, cells):
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO location_cells VALUES (?, ?)',
+                [(cell, now) for cell in cells])
+
+    def missing_cells(self, south, west, north, east, precision=None):
+        """Cells of the box that weren't searched (within `ttl`)."""
+        cells = cells_in_bbox(south, west, north, east, precision or self.precision)
+        oldest = time.time() - self.ttl if self.ttl is not None else 0
+        searched = set()
+        with self.lock:
+            # In chunks, SQLite takes at most 999 parameters
+            for start in range(0, len(cells), 500):
+                chunk = cells[start:start + 500]
+                searched.update(row[0] for row in self.connection.execute(
+                    'SELECT cell FROM location_cells WHERE searched_at >= ? '
+                    'AND cell IN ({})'.format(', '.join('?' * len(chunk))),
+                    [oldest] + chunk))
+        return [cell for cell in cells if cell not in searched]
+
+    def bbox(self, south, west, north, east):
+        """Locations inside the box, as `search_location` returned them."""
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT value FROM location_index WHERE lat BETWEEN ? AND ? '
+                'AND lng BETWEEN ? AND ?', (south, north, west, east)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def radius(self, latitude, longitude, radius):
+        """Locations within `radius` meters, nearest first."""
+        found = []
+        for item in self.bbox(*radius_bbox(latitude, longitude, radius)):
+            location = item.get('location', item)
+            meters = distance(latitude, longitude, location['lat'], location['lng'])
+            if meters <= radius:
+                found.append((meters, item))
+        found.sort(key=lambda pair: pair[0])
+        return [item for _, item in found]
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM location_index').fetchone()[0]
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM location_index')
+            self.connection.execute('DELETE FROM location_cells')
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,65 @@
+"""
+    Single-pass matching of many terms (stop words, blacklisted hashtags).
+
+    Usage:
+        matcher = TermMatcher(['shop', 'free', '#giveaway'])
+        matcher.find('Free stuff in my shop')  # 'Free'
+        matcher.find('#giveaways')             # None, hashtags match whole
+
+    The terms are compiled once into one regular expression shaped like a
+    trie, so a text is scanned once however many terms there are. Matching
+    ignores case. Hashtag terms (starting with '#') only match the whole
+    hashtag, other terms match anywhere unless `whole_words=True`.
+"""
+
+import re
+
+
+def _trie_pattern(terms):
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return _node_pattern(trie)
+
+
+def _node_pattern(node):
+    branches = [re.escape(char) + _node_pattern(child)
+                for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    if len(branches) == 1 and '' not in node:
+        return branches[0]
+    pattern = '(?:' + '|'.join(branches) + ')'
+    # Longer terms are tried first, the node's own term is the fallback
+    return pattern + '?' if '' in node else pattern
+
+
+class TermMatcher(object):
+    def __init__(self, terms, whole_words=False):
+        self.terms = tuple(terms)
+        self.whole_words = whole_words
+        terms = set(term.lower() for term in self.terms if term)
+        hashtags = [term for term in terms if term.startswith('#')]
+        words = [term for term in terms if not term.startswith('#')]
+
+        alternatives = []
+        if hashtags:
+            alternatives.append(r'{}(?!\w)'.format(_trie_pattern(hashtags)))
+        if words:
+            pattern = _trie_pattern(words)
+            if whole_words:
+                pattern = r'(?<!\w){}(?!\w)'.format(pattern)
+            alternatives.append(pattern)
+        self.regex = re.compile('|'.join(alternatives) or '(?!)',
+                                re.IGNORECASE | re.UNICODE)
+
+    def find(self, text):
+        """Returns the first term found in `text`, as written there, or None."""
+        match = self.regex.search(text or '')
+        return match.group(0) if match else None
+
+    def __len__(self):
+        return len(self.terms)
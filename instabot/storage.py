@@ -0,0 +1,240 @@
+"""
+    SQLite storage engine for the bot's state lists.
+
+    Usage:
+        bot = Bot(storage='sqlite:///state.db')
+
+    Every list (followed, unfollowed, skipped, friends, comments,
+    blacklist, whitelist) gets its own indexed table with a timestamp and
+    optional action metadata. The tables expose the same interface as
+    `instabot.utils.file` so the bot code doesn't care which one it uses.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from huepy import bold, green, orange
+
+from . import utils
+
+SQLITE_PREFIX = 'sqlite:///'
+
+
+def open_storage(url):
+    """Returns a storage engine for `url` or None for the text files."""
+    if url is None:
+        return None
+    if isinstance(url, SQLiteStorage):
+        return url
+    if url.startswith(SQLITE_PREFIX):
+        return SQLiteStorage(url[len(SQLITE_PREFIX):])
+    raise ValueError('Unsupported storage `{}`.'.format(url))
+
+
+class SQLiteStorage(object):
+    """
+        One SQLite database shared by all state lists of a bot.
+
+        The database runs in WAL mode with a busy timeout, so several bot
+        processes can point at the same file.
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(
+            path, timeout=timeout, check_same_thread=False,
+            isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS imported_files ('
+            'name TEXT NOT NULL, fname TEXT NOT NULL, imported_at REAL, '
+            'PRIMARY KEY (name, fname))')
+        self._tables = {}
+
+    def table(self, name, verbose=True):
+        if name not in self._tables:
+            self._tables[name] = SQLiteList(self, name, verbose)
+        return self._tables[name]
+
+    def execute(self, query, params=()):
+        with self.lock:
+            return self.connection.execute(query, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """
+            A `BEGIN IMMEDIATE` transaction on the connection: it takes the
+            write lock up front, so a read-then-write inside it can't race
+            with the threads of this process or other processes.
+        """
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def executemany(self, queries):
+        """Runs `(query, seq_of_params)` pairs in one transaction."""
+        with self.transaction() as connection:
+            for query, seq_of_params in queries:
+                connection.executemany(query, seq_of_params)
+
+    def import_file(self, name, fname):
+        """
+            One-shot import of a `utils.file` text file into table `name`.
+            Returns the number of imported items, 0 if the table was already
+            imported into or the file doesn't exist. Tables are only seeded
+            once, whatever the working directory or the file's path.
+        """
+        if not os.path.exists(fname):
+            return 0
+        table = self.table(name)
+        with self.transaction() as connection:
+            done = connection.execute(
+                'SELECT 1 FROM imported_files WHERE name = ?', (name,)).fetchall()
+            if done:
+                return 0
+            # Read through `utils.file` so pending tombstones are applied
+            items = utils.file(fname, verbose=False).list
+            now = time.time()
+            connection.executemany(
+                'INSERT INTO "{}" (item, created_at, action) '
+                'VALUES (?, ?, ?)'.format(table.name),
+                [(item, now, 'import') for item in items])
+            connection.execute(
+                'INSERT INTO imported_files VALUES (?, ?, ?)',
+                (name, os.path.abspath(fname), now))
+            return len(items)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class SQLiteList(object):
+    """A state list backed by an indexed SQLite table."""
+
+    def __init__(self, storage, name, verbose=True):
+        self.storage = storage
+        self.name = name
+        self.verbose = verbose
+        self.fname = '{}:{}'.format(storage.path, name)
+        storage.execute(
+            'CREATE TABLE IF NOT EXISTS "{}" ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'item TEXT NOT NULL, '
+            'created_at REAL NOT NULL, '
+            'action TEXT, '
+            'metadata TEXT)'.format(name))
+        storage.execute(
+            'CREATE INDEX IF NOT EXISTS "{0}_item" ON "{0}" (item)'.format(name))
+
+    @property
+    def list(self):
+        rows = self.storage.execute(
+            'SELECT item FROM "{}" ORDER BY id'.format(self.name))
+        return [row[0] for row in rows]
+
+    @property
+    def set(self):
+        rows = self.storage.execute(
+            'SELECT DISTINCT item FROM "{}"'.format(self.name))
+        return set(row[0] for row in rows)
+
+    @property
+    def version(self):
+        """Changes whenever the items do."""
+        return tuple(self.storage.execute(
+            'SELECT MAX(id), COUNT(*) FROM "{}"'.format(self.name))[0])
+
+    def __contains__(self, item):
+        return bool(self.storage.execute(
+            'SELECT 1 FROM "{}" WHERE item = ? LIMIT 1'.format(self.name),
+            (str(item),)))
+
+    def __iter__(self):
+        for i in self.list:
+            yield i
+
+    def __len__(self):
+        return self.storage.execute(
+            'SELECT COUNT(*) FROM "{}"'.format(self.name))[0][0]
+
+    def append(self, item, allow_duplicates=False, action=None, metadata=None):
+        if self.verbose:
+            msg = "Adding '{}' to `{}`.".format(item, self.fname)
+            print(bold(green(msg)))
+
+        item = str(item)
+        with self.storage.transaction() as connection:
+            if not allow_duplicates and item in self:
+                msg = "'{}' already in `{}`.".format(item, self.fname)
+                print(bold(orange(msg)))
+                return
+            connection.execute(
+                'INSERT INTO "{}" (item, created_at, action, metadata) '
+                'VALUES (?, ?, ?, ?)'.format(self.name),
+                (item, time.time(), action,
+                 json.dumps(metadata) if metadata is not None else None))
+
+    def remove(self, x):
+        x = str(x)
+        with self.storage.transaction() as connection:
+            if x not in self:
+                return
+            connection.execute(
+                'DELETE FROM "{0}" WHERE id = (SELECT id FROM "{0}" '
+                'WHERE item = ? ORDER BY id LIMIT 1)'.format(self.name), (x,))
+        msg = "Removing '{}' from `{}`.".format(x, self.fname)
+        print(bold(green(msg)))
+
+    def random(self):
+        rows = self.storage.execute(
+            'SELECT item FROM "{}" ORDER BY RANDOM() LIMIT 1'.format(self.name))
+        if not rows:
+            raise IndexError('Cannot choose from an empty list')
+        return rows[0][0]
+
+    def remove_duplicates(self):
+        return list(OrderedDict.fromkeys(self.list))
+
+    def save_list(self, items):
+        now = time.time()
+        self.storage.executemany([
+            ('DELETE FROM "{}"'.format(self.name), [()]),
+            ('INSERT INTO "{}" (item, created_at) VALUES (?, ?)'.format(
+                self.name), [(str(item), now) for item in items]),
+        ])
+
+    def difference(self, items):
+        """Returns the items of `items` that are not in the list."""
+        candidates = dict((str(i), i) for i in items)
+        if not candidates:
+            return set()
+        with self.storage.lock:
+            connection = self.storage.connection
+            connection.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS candidates '
+                '(item TEXT PRIMARY KEY)')
+            self.storage.executemany([
+                ('DELETE FROM candidates', [()]),
+                ('INSERT INTO candidates VALUES (?)',
+                 [(i,) for i in candidates]),
+            ])
+            rows = connection.execute(
+                'SELECT item FROM candidates WHERE item NOT IN '
+                '(SELECT item FROM "{}")'.format(self.name)).fetchall()
+        return set(candidates[row[0]] for row in rows)
+
+    def close(self):
+        pass
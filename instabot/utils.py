@@ -1,54 +1,141 @@
-
+import os
 import random
-from collections import OrderedDict
+import threading
+from collections import Counter, OrderedDict, deque
 
 from huepy import bold, green, orange
 
 
+# `os.replace` is Python 3 only, `os.rename` also overwrites on POSIX
+replace_file = getattr(os, 'replace', os.rename)
+
+
 class file(object):
-    def __init__(self, fname, verbose=True):
+    """
+        One item per line text file with an in-memory index.
+
+        The parsed lines are kept as an ordered list plus a map from each
+        item to its positions, and are only reread when the file's mtime or
+        size changes. Appends go to an open handle, removals are written to
+        a tombstone log (`<fname>.removed`) which is folded back into the
+        file by a background compaction once it grows past
+        `compact_threshold`. Every log line records the state of the file it
+        applies to; a log left behind by a file changed elsewhere is dropped.
+    """
+
+    TOMBSTONE_SUFFIX = '.removed'
+
+    def __init__(self, fname, verbose=True, compact_threshold=1000):
         self.fname = fname
         self.verbose = verbose
+        self.compact_threshold = compact_threshold
+        self.tombstones_fname = fname + self.TOMBSTONE_SUFFIX
         open(self.fname, 'a').close()
 
+        self._lock = threading.RLock()
+        self._handle = None
+        self._items = []  # None marks a removed item until the next rebuild
+        self._positions = {}
+        self._n_removed = 0
+        self._signature = None
+        self._n_tombstones = 0
+        self._compaction = None
+
     @property
     def list(self):
-        with open(self.fname, 'r') as f:
-            lines = [x.strip('\n') for x in f.readlines()]
-            return [x for x in lines if x]
+        with self._lock:
+            self._load()
+            return [x for x in self._items if x is not None]
 
     @property
     def set(self):
-        return set(self.list)
+        with self._lock:
+            self._load()
+            return set(self._positions)
+
+    @property
+    def version(self):
+        """Changes whenever the items do, without reading the file."""
+        return self._stat()
+
+    def __contains__(self, item):
+        with self._lock:
+            self._load()
+            return str(item) in self._positions
 
     def __iter__(self):
         for i in self.list:
             yield next(iter(i))
 
     def __len__(self):
-        return len(self.list)
+        with self._lock:
+            self._load()
+            return len(self._items) - self._n_removed
 
     def append(self, item, allow_duplicates=False):
         if self.verbose:
             msg = "Adding '{}' to `{}`.".format(item, self.fname)
             print(bold(green(msg)))
 
-        if not allow_duplicates and str(item) in self.list:
-            msg = "'{}' already in `{}`.".format(item, self.fname)
-            print(bold(orange(msg)))
-            return
+        with self._lock:
+            indexed = self._signature is not None and self._signature == self._stat()
+            if not allow_duplicates:
+                self._load()
+                indexed = True
+                if str(item) in self._positions:
+                    msg = "'{}' already in `{}`.".format(item, self.fname)
+                    print(bold(orange(msg)))
+                    return
+            elif not indexed:
+                # Drops a log left stale by changes made elsewhere
+                self._read_tombstones()
 
-        with open(self.fname, 'a') as f:
-            f.write('{item}\n'.format(item=item))
+            if self._handle is None:
+                self._handle = open(self.fname, 'a')
+            self._handle.write('{item}\n'.format(item=item))
+            self._handle.flush()
+            if indexed:
+                self._positions.setdefault(str(item), deque()).append(len(self._items))
+                self._items.append(str(item))
+            if os.path.exists(self.tombstones_fname):
+                # Keeps the log valid for the file as it is now
+                self._write_tombstone('')
+            if indexed:
+                self._signature = self._stat()
 
     def remove(self, x):
         x = str(x)
-        items = self.list
-        if x in items:
-            items.remove(x)
+        with self._lock:
+            self._load()
+            if x not in self._positions:
+                return
+            self._items[self._positions[x].popleft()] = None
+            if not self._positions[x]:
+                del self._positions[x]
+            self._n_removed += 1
+            if self._n_removed > len(self._items) // 2:
+                self._index(self.list)
             msg = "Removing '{}' from `{}`.".format(x, self.fname)
             print(bold(green(msg)))
-            self.save_list(items)
+            self._write_tombstone(x)
+            self._n_tombstones += 1
+            self._signature = self._stat()
+            if self._n_tombstones >= self.compact_threshold:
+                self._compact_in_background()
+
+    def iter_items(self):
+        """Streams the items from the file without loading the index."""
+        with self._lock:
+            tombstones = self._read_tombstones()
+        with open(self.fname, 'r') as f:
+            for line in f:
+                item = line.strip('\n')
+                if not item:
+                    continue
+                if tombstones[item] > 0:
+                    tombstones[item] -= 1
+                    continue
+                yield item
 
     def random(self):
         return random.choice(self.list)
@@ -57,6 +144,116 @@ class file(object):
         return list(OrderedDict.fromkeys(self.list))
 
     def save_list(self, items):
-        with open(self.fname, 'w') as f:
+        with self._lock:
+            self._close_handle()
+            # Written aside and swapped in, so a crash never leaves half a file
+            tmp_fname = self.fname + '.tmp'
+            with open(tmp_fname, 'w') as f:
+                for item in items:
+                    f.write('{item}\n'.format(item=item))
+                f.flush()
+                os.fsync(f.fileno())
+            replace_file(tmp_fname, self.fname)
+            if os.path.exists(self.tombstones_fname):
+                os.remove(self.tombstones_fname)
+            self._signature = None
+
+    def difference(self, items):
+        """Returns the items of `items` that are not in the file."""
+        with self._lock:
+            self._load()
+            return set(i for i in items if str(i) not in self._positions)
+
+    def compact(self):
+        """Folds the tombstone log into the file and truncates the log."""
+        with self._lock:
+            self._load()
+            if self._n_tombstones:
+                self.save_list(self.list)
+
+    def close(self):
+        compaction = self._compaction
+        if compaction is not None and compaction is not threading.current_thread():
+            compaction.join()
+        with self._lock:
+            self._close_handle()
+
+    def _compact_in_background(self):
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        # Not a daemon, the interpreter waits for it to finish the file
+        self._compaction = threading.Thread(target=self.compact)
+        self._compaction.start()
+
+    def _close_handle(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _stat(self):
+        signature = []
+        for fname in (self.fname, self.tombstones_fname):
+            try:
+                st = os.stat(fname)
+                signature.append((st.st_mtime, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _file_state(self):
+        """Identifies the file's contents, recorded with every tombstone."""
+        st = os.stat(self.fname)
+        return '{} {} {!r}'.format(st.st_ino, st.st_size, st.st_mtime)
+
+    def _write_tombstone(self, item):
+        with open(self.tombstones_fname, 'a') as f:
+            f.write('{}\t{}\n'.format(self._file_state(), item))
+
+    def _index(self, items):
+        self._items = items
+        self._positions = {}
+        for i, item in enumerate(items):
+            self._positions.setdefault(item, deque()).append(i)
+        self._n_removed = 0
+
+    def _read_tombstones(self):
+        """Counts of the logged removals, empty if the log is stale."""
+        tombstones = Counter()
+        state = None
+        if os.path.exists(self.tombstones_fname):
+            with open(self.tombstones_fname, 'r') as f:
+                for line in f:
+                    state, _, item = line.strip('\n').partition('\t')
+                    if item:
+                        tombstones[item] += 1
+        if tombstones and state != self._file_state():
+            print(bold(orange("`{}` was changed elsewhere, dropping `{}`.".format(
+                self.fname, self.tombstones_fname))))
+            os.remove(self.tombstones_fname)
+            return Counter()
+        return tombstones
+
+    def _load(self):
+        signature = self._stat()
+        if signature == self._signature:
+            return
+        with open(self.fname, 'r') as f:
+            lines = [x.strip('\n') for x in f.readlines()]
+        items = [x for x in lines if x]
+
+        tombstones = self._read_tombstones()
+        n_tombstones = sum(tombstones.values())
+        if tombstones:
+            # Appends always go to the end and `remove` drops the first
+            # occurrence, so each tombstone cancels the earliest copy left.
+            kept = []
             for item in items:
-                f.write('{item}\n'.format(item=item))
+                if tombstones[item] > 0:
+                    tombstones[item] -= 1
+                    continue
+                kept.append(item)
+            items = kept
+
+        self._index(items)
+        self._n_tombstones = n_tombstones
+        self._signature = self._stat()
@@ -33,7 +33,12 @@ setup(
         'future>=0.17.1',
         'six>=1.12.0',
         'huepy>=0.9.8.1',
+        'futures>=3.2.0; python_version < "3.0"',
     ],
+    extras_require={
+        # Vectorized `Bot.filter_users_batch`
+        'numpy': ['numpy>=1.13'],
+    },
     classifiers=[
         # How mature is this project? Common values are
         'Development Status :: 5 - Production/Stable',
@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _run_in_tmpdir(tmpdir):
+    # Bots write their state files and log to the working directory
+    with tmpdir.as_cwd():
+        yield
@@ -0,0 +1,86 @@
+import sys
+
+import pytest
+import responses
+
+from instabot.api.config import API_URL
+from instabot.api.rate_limit import (AdaptiveRateLimiter, TokenBucket,
+                                     parse_retry_after)
+
+from .test_bot import TestBot
+from .test_variables import TEST_MEDIA_LIKER, TEST_USERNAME_INFO_ITEM
+
+pytestmark = pytest.mark.skipif(sys.version_info[0] < 3, reason='asyncio')
+
+
+class TestAsyncAPI(TestBot):
+    def setup(self):
+        super(TestAsyncAPI, self).setup()
+        from instabot.api import AsyncAPI
+        self.async_api = AsyncAPI(self.bot.api, concurrency=4, rate=1000, burst=1000)
+
+    def teardown(self):
+        self.async_api.close()
+
+    @responses.activate
+    def test_get_media_likers(self):
+        media_ids = [1, 2, 3]
+        for media_id in media_ids:
+            responses.add(
+                responses.GET, '{api_url}media/{media_id}/likers/?'.format(
+                    api_url=API_URL, media_id=media_id),
+                json={'status': 'ok', 'users': [TEST_MEDIA_LIKER]}, status=200)
+
+        requests_before = self.bot.api.total_requests
+        results = self.async_api.run(self.async_api.gather(
+            self.async_api.get_media_likers(media_id) for media_id in media_ids))
+
+        assert [r['users'][0]['pk'] for r in results] == [TEST_MEDIA_LIKER['pk']] * 3
+        assert self.bot.api.total_requests == requests_before + 3
+
+    @responses.activate
+    def test_get_username_info_error(self):
+        user_id = TEST_USERNAME_INFO_ITEM['pk']
+        responses.add(
+            responses.GET, '{api_url}users/{user_id}/info/'.format(
+                api_url=API_URL, user_id=user_id),
+            json={'status': 'fail'}, status=404)
+
+        assert self.async_api.run(self.async_api.get_username_info(user_id)) is None
+
+
+class TestTokenBucket:
+    def test_reserve(self):
+        bucket = TokenBucket(rate=10, burst=2)
+
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert 0 < bucket.reserve() <= 0.1
+
+
+class TestAdaptiveRateLimiter:
+    def test_unpaced_until_throttled(self):
+        limiter = AdaptiveRateLimiter()
+
+        assert limiter.rate is None
+        assert all(limiter.reserve() == 0 for _ in range(100))
+
+    def test_throttle_and_recover(self):
+        limiter = AdaptiveRateLimiter(rate=2, burst=1, backoff=10, jitter=0)
+
+        assert limiter.on_throttle() == 10
+        assert limiter.rate == 1
+        assert 9 < limiter.reserve() <= 10
+        assert limiter.on_throttle() == 20
+        assert limiter.rate == 0.5
+        assert limiter.on_throttle(retry_after=5) == 5
+
+        limiter.on_success()
+        assert limiter.rate == 0.26
+        assert limiter.throttles == 0
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after('120') == 120
+        assert parse_retry_after('not a date') is None
+        assert parse_retry_after('Thu, 01 Jan 1970 00:00:00 GMT') == 0
@@ -0,0 +1,110 @@
+import os
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+import pytest
+
+from instabot import Bot, utils
+from instabot.bloom import BloomFilter
+from instabot.bot.processed import GuardedList, filter_path
+
+
+class TestBloomFilter:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmpdir):
+        self.folder = str(tmpdir)
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(str(i))
+        assert all(str(i) in bloom for i in range(1000))
+        false_positives = sum(1 for i in range(1000, 11000) if str(i) in bloom)
+        assert false_positives < 300  # 1% expected
+        assert len(bloom) <= 1000
+
+    def test_persists_in_file(self):
+        path = os.path.join(self.folder, 'ids.bloom')
+        bloom = BloomFilter(path, capacity=1000)
+        bloom.add('1234567')
+        bloom.close()
+
+        bloom = BloomFilter(path)
+        assert '1234567' in bloom
+        assert '7654321' not in bloom
+        assert len(bloom) == 1
+        bloom.close()
+
+
+class TestGuardedList:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmpdir):
+        self.folder = str(tmpdir)
+        self.followed = utils.file(os.path.join(self.folder, 'followed.txt'), verbose=False)
+        self.followed.save_list(['1', '2'])
+        self.path = os.path.join(self.folder, 'processed.followed.bloom')
+        yield
+        self.followed.close()
+
+    def test_guarded_list(self):
+        followed = GuardedList(self.followed, self.path, capacity=1000)
+        assert '1' in followed
+        assert 3 not in followed
+        followed.append('3')
+        assert 3 in followed
+        followed.remove('3')  # Still in the filter, the exact check says no
+        assert '3' in followed.bloom
+        assert '3' not in followed
+        followed.close()
+
+    def test_text_list_is_never_loaded(self):
+        followed = GuardedList(self.followed, self.path, capacity=1000)
+        followed.append('3')
+        followed.append('3')  # A duplicate, found by the scan
+        assert '3' in followed
+        assert followed.difference(['1', '3', '5']) == {'5'}
+        followed.remove('3')
+        followed.close()
+
+        fresh = utils.file(self.followed.fname, verbose=False)
+        followed = GuardedList(fresh, self.path, capacity=1000)
+        assert '3' not in followed
+        assert '1' in followed
+        assert followed.difference(['1', '3']) == {'3'}
+        assert fresh._signature is None  # The index was never built
+        followed.close()
+
+    def test_difference_only_checks_positives(self):
+        followed = GuardedList(self.followed, self.path, capacity=1000)
+        with patch.object(self.followed, 'iter_items', return_value=iter(['1', '2'])) as patched:
+            assert followed.difference(['1', '2', '5']) == {'5'}
+        patched.assert_called_once_with()
+        assert followed.difference(['1', '5', 6]) == {'5', 6}
+        followed.close()
+
+    def test_rebuilt_when_list_changes(self):
+        followed = GuardedList(self.followed, self.path, capacity=1000)
+        followed.close()
+        with open(self.followed.fname, 'a') as f:
+            f.write('4\n')  # Behind the filter's back
+
+        followed = GuardedList(self.followed, self.path, capacity=1000)
+        assert '4' in followed
+        followed.close()
+
+    def test_filter_path(self):
+        assert filter_path('state/processed.bloom', 'skipped') == 'state/processed.skipped.bloom'
+
+    def test_bot_has_a_filter_per_list(self):
+        path = os.path.join(self.folder, 'processed.bloom')
+        bot = Bot(followed_file=self.followed.fname, processed_filter=path)
+
+        assert '1' in bot.followed_file
+        assert '1' not in bot.skipped_file
+        for name in ('followed', 'unfollowed', 'skipped'):
+            assert os.path.exists(filter_path(path, name))
+        for guarded_list in bot.processed_users:
+            guarded_list.close()
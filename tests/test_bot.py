@@ -1,12 +1,16 @@
 import json
+import threading
 try:
     from unittest.mock import Mock, patch
 except ImportError:
     from mock import Mock, patch
 
+import pytest
 import requests
+import responses
 
 from instabot import Bot
+from instabot.api.config import API_URL
 
 
 class TestBot:
@@ -100,3 +104,157 @@ class TestBotAPI(TestBot):
         self.bot.reset_counters()
         for key in keys:
             assert self.bot.total[key] == 0
+
+    @responses.activate
+    def test_call(self):
+        media_id = 1234
+        responses.add(
+            responses.GET, '{api_url}media/{media_id}/info/'.format(
+                api_url=API_URL, media_id=media_id),
+            json={'status': 'ok', 'items': []}, status=200)
+        responses.add(
+            responses.GET, '{api_url}media/{media_id}/likers/?'.format(
+                api_url=API_URL, media_id=media_id),
+            json={'status': 'fail'}, status=404)
+
+        response = self.bot.api.call('media_info', media_id)
+        assert response.ok
+        assert response.status_code == 200
+        assert response.json == {'status': 'ok', 'items': []}
+        assert self.bot.api.last_json == response.json
+
+        response = self.bot.api.call('get_media_likers', media_id)
+        assert not response
+        assert response.status_code == 404
+        assert response.get('status') == 'fail'
+
+    @responses.activate
+    def test_last_json_is_per_thread(self):
+        responses.add(
+            responses.GET, '{api_url}feed/timeline/'.format(api_url=API_URL),
+            json={'status': 'ok'}, status=200)
+
+        self.bot.api.last_json = {'thread': 'main'}
+        thread = threading.Thread(target=self.bot.api.get_timeline_feed)
+        thread.start()
+        thread.join()
+
+        assert self.bot.api.last_json == {'thread': 'main'}
+
+    def test_create_session_shares_adapters_by_proxy(self):
+        first = Bot(share_connections=True, pool_maxsize=4)
+        second = Bot(share_connections=True, pool_maxsize=4)
+        other_proxy = Bot(share_connections=True, pool_maxsize=4)
+        other_proxy.api.proxy = '127.0.0.1:8080'
+        unshared = Bot(pool_maxsize=4)
+
+        adapter = first.api.create_session().get_adapter(API_URL)
+        assert adapter._pool_maxsize == 4
+        assert second.api.create_session().get_adapter(API_URL) is adapter
+        assert other_proxy.api.create_session().get_adapter(API_URL) is not adapter
+        assert unshared.api.create_session().get_adapter(API_URL) is not adapter
+
+    def test_default_data_follows_cookie_jar(self):
+        api = self.bot.api
+        api.session = api.create_session()
+        requests.utils.add_dict_to_cookiejar(
+            api.session.cookies, {'csrftoken': 'first', 'ds_user_id': '1'})
+        assert api.default_data == {
+            '_uuid': api.uuid, '_uid': '1', '_csrftoken': 'first'}
+
+        data = api.default_data
+        data['_csrftoken'] = 'changed by the caller'
+        assert api.default_data['_csrftoken'] == 'first'
+
+        api.session.cookies.set('csrftoken', 'second')
+        assert api.token == 'second'
+        assert api.default_data['_csrftoken'] == 'second'
+
+    def test_generate_signature(self):
+        signature = self.bot.api.generate_signature('{"a": "b c"}')
+        assert signature.startswith('ig_sig_key_version=4&signed_body=')
+        digest, body = signature.split('signed_body=')[1].split('.', 1)
+        assert len(digest) == 64
+        assert body == '%7B%22a%22%3A%20%22b%20c%22%7D'
+        assert self.bot.api.generate_signature('{"a": "b c"}') == signature
+
+    @responses.activate
+    @patch('time.sleep')
+    def test_too_many_requests_holds_back_next_request(self, patched_time_sleep):
+        url = '{api_url}feed/timeline/'.format(api_url=API_URL)
+        responses.add(responses.GET, url, json={'status': 'fail'}, status=429,
+                      headers={'Retry-After': '30'})
+        responses.add(responses.GET, url, json={'status': 'ok'}, status=200)
+
+        assert not self.bot.api.get_timeline_feed()
+        assert not patched_time_sleep.called
+        assert self.bot.api.rate_limiter.rate is not None
+
+        assert self.bot.api.get_timeline_feed()
+        assert 29 < patched_time_sleep.call_args[0][0] <= 30
+
+    @patch('time.sleep')
+    @patch('time.time')
+    def test_run_scheduled_lanes(self, patched_time_time, patched_time_sleep):
+        clock = [1000.0]
+        patched_time_time.side_effect = lambda: clock[0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+        patched_time_sleep.side_effect = sleep
+
+        self.bot.scheduler.jitter = (1, 1)
+        self.bot.delays.update({'like': 10, 'follow': 30})
+        self.bot.last['like'] = 1000.0
+
+        def action(key, name):
+            self.bot.delay(key)
+            return name, clock[0]
+
+        self.bot.schedule('like', action, 'like', 'first like')
+        self.bot.schedule('like', action, 'like', 'second like')
+        self.bot.schedule('follow', action, 'follow', 'follow')
+        results = self.bot.run_scheduled()
+
+        assert results == [('follow', ('follow', 1000.0)),
+                           ('like', ('first like', 1010.0)),
+                           ('like', ('second like', 1020.0))]
+        assert self.bot.last['like'] == 1020.0
+        assert self.bot.scheduler.pending() == 0
+
+    @responses.activate
+    def test_whitelist_is_resolved_once(self, tmpdir):
+        fname = str(tmpdir.join('whitelist.txt'))
+        with open(fname, 'w') as f:
+            f.write('1111\n@friend\n')
+        bot = Bot(whitelist_file=fname)
+        self.prepare_api(bot)
+        responses.add(
+            responses.GET, '{api_url}users/friend/usernameinfo/'.format(api_url=API_URL),
+            json={'status': 'ok', 'user': {'pk': 2222}}, status=200)
+
+        assert bot.whitelist == frozenset(['1111', '2222'])
+        assert '2222' in bot.whitelist
+        assert len(responses.calls) == 1
+
+        bot._whitelist.check_interval = 0
+        bot.whitelist_file.append('3333')
+        bot.whitelist  # Starts the refresh in the background
+        bot._whitelist._resolving.join()
+        assert bot.whitelist == frozenset(['1111', '2222', '3333'])
+        assert len(responses.calls) == 1
+
+    def test_whitelist_resolved_again_after_error(self, tmpdir):
+        fname = str(tmpdir.join('whitelist.txt'))
+        with open(fname, 'w') as f:
+            f.write('1111\n@friend\n@other\n')
+        bot = Bot(whitelist_file=fname)
+        with patch.object(bot, 'convert_to_user_id', side_effect=KeyError):
+            with pytest.raises(KeyError):
+                bot.whitelist
+        bot._whitelist._checked_at = 0
+        with patch.object(bot, 'convert_to_user_id',
+                          side_effect=lambda name: {'@friend': '2222'}.get(name)) as convert:
+            assert bot.whitelist == frozenset(['1111', '2222'])
+            # Ids aren't looked up
+            assert sorted(call[0][0] for call in convert.call_args_list) == ['@friend', '@other']
@@ -7,6 +7,7 @@ except ImportError:
     from mock import patch
 
 from instabot.api.config import API_URL
+from instabot.bot.rules import Rule, RulePipeline
 
 from .test_bot import TestBot
 from .test_variables import TEST_USERNAME_INFO_ITEM
@@ -44,3 +45,151 @@ class TestBotFilter(TestBot):
         result = self.bot.check_user(user_id)
 
         assert result == expected
+
+    @pytest.mark.parametrize('screening_workers', [1, 4])
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_screen_users(self, patched_time_sleep, screening_workers):
+        self.bot.screening_workers = screening_workers
+        self.bot.screening_rate = 1000
+        self.bot._following = [1]
+
+        user_ids = [str(TEST_USERNAME_INFO_ITEM['pk'] + i) for i in range(6)]
+        for i, user_id in enumerate(user_ids):
+            user_info = TEST_USERNAME_INFO_ITEM.copy()
+            user_info['pk'] = int(user_id)
+            user_info['is_private'] = False
+            user_info['is_verified'] = False
+            user_info['has_anonymous_profile_picture'] = False
+            user_info['follower_count'] = 100
+            user_info['following_count'] = 50
+            user_info['media_count'] = 10
+            user_info['biography'] = 'instabot'
+            user_info['is_business'] = i % 2 == 1
+            responses.add(
+                responses.GET, '{api_url}users/{user_id}/info/'.format(
+                    api_url=API_URL, user_id=user_id
+                ), status=200, json={'status': 'ok', 'user': user_info})
+
+        approved = list(self.bot.screen_users(user_ids))
+
+        assert approved == user_ids[::2]
+
+    @pytest.mark.parametrize('use_numpy', [True, False])
+    def test_filter_users_batch(self, use_numpy):
+        if use_numpy:
+            pytest.importorskip('numpy')
+        self.bot.filter_business_accounts = True
+        self.bot.max_followers_to_following_ratio = 10
+
+        def user_info(pk, **fields):
+            info = {'pk': pk, 'username': 'user{}'.format(pk), 'biography': '',
+                    'follower_count': 100, 'following_count': 50, 'media_count': 10,
+                    'is_private': False, 'is_business': False}
+            info.update(fields)
+            return info
+
+        user_infos = [
+            user_info(1),
+            user_info(2, is_business=True),
+            user_info(3, follower_count=1000, following_count=10),
+            user_info(4, following_count=0),
+            user_info(5, media_count=0),
+            user_info(6, biography='best shop in town'),
+            {'pk': 7, 'username': 'user7'},
+            user_info(8),
+        ]
+
+        if use_numpy:
+            accepted, rejections = self.bot.filter_users_batch(user_infos, batch_size=3)
+        else:
+            with patch('instabot.bot.bot_filter.np', None):
+                accepted, rejections = self.bot.filter_users_batch(user_infos, batch_size=3)
+
+        assert accepted == ['1', '8']
+        assert rejections['business'] == 1
+        assert rejections['followers_to_following_ratio'] == 1
+        assert rejections['min_following'] == 1  # Checked before `zero_division`
+        assert rejections['min_media_count'] == 1
+        assert rejections['stop_words'] == 1
+        assert rejections['missing_fields'] == 1
+        assert sum(rejections.values()) == len(user_infos) - len(accepted)
+
+    def test_filter_users_batch_without_complete_infos(self):
+        pytest.importorskip('numpy')
+
+        accepted, rejections = self.bot.filter_users_batch([{'pk': 1}])
+
+        assert accepted == []
+        assert rejections['missing_fields'] == 1
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_check_user_local_rules_first(self, patched_time_sleep):
+        self.bot._following = [1]
+        user_id = str(TEST_USERNAME_INFO_ITEM['pk'] + 100)
+        self.bot.followed_file.append(user_id)
+        self.bot.filter_previously_followed = True
+
+        assert not self.bot.check_user(user_id)
+        assert len(responses.calls) == 0  # The user info is never fetched
+
+        stats = dict((rule['name'], rule) for rule in self.bot.filter_stats)
+        assert stats['previously_followed']['hits'] == 1
+        assert stats['min_followers']['calls'] == 0
+        self.bot.followed_file.remove(user_id)
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_check_user_previously_skipped(self, patched_time_sleep):
+        self.bot._following = [1]
+        user_id = str(TEST_USERNAME_INFO_ITEM['pk'] + 100)
+        self.bot.skipped_file.append(user_id)
+
+        assert not self.bot.check_user(user_id, skip_skipped=True)
+        assert len(responses.calls) == 0
+        # Only the follow pipeline skips them
+        with patch.object(self.bot, 'get_user_info', return_value=None) as get_user_info:
+            assert not self.bot.check_user(user_id)
+            get_user_info.assert_called_once_with(user_id)
+        self.bot.skipped_file.remove(user_id)
+
+    @patch('time.sleep', return_value=None)
+    def test_check_user_refreshes_stale_following(self, patched_time_sleep):
+        self.bot._following = ['1']
+        self.bot.last['updated_following'] = 0  # Synced long ago
+        with patch('instabot.bot.follow_sync.sync_user_ids', return_value=['2']) as sync:
+            assert not self.bot.check_user('2')
+            assert sync.call_count == 1
+        assert self.bot._following == ['2']
+
+
+class TestRulePipeline:
+    def test_reorders_by_hit_rate(self):
+        rules = [Rule('first', lambda bot, item, context: False, outcome=True, fixed=True),
+                 Rule('rare', lambda bot, item, context: item == 0),
+                 Rule('common', lambda bot, item, context: item % 2 == 1)]
+        pipeline = RulePipeline(rules, reorder_every=10)
+
+        results = [pipeline.run(None, item) for item in range(20)]
+
+        assert results == [item % 2 == 0 and item != 0 for item in range(20)]
+        assert [rule['name'] for rule in pipeline.stats()] == ['first', 'common', 'rare']
+        assert pipeline.stats()[0]['calls'] == 20
+
+    def test_keeps_rules_with_other_side_effects_in_place(self):
+        skipped = []
+
+        def skip(bot, item, context):
+            skipped.append(item)
+
+        rules = [Rule('rare', lambda bot, item, context: item == 0, on_fire=skip),
+                 Rule('quiet', lambda bot, item, context: item % 2 == 1),
+                 Rule('common', lambda bot, item, context: item % 3 > 0, on_fire=skip)]
+        pipeline = RulePipeline(rules, reorder_every=10)
+
+        for item in range(20):
+            pipeline.run(None, item)
+
+        assert [rule['name'] for rule in pipeline.stats()] == ['rare', 'quiet', 'common']
+        assert skipped == [0] + [item for item in range(20) if item % 2 == 0 and item % 3]
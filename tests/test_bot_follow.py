@@ -1,4 +1,8 @@
 
+import os
+import shutil
+import tempfile
+
 import pytest
 import responses
 
@@ -9,6 +13,8 @@ except ImportError:
 
 from instabot.api.config import API_URL, SIG_KEY_VERSION
 
+from instabot.bot.follow_sync import UserIdSet
+
 from .test_bot import TestBot
 from .test_variables import (TEST_SEARCH_USERNAME_ITEM, TEST_USERNAME_INFO_ITEM, TEST_FOLLOWER_ITEM,
                              TEST_FOLLOWING_ITEM)
@@ -156,6 +162,41 @@ class TestBotFilter(TestBot):
         test_followed = str(user_ids[0]) in self.bot.followed_file.list
         assert (test_broken_items and test_follows and test_followed and test_following)
 
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_follow_users_broken_items(self, patched_time_sleep):
+        self.bot._following = [1]
+        reset_files(self.bot)
+        user_ids = ['1001', '1002']
+        responses.add(
+            responses.POST, '{api_url}friendships/create/1001/'.format(api_url=API_URL),
+            json={'status': 'fail'}, status=404)
+        responses.add(
+            responses.POST, '{api_url}friendships/create/1002/'.format(api_url=API_URL),
+            json={'status': 'ok'}, status=200)
+        with patch.object(self.bot, 'screen_users', side_effect=lambda ids, **kwargs: (i for i in ids)):
+            assert self.bot.follow_users(user_ids) == ['1001']
+        assert self.bot.following == [1, '1002']
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_follow_users_closes_screening(self, patched_time_sleep):
+        reset_files(self.bot)
+        closed = []
+
+        def screened(user_ids, **kwargs):
+            try:
+                for user_id in user_ids:
+                    yield user_id
+            finally:
+                closed.append(True)
+
+        with patch.object(self.bot, 'screen_users', side_effect=screened), \
+                patch.object(self.bot.api, 'call', side_effect=KeyError):
+            with pytest.raises(KeyError):
+                self.bot.follow_users(['1001', '1002'])
+        assert closed == [True]
+
     @responses.activate
     @pytest.mark.parametrize('username', [
         '1234567890', 1234567890
@@ -365,3 +406,57 @@ class TestBotFilter(TestBot):
         test_following = sorted(self.bot.following) == [str(my_test_username_info_items[i]['pk']) for i in range(results_3)]
         test_followed = sorted(self.bot.followed_file.list) == [str(my_test_username_info_items[i]['pk']) for i in range(results_3)]
         assert (test_follows and test_following and test_followed)
+
+
+class TestFollowSync(TestBot):
+    def add_following(self, user_ids, following_count):
+        user_info = dict(TEST_USERNAME_INFO_ITEM, following_count=following_count)
+        responses.add(
+            responses.GET, '{api_url}users/{user_id}/info/'.format(
+                api_url=API_URL, user_id=self.USER_ID
+            ), status=200, json={'status': 'ok', 'user': user_info})
+        responses.add(
+            responses.GET, "{api_url}friendships/{user_id}/following/?max_id={max_id}&ig_sig_key_version={sig_key}&rank_token={rank_token}".format(
+                api_url=API_URL, user_id=self.USER_ID, rank_token=self.bot.api.rank_token, sig_key=SIG_KEY_VERSION, max_id=''
+            ), status=200, json={
+                'status': 'ok', 'big_list': False, 'next_max_id': None,
+                'users': [dict(TEST_FOLLOWING_ITEM, pk=pk) for pk in user_ids]})
+
+    def test_user_id_set(self):
+        ids = UserIdSet(['1', '2'])
+        ids.append('3')
+        ids.append('1')
+        ids.remove('2')
+        assert '3' in ids and '2' not in ids
+        assert ids == ['1', '3']
+        assert ids == set(['3', '1'])
+        assert ids != ['3', '1']
+
+    @responses.activate
+    def test_following_syncs_newest_page_only(self):
+        folder = tempfile.mkdtemp()
+        try:
+            self.bot.snapshot_file = os.path.join(folder, 'snapshot.json')
+            self.bot._following = UserIdSet(['1', '2', '3'])
+            self.bot.last['updated_following'] = 0
+            # Newest first, stops at the known ids
+            self.add_following([5, 4, 3, 2, 1], following_count=5)
+
+            assert self.bot.following == ['1', '2', '3', '4', '5']
+            assert len(responses.calls) == 2
+
+            self.bot._following = None  # Loaded back from the snapshot
+            assert self.bot.following == ['1', '2', '3', '4', '5']
+            assert len(responses.calls) == 2
+        finally:
+            shutil.rmtree(folder)
+
+    @responses.activate
+    def test_following_downloaded_again_after_removals(self):
+        self.bot._following = UserIdSet(['1', '2', '3'])
+        self.bot.last['updated_following'] = 0
+        self.add_following([4, 3, 1], following_count=3)
+
+        # 3 known + 1 new doesn't add up to 3, someone was unfollowed
+        assert self.bot.following == ['1', '3', '4']
+        assert '2' not in self.bot.following
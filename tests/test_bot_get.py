@@ -1,5 +1,8 @@
 
+import os
 import tempfile
+import threading
+import time
 
 import pytest
 import responses
@@ -831,6 +834,89 @@ class TestBotGet(TestBot):
 
         assert user_ids == [str(TEST_FOLLOWING_ITEM['pk']) for _ in range(results_3)]
 
+    @responses.activate
+    def test_iter_hashtag_medias_stops_fetching(self):
+        hashtag = 'hashtag1'
+        pages = []
+        for page in range(2):
+            items = []
+            for i in range(4):
+                item = TEST_PHOTO_ITEM.copy()
+                item['pk'] = 100 * page + i
+                item['like_count'] = self.bot.min_likes_to_like + 1
+                item['has_liked'] = i % 2 == 1  # Half is filtered out
+                items.append(item)
+            pages.append(items)
+        for max_id, items, next_max_id in (('', pages[0], 'page2'),
+                                           ('page2', pages[1], None)):
+            responses.add(
+                responses.GET, '{api_url}feed/tag/{hashtag}/?max_id={max_id}&rank_token={rank_token}&ranked_content=true&'.format(
+                    api_url=API_URL, hashtag=hashtag, max_id=max_id,
+                    rank_token=self.bot.api.rank_token),
+                json={'status': 'ok', 'more_available': next_max_id is not None,
+                      'next_max_id': next_max_id, 'items': items},
+                status=200, match_querystring=True)
+
+        medias = self.bot.iter_hashtag_medias(hashtag, amount=2)
+        assert next(medias) == 0
+        assert len(responses.calls) == 1
+        assert list(medias) == [2]
+        assert len(responses.calls) == 1
+
+        assert list(self.bot.iter_hashtag_medias(hashtag, amount=3)) == [0, 2, 100]
+        assert len(responses.calls) == 3
+
+        assert list(self.bot.iter_hashtag_medias(hashtag)) == [0, 2, 100, 102]
+        assert len(responses.calls) == 5
+
+        # Nothing is wanted, nothing is fetched
+        assert list(self.bot.iter_hashtag_medias(hashtag, amount=0)) == []
+        assert list(self.bot.iter_location_medias(1, amount=0)) == []
+        assert len(responses.calls) == 5
+
+    @responses.activate
+    def test_crawl_hashtags_dedups_and_ranks(self):
+        now = time.time()
+
+        def media(pk, age, has_liked=False):
+            return dict(TEST_PHOTO_ITEM, pk=pk, taken_at=now - age, has_liked=has_liked,
+                        like_count=self.bot.min_likes_to_like + 1)
+
+        feeds = {'tag_a': [media(1, 24 * 3600), media(2, 60), media(3, 60, has_liked=True)],
+                 'tag_b': [media(2, 60), media(4, 3600)]}
+        for hashtag, items in feeds.items():
+            responses.add(
+                responses.GET, '{api_url}feed/tag/{hashtag}/?max_id=&rank_token={rank_token}&ranked_content=true&'.format(
+                    api_url=API_URL, hashtag=hashtag, rank_token=self.bot.api.rank_token),
+                json={'status': 'ok', 'more_available': True, 'next_max_id': 'next',
+                      'items': items}, status=200)
+
+        # 2 carries both tags and is the newest, 3 is already liked
+        assert list(self.bot.crawl_hashtags(['tag_a', 'tag_b'])) == [2, 4, 1]
+        assert len(responses.calls) == 2
+        assert list(self.bot.crawl_hashtags(['tag_a', 'tag_b'], amount=1)) == [2]
+
+    def test_crawl_hashtags_drains_fetches_on_error(self):
+        closed = []
+        started = threading.Event()
+
+        def feed(tag):
+            try:
+                if tag == 'broken':
+                    started.wait()
+                    raise KeyError(tag)
+                started.set()
+                time.sleep(0.1)
+                yield [dict(TEST_PHOTO_ITEM, pk=1)]
+            finally:
+                closed.append(tag)
+
+        with patch.object(self.bot.api, 'iter_hashtag_feed', side_effect=feed):
+            with pytest.raises(KeyError):
+                list(self.bot.crawl_hashtags(['broken', 'slow']))
+        # The slow feed finished its page before being closed
+        assert sorted(closed) == ['broken', 'slow']
+
     @responses.activate
     @pytest.mark.parametrize('hashtag', [
         'hashtag1', 'hashtag2'
@@ -889,7 +975,8 @@ class TestBotGet(TestBot):
     @responses.activate
     @pytest.mark.parametrize('latitude', [1.2345])
     @pytest.mark.parametrize('longitude', [9.8765])
-    def test_get_locations_from_coordinates(self, latitude, longitude):
+    @patch('time.sleep', return_value=None)
+    def test_get_locations_from_coordinates(self, patched_time_sleep, latitude, longitude):
         results = 10
         response_data = {
             'has_more': False,
@@ -901,9 +988,121 @@ class TestBotGet(TestBot):
             responses.GET, '{api_url}fbsearch/places/?rank_token={rank_token}&query={query}&lat={lat}&lng={lng}'.format(
                 api_url=API_URL, rank_token=self.bot.api.rank_token, query='', lat=latitude, lng=longitude),
             json=response_data, status=200)
+        # The other cells around are empty
+        responses.add(
+            responses.GET, '{api_url}fbsearch/places/'.format(api_url=API_URL),
+            json={'status': 'ok', 'has_more': False, 'items': []}, status=200)
         locations = self.bot.get_locations_from_coordinates(latitude, longitude)
-        assert locations == [TEST_LOCATION_ITEM for _ in range(results)]
-        assert len(locations) == results
+        # The same location is indexed once
+        assert locations == [TEST_LOCATION_ITEM]
+        assert len(locations) == 1
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_get_geotag_medias_from_coordinates(self, patched_time_sleep):
+        latitude, longitude = 1.2330, 9.8730
+        locations = []
+        for pk in (1, 2):
+            location = dict(TEST_LOCATION_ITEM)
+            location['location'] = dict(
+                TEST_LOCATION_ITEM['location'], pk=pk, lat=latitude, lng=longitude)
+            locations.append(location)
+        responses.add(
+            responses.GET, '{api_url}fbsearch/places/?rank_token={rank_token}&query={query}&lat={lat}&lng={lng}'.format(
+                api_url=API_URL, rank_token=self.bot.api.rank_token, query='', lat=latitude, lng=longitude),
+            json={'status': 'ok', 'has_more': False, 'items': locations}, status=200)
+        responses.add(
+            responses.GET, '{api_url}fbsearch/places/'.format(api_url=API_URL),
+            json={'status': 'ok', 'has_more': False, 'items': []}, status=200)
+        # The locations overlap, media 11 was posted at both
+        for location_id, media_ids in ((1, [10, 11]), (2, [11, 12])):
+            items = [dict(TEST_PHOTO_ITEM, pk=pk, user=dict(TEST_PHOTO_ITEM['user'], pk=pk))
+                     for pk in media_ids]
+            responses.add(
+                responses.GET, '{api_url}feed/location/{location_id}/?max_id=&rank_token={rank_token}&ranked_content=true&'.format(
+                    api_url=API_URL, location_id=location_id, rank_token=self.bot.api.rank_token),
+                json={'status': 'ok', 'more_available': False, 'items': items}, status=200)
+
+        medias = self.bot.get_geotag_medias((latitude, longitude), filtration=False)
+        assert medias == [10, 11, 12]
+        search_calls = [call for call in responses.calls if 'fbsearch' in call.request.url]
+        # The area is searched once
+        assert self.bot.get_geotag_users((latitude, longitude)) == ['10', '11', '12']
+        assert len([call for call in responses.calls if 'fbsearch' in call.request.url]) == len(search_calls)
+
+    def test_get_geotag_locations_ids_or_coordinates(self):
+        with patch.object(self.bot, 'get_locations_from_coordinates',
+                          return_value=[TEST_LOCATION_ITEM]) as patched:
+            assert self.bot.get_geotag_locations((52, 13)) == [
+                str(TEST_LOCATION_ITEM['location']['pk'])]
+            patched.assert_called_once_with(52, 13)
+            assert self.bot.get_geotag_locations([213385402, 212988663]) == [
+                '213385402', '212988663']
+            assert self.bot.get_geotag_locations(['52', '13']) == ['52', '13']
+            assert patched.call_count == 1
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_get_locations_from_coordinates_uses_index(self, patched_time_sleep):
+        latitude, longitude = 1.9995, 9.8730
+        nearby = dict(TEST_LOCATION_ITEM)
+        # Across the degree line, 110 m away
+        nearby['location'] = dict(TEST_LOCATION_ITEM['location'], pk=1, lat=2.0005, lng=longitude)
+        far = dict(TEST_LOCATION_ITEM)
+        far['location'] = dict(TEST_LOCATION_ITEM['location'], pk=2, lat=2.0200, lng=longitude)
+        responses.add(
+            responses.GET, '{api_url}fbsearch/places/'.format(api_url=API_URL),
+            json={'status': 'ok', 'has_more': False, 'items': [far, nearby]}, status=200)
+
+        locations = self.bot.get_locations_from_coordinates(latitude, longitude, radius=200)
+        assert locations == [nearby]
+        calls = len(responses.calls)
+        assert calls >= 1
+
+        # Served from the index, nothing new to search
+        locations = self.bot.get_locations_from_coordinates(1.9996, longitude, radius=200)
+        assert locations == [nearby]
+        assert len(responses.calls) == calls
+
+        locations = self.bot.get_locations_in_bbox(1.99, 9.87, 2.03, 9.88)
+        assert sorted(location['location']['pk'] for location in locations) == [1, 2]
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_get_locations_in_large_area_is_capped(self, patched_time_sleep):
+        responses.add(
+            responses.GET, '{api_url}fbsearch/places/'.format(api_url=API_URL),
+            json={'status': 'ok', 'has_more': True, 'items': [TEST_LOCATION_ITEM]}, status=200)
+
+        # 20 km around takes hundreds of precision 6 cells
+        locations = self.bot.get_locations_from_coordinates(1.2345, 9.8765, radius=20000)
+
+        assert locations == [TEST_LOCATION_ITEM]
+        assert 0 < len(responses.calls) <= 25
+        # Cut short by `has_more`, so searched again next time
+        calls = len(responses.calls)
+        self.bot.get_locations_from_coordinates(1.2345, 9.8765, radius=20000)
+        assert len(responses.calls) == 2 * calls
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_get_locations_from_coordinates_is_limited(self, patched_time_sleep):
+        latitude, longitude = 1.2345, 9.8765
+        locations = []
+        for pk in range(1, 6):
+            location = dict(TEST_LOCATION_ITEM)
+            location['location'] = dict(
+                TEST_LOCATION_ITEM['location'], pk=pk, lat=latitude + pk * 0.0001, lng=longitude)
+            locations.append(location)
+        responses.add(
+            responses.GET, '{api_url}fbsearch/places/'.format(api_url=API_URL),
+            json={'status': 'ok', 'has_more': False, 'items': locations}, status=200)
+
+        nearest = self.bot.get_locations_from_coordinates(latitude, longitude, limit=3)
+        assert [item['location']['pk'] for item in nearest] == [1, 2, 3]
+        # Far away ones aren't returned at all
+        assert self.bot.get_locations_from_coordinates(latitude + 1, longitude) == []
+        assert len(self.bot.get_locations_from_coordinates(latitude, longitude, limit=None)) == 5
 
     @responses.activate
     def test_get_messages(self):
@@ -925,3 +1124,121 @@ class TestBotGet(TestBot):
                 api_url=API_URL), json=response_data, status=200)
         inbox = self.bot.get_messages()
         assert inbox == response_data
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_iter_followers_retries_throttled_page(self, patched_time_sleep):
+        user_id = 1234567890
+        url = "{api_url}friendships/{user_id}/followers/?rank_token={rank_token}".format(
+            api_url=API_URL, user_id=user_id, rank_token=self.bot.api.rank_token)
+        responses.add(
+            responses.GET, url, status=429, headers={'Retry-After': '30'},
+            json={'status': 'fail', 'message': 'Please wait a few minutes'})
+        responses.add(
+            responses.GET, url, status=200,
+            json={'status': 'ok', 'big_list': False, 'next_max_id': None,
+                  'users': [dict(TEST_FOLLOWER_ITEM, pk=1)]})
+
+        pages = list(self.bot.api.iter_followers_or_followings(user_id))
+
+        assert [[user['pk'] for user in page] for page in pages] == [[1]]
+        assert len(responses.calls) == 2
+        assert any(call[0][0] >= 29 for call in patched_time_sleep.call_args_list)
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_get_total_followers_resume(self, patched_time_sleep, tmpdir):
+        user_id = 1234567890
+        to_file = str(tmpdir.join('followers.txt'))
+        cursor_file = str(tmpdir.join('followers.cursor'))
+
+        responses.add(
+            responses.GET, '{api_url}users/{user_id}/info/'.format(
+                api_url=API_URL, user_id=user_id
+            ), status=200, json={'status': 'ok', 'user': TEST_USERNAME_INFO_ITEM})
+        first_page = [dict(TEST_FOLLOWER_ITEM, pk=i) for i in range(3)]
+        second_page = [dict(TEST_FOLLOWER_ITEM, pk=i) for i in range(3, 5)]
+        url = "{api_url}friendships/{user_id}/followers/?rank_token={rank_token}".format(
+            api_url=API_URL, user_id=user_id, rank_token=self.bot.api.rank_token)
+        responses.add(
+            responses.GET, url, status=200,
+            json={'status': 'ok', 'big_list': True, 'next_max_id': 'page2', 'users': first_page})
+        responses.add(
+            responses.GET, url + '&max_id=page2', status=500, json={'status': 'fail'})
+
+        followers = self.bot.api.get_total_followers_or_followings(
+            user_id, amount=5, to_file=to_file, fields=['pk'], cursor_file=cursor_file)
+
+        assert followers == [{'pk': i} for i in range(3)]
+        assert utils.file(to_file).list == ['0', '1', '2']
+        assert os.path.exists(cursor_file)
+
+        responses.replace(
+            responses.GET, url + '&max_id=page2', status=200,
+            json={'status': 'ok', 'big_list': False, 'next_max_id': None, 'users': second_page})
+
+        followers = self.bot.api.get_total_followers_or_followings(
+            user_id, amount=5, to_file=to_file, fields=[], cursor_file=cursor_file)
+
+        assert followers == []
+        assert utils.file(to_file).list == ['0', '1', '2', '3', '4']
+        assert not os.path.exists(cursor_file)
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_get_total_followers_filter_business(self, patched_time_sleep):
+        user_id = 1234567890
+        responses.add(
+            responses.GET, '{api_url}users/{user_id}/info/'.format(
+                api_url=API_URL, user_id=user_id
+            ), status=200, json={'status': 'ok', 'user': TEST_USERNAME_INFO_ITEM})
+        followers = [dict(TEST_FOLLOWER_ITEM, pk=i, is_private=False, is_verified=False)
+                     for i in range(4)]
+        followers[0]['is_verified'] = True  # filtered without a lookup
+        self.bot._user_infos['1'] = {'is_business': True}  # cached
+        for pk, is_business in ((2, False), (3, True)):
+            responses.add(
+                responses.GET, '{api_url}users/{user_id}/info/'.format(
+                    api_url=API_URL, user_id=pk
+                ), status=200, json={'status': 'ok', 'user': dict(TEST_USERNAME_INFO_ITEM, pk=pk, is_business=is_business)})
+        responses.add(
+            responses.GET, "{api_url}friendships/{user_id}/followers/?rank_token={rank_token}".format(
+                api_url=API_URL, user_id=user_id, rank_token=self.bot.api.rank_token),
+            status=200, json={'status': 'ok', 'big_list': False, 'next_max_id': None, 'users': followers})
+
+        with patch('instabot.api.api.tqdm') as bar:
+            result = self.bot.api.get_total_followers_or_followings(
+                user_id, amount=4, filter_verified=True, filter_business=True, fields=['pk'])
+
+        assert result == [{'pk': 2}]
+        assert len(responses.calls) == 4
+        assert self.bot._user_infos.get('3')['is_business']
+        # The bar advances for every screened follower, not only the kept one
+        assert bar.call_args[1]['total'] == TEST_USERNAME_INFO_ITEM['follower_count']
+        pbar = bar.return_value.__enter__.return_value
+        assert sum(call[0][0] for call in pbar.update.call_args_list) == 4
+        assert pbar.set_postfix.call_args[0][0]['kept'] == 1
+
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_get_total_followers_filter_business_refetches_partial_info(self, patched_time_sleep):
+        user_id = 1234567890
+        responses.add(
+            responses.GET, '{api_url}users/{user_id}/info/'.format(
+                api_url=API_URL, user_id=user_id
+            ), status=200, json={'status': 'ok', 'user': TEST_USERNAME_INFO_ITEM})
+        follower = dict(TEST_FOLLOWER_ITEM, pk=1, is_private=False, is_verified=False)
+        self.bot._user_infos['1'] = {'pk': 1, 'username': 'test'}  # no `is_business`
+        responses.add(
+            responses.GET, '{api_url}users/1/info/'.format(api_url=API_URL), status=200,
+            json={'status': 'ok', 'user': dict(TEST_USERNAME_INFO_ITEM, pk=1, is_business=False)})
+        responses.add(
+            responses.GET, "{api_url}friendships/{user_id}/followers/?rank_token={rank_token}".format(
+                api_url=API_URL, user_id=user_id, rank_token=self.bot.api.rank_token),
+            status=200, json={'status': 'ok', 'big_list': False, 'next_max_id': None, 'users': [follower]})
+
+        result = self.bot.api.get_total_followers_or_followings(
+            user_id, amount=1, filter_business=True, fields=['pk'])
+
+        assert result == [{'pk': 1}]
+        assert len(responses.calls) == 3
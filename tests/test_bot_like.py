@@ -1,3 +1,4 @@
+import copy
 
 import pytest
 import responses
@@ -191,6 +192,41 @@ class TestBotGet(TestBot):
 
         assert self.bot.like(media_id, check_media=check_media) == expected
 
+    @responses.activate
+    @patch('time.sleep', return_value=None)
+    def test_like_fetches_media_info_once(self, patched_time_sleep):
+        media_id = 1234567890
+        self.bot._following = [1]
+        photo_item = copy.deepcopy(TEST_PHOTO_ITEM)
+        photo_item['has_liked'] = False
+        photo_item['like_count'] = self.bot.min_likes_to_like + 1
+        photo_item['user']['pk'] = self.bot.user_id + 1
+        username_info_item = copy.deepcopy(TEST_USERNAME_INFO_ITEM)
+        username_info_item['biography'] = 'instabot'
+        media_info_url = '{api_url}media/{media_id}/info/'.format(
+            api_url=API_URL, media_id=media_id)
+        responses.add(
+            responses.GET, media_info_url,
+            json={'status': 'ok', 'items': [photo_item]}, status=200)
+        responses.add(
+            responses.GET, '{api_url}media/{media_id}/comments/?'.format(
+                api_url=API_URL, media_id=media_id),
+            json={'status': 'ok', 'comments': [TEST_COMMENT_ITEM]}, status=200)
+        responses.add(
+            responses.GET, '{api_url}users/{user_id}/info/'.format(
+                api_url=API_URL, user_id=photo_item['user']['pk']),
+            json={'status': 'ok', 'user': username_info_item}, status=200)
+        responses.add(
+            responses.POST, '{api_url}media/{media_id}/like/'.format(
+                api_url=API_URL, media_id=media_id),
+            json={'status': 'ok'}, status=200)
+
+        self.bot.like(media_id)
+
+        media_info_calls = [call for call in responses.calls
+                            if call.request.url == media_info_url]
+        assert len(media_info_calls) == 1
+
     @pytest.mark.parametrize(
         'comment_id', [12345678901234567, '12345678901234567'])
     @responses.activate
@@ -937,3 +973,12 @@ class TestBotGet(TestBot):
         broken_items = self.bot.like_timeline()
         assert [] == broken_items
         assert self.bot.total['likes'] == liked_at_start + results_1
+
+    def test_like_hashtags_pages(self):
+        with patch.object(self.bot, 'crawl_hashtags', return_value=[]) as crawl, \
+                patch.object(self.bot, 'like_medias') as like_medias:
+            self.bot.like_hashtags(['tag_a', 'tag_b'])
+            crawl.assert_called_once_with(['tag_a', 'tag_b'], None, pages=1)
+            self.bot.like_hashtags(['tag_a', 'tag_b'], amount=30)
+            crawl.assert_called_with(['tag_a', 'tag_b'], 30, pages=None)
+            assert like_medias.call_count == 2
@@ -0,0 +1,174 @@
+import threading
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+import pytest
+import requests
+import responses
+
+from instabot import Bot
+from instabot.api.api import ApiResponse
+from instabot.api.config import API_URL
+from instabot.cache import ResponseCache, SQLiteCacheBackend, TTLCache
+
+
+class TestTTLCache:
+    def test_lru_eviction(self):
+        cache = TTLCache(max_entries=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        assert cache.get('a') == 1  # `a` is now the most recent
+        cache['c'] = 3
+
+        assert 'b' not in cache
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert len(cache) == 2
+
+    @patch('time.time')
+    def test_field_ttls(self, patched_time):
+        patched_time.return_value = 1000
+        cache = TTLCache(ttl=100, field_ttls={'follower_count': 10})
+        cache['1'] = {'username': 'test', 'follower_count': 5}
+
+        patched_time.return_value = 1050
+        assert cache.get('1') is None
+        assert cache.get('1', fields=['username']) == {'username': 'test', 'follower_count': 5}
+
+        patched_time.return_value = 1200
+        assert cache.get('1', fields=['username']) is None
+
+    def test_stats(self):
+        cache = TTLCache()
+        cache['a'] = 1
+        cache.get('a')
+        cache.get('b')
+
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+        assert stats['hit_rate'] == 0.5
+
+
+class TestSQLiteCacheBackend:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmpdir):
+        self.path = str(tmpdir.join('cache.db'))
+
+    def test_persistence(self):
+        backend = SQLiteCacheBackend(self.path, 'user_infos')
+        TTLCache(backend=backend)['1'] = {'username': 'test'}
+        backend.close()
+
+        cache = TTLCache(backend=SQLiteCacheBackend(self.path, 'user_infos'))
+        assert cache.get(1) == {'username': 'test'}
+        del cache['1']
+        assert cache.get('1') is None
+        cache.backend.close()
+
+
+class TestResponseCache:
+    def test_key_and_family(self):
+        cache = ResponseCache(ttls={'media_likers': 0})
+
+        assert cache.family('friendships/1/followers/?max_id=&rank_token=1_a') == 'followers'
+        assert cache.family('feed/timeline/') is None
+        assert cache.family('feed/tag/travel/?max_id=') is None  # Has `has_liked`
+        assert cache.family('media/1_2/likers/?') is None  # Disabled by `ttls`
+        key = cache.key('feed/tag/travel/?max_id=5&rank_token=1_a&ranked_content=true&')
+        assert key == cache.key('feed/tag/travel/?rank_token=2_b&ranked_content=true&max_id=5')
+        assert cache.key('feed/tag/travel/?max_id=5') != cache.key('feed/tag/travel/?max_id=6')
+
+    @patch('time.time')
+    def test_family_ttls(self, patched_time):
+        patched_time.return_value = 1000
+        cache = ResponseCache(ttls={'followers': 60})
+        calls = []
+
+        def request():
+            calls.append(1)
+            return ApiResponse(200, {'items': []}, result=True)
+
+        endpoint = 'friendships/1/followers/?max_id='
+        assert cache.fetch(endpoint, request).json == {'items': []}
+        assert cache.fetch(endpoint, request).ok
+        patched_time.return_value = 1100
+        cache.fetch(endpoint, request)
+        assert len(calls) == 2
+
+    def test_single_flight(self):
+        cache = ResponseCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def request():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return ApiResponse(200, {'user': {}}, result=True)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            cache.fetch('users/1/info/', request))) for _ in range(3)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        while cache.coalesced < 2:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert [response.json for response in results] == [{'user': {}}] * 3
+
+    @responses.activate
+    def test_shared_between_bots(self):
+        cache = ResponseCache()
+        bots = [Bot(response_cache=cache) for _ in range(2)]
+        for i, bot in enumerate(bots):
+            bot.api.is_logged_in = True
+            bot.api.session = requests_session = requests.Session()
+            requests_session.cookies.set('csrftoken', 'token')
+            requests_session.cookies.set('ds_user_id', str(i))
+            bot.api.set_user('user{}'.format(i), 'password')
+        responses.add(
+            responses.GET, '{}media/1/likers/'.format(API_URL),
+            json={'status': 'ok', 'users': [{'pk': 1}]}, status=200)
+
+        assert bots[0].api.get_media_likers(1)
+        assert bots[1].api.get_media_likers(1)
+        assert bots[1].api.last_json == {'status': 'ok', 'users': [{'pk': 1}]}
+        assert len(responses.calls) == 1
+        # A cache hit leaves the same kind of `last_response` as a request
+        for bot in bots:
+            last_response = bot.api.last_response
+            assert isinstance(last_response, requests.Response)
+            assert last_response.status_code == 200
+            assert last_response.json() == {'status': 'ok', 'users': [{'pk': 1}]}
+            assert 'users' in last_response.text
+        assert bots[0].api.get_timeline_feed() is False  # Not cached
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_skips_own_account(self):
+        bot = Bot(response_cache=ResponseCache())
+        bot.api.is_logged_in = True
+        bot.api.session = requests_session = requests.Session()
+        requests_session.cookies.set('csrftoken', 'token')
+        requests_session.cookies.set('ds_user_id', '1')
+        bot.api.set_user('user1', 'password')
+        for user_id in (1, 2):
+            responses.add(
+                responses.GET, '{}users/{}/info/'.format(API_URL, user_id),
+                json={'status': 'ok', 'user': {'pk': user_id}}, status=200)
+
+        for _ in range(2):
+            assert bot.api.get_username_info(1)
+            assert bot.api.get_username_info(2)
+
+        assert len(responses.calls) == 3
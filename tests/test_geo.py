@@ -0,0 +1,60 @@
+from instabot.geo import (LocationIndex, cell_bbox, cells_in_bbox, distance,
+                          geohash, radius_bbox)
+
+
+def location(pk, lat, lng):
+    return {'title': str(pk), 'location': {'pk': pk, 'lat': lat, 'lng': lng}}
+
+
+class TestGeo:
+    def test_geohash(self):
+        assert geohash(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+        south, west, north, east = cell_bbox('u4pruydqqvj')
+        assert south <= 57.64911 <= north and west <= 10.40744 <= east
+
+    def test_distance(self):
+        # Berlin - Paris
+        assert 877000 < distance(52.52, 13.405, 48.8566, 2.3522) < 878000
+
+    def test_cells_in_bbox_cover_the_box(self):
+        box = radius_bbox(52.52, 13.405, 1000)
+        cells = cells_in_bbox(*box)
+        assert len(cells) == len(set(cells))
+        for lat, lng in ((box[0], box[1]), (box[2], box[3]), (52.52, 13.405)):
+            assert geohash(lat, lng) in cells
+
+    def test_cells_in_bbox_limit(self):
+        box = radius_bbox(52.52, 13.405, 50000)
+        assert len(cells_in_bbox(*box, limit=26)) == 26
+
+
+class TestLocationIndex:
+    def setup(self):
+        self.index = LocationIndex()
+        self.index.add([location(1, 52.5200, 13.4050),
+                        location(2, 52.5210, 13.4050),  # 111 m north
+                        location(3, 52.5300, 13.4050),  # 1.1 km north
+                        {'title': 'No coordinates', 'location': {'pk': 4}}])
+
+    def test_radius_nearest_first(self):
+        found = self.index.radius(52.5209, 13.4050, 200)
+        assert [item['location']['pk'] for item in found] == [2, 1]
+
+    def test_bbox(self):
+        found = self.index.bbox(52.51, 13.40, 52.525, 13.41)
+        assert sorted(item['location']['pk'] for item in found) == [1, 2]
+        assert len(self.index) == 3
+
+    def test_missing_cells(self):
+        box = radius_bbox(52.52, 13.405, 100)
+        missing = self.index.missing_cells(*box)
+        assert missing
+        self.index.mark_searched(missing[:1])
+        assert self.index.missing_cells(*box) == missing[1:]
+
+    def test_searched_cells_expire(self):
+        index = LocationIndex(ttl=-1)
+        box = radius_bbox(52.52, 13.405, 100)
+        missing = index.missing_cells(*box)
+        index.mark_searched(missing)
+        assert index.missing_cells(*box) == missing
@@ -0,0 +1,29 @@
+from instabot.matcher import TermMatcher
+
+
+class TestTermMatcher:
+    def test_find(self):
+        matcher = TermMatcher(['shop', 'shopping', 'Free'])
+
+        assert matcher.find('FREE stuff') == 'FREE'
+        assert matcher.find('my shopping list') == 'shopping'
+        assert matcher.find('bestshop') == 'shop'
+        assert matcher.find('nothing here') is None
+        assert matcher.find(None) is None
+
+    def test_whole_words(self):
+        matcher = TermMatcher(['shop'], whole_words=True)
+
+        assert matcher.find('bestshop') is None
+        assert matcher.find('best shop!') == 'shop'
+
+    def test_hashtags(self):
+        matcher = TermMatcher(['#give', '#giveaway'])
+
+        assert matcher.find('join the #GiveAway') == '#GiveAway'
+        assert matcher.find('#give.') == '#give'
+        assert matcher.find('#giveaways #given') is None
+        assert matcher.find('give') is None
+
+    def test_no_terms(self):
+        assert TermMatcher([]).find('anything') is None
@@ -0,0 +1,69 @@
+import pytest
+
+from instabot import BotPool
+
+
+class TestBotPool:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmpdir):
+        self.base_path = str(tmpdir)
+        self.pool = BotPool(workers=2, base_path=self.base_path)
+        self.first = self.pool.add('first', proxy='127.0.0.1:8080')
+        self.second = self.pool.add('second', max_likes_per_day=1)
+        yield
+        self.pool.close()
+
+    def test_add(self):
+        assert len(self.pool) == 2
+        assert self.pool['first'].proxy == '127.0.0.1:8080'
+        assert self.first.followed_file.fname.startswith(self.base_path)
+        assert self.first.followed_file.fname != self.second.followed_file.fname
+        assert self.first._user_infos is self.second._user_infos
+        assert self.first.api.user_infos is self.pool.user_infos
+        assert self.first.logger.handlers == self.pool.handlers
+
+    def test_run_is_fair_and_respects_limits(self):
+        order = []
+
+        def action(bot, name):
+            order.append(name)
+            return name
+
+        for bot in (self.first, self.second):
+            bot.delays.update({'follow': 0, 'like': 0})
+        for i in range(3):
+            self.pool.schedule('first', 'follow', action, self.first, 'first {}'.format(i))
+        self.pool.schedule('second', 'follow', action, self.second, 'second')
+        self.second.total['likes'] = 1
+        self.pool.schedule('second', 'like', action, self.second, 'second like')
+
+        results = self.pool.run()
+
+        assert [result for _, result in results['first']] == ['first 0', 'first 1', 'first 2']
+        assert results['second'] == [('like', False), ('follow', 'second')] or \
+            results['second'] == [('follow', 'second'), ('like', False)]
+        assert order.index('second') < order.index('first 1')
+        assert self.pool.pending() == 0
+
+    def test_run_records_failed_action(self):
+        def fail():
+            raise ValueError('boom')
+
+        for bot in (self.first, self.second):
+            bot.delays['follow'] = 0
+        self.pool.schedule('first', 'follow', fail)
+        self.pool.schedule('first', 'follow', lambda: 'first')
+        self.pool.schedule('second', 'follow', lambda: 'second')
+
+        results = self.pool.run()
+
+        assert results['first'] == [('follow', False), ('follow', 'first')]
+        assert results['second'] == [('follow', 'second')]
+
+    def test_memory_report(self):
+        report = self.pool.memory_report()
+
+        assert set(report['accounts']) == {'first', 'second'}
+        assert all(size > 0 for size in report['accounts'].values())
+        assert report['shared'] > 0
+        assert report['per_account'] > 0
@@ -0,0 +1,102 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from instabot import Bot
+from instabot.storage import SQLiteStorage, open_storage
+
+
+class TestSQLiteStorage:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmpdir):
+        self.folder = str(tmpdir)
+        self.path = os.path.join(self.folder, 'state.db')
+        self.storage = open_storage('sqlite:///' + self.path)
+        yield
+        self.storage.close()
+
+    def test_open_storage(self):
+        assert isinstance(self.storage, SQLiteStorage)
+        assert open_storage(None) is None
+        with pytest.raises(ValueError):
+            open_storage('redis://localhost')
+
+    def test_append_remove(self):
+        followed = self.storage.table('followed', verbose=False)
+        followed.append(1)
+        followed.append('2', metadata={'source': 'test'})
+        followed.append(1)
+
+        assert followed.list == ['1', '2']
+        assert followed.set == {'1', '2'}
+        assert '1' in followed
+        assert len(followed) == 2
+
+        followed.remove(1)
+        assert followed.list == ['2']
+        assert followed.random() == '2'
+
+        followed.remove('2')
+        with pytest.raises(IndexError):
+            followed.random()
+
+    def test_difference(self):
+        skipped = self.storage.table('skipped', verbose=False)
+        skipped.append('1')
+        skipped.append('3')
+
+        assert skipped.difference(['1', '2', '3', '4']) == {'2', '4'}
+        assert skipped.difference([]) == set()
+
+    def test_import_file(self):
+        fname = os.path.join(self.folder, 'followed.txt')
+        with open(fname, 'w') as f:
+            f.write('1\n2\n\n3\n')
+
+        assert self.storage.import_file('followed', fname) == 3
+        assert self.storage.import_file('followed', fname) == 0
+        assert self.storage.table('followed').list == ['1', '2', '3']
+        # The same list seen through another path isn't imported again
+        moved = os.path.join(self.folder, 'moved.txt')
+        shutil.copy(fname, moved)
+        assert self.storage.import_file('followed', moved) == 0
+        assert self.storage.table('followed').list == ['1', '2', '3']
+
+    def test_append_from_several_connections(self):
+        # Each connection stands for a bot process on the same database
+        storages = [SQLiteStorage(self.path) for _ in range(4)]
+        barrier = threading.Barrier(len(storages)) if hasattr(threading, 'Barrier') else None
+
+        def append(storage):
+            if barrier is not None:
+                barrier.wait()
+            for item in range(20):
+                storage.table('followed', verbose=False).append(item)
+        threads = [threading.Thread(target=append, args=(storage,)) for storage in storages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for storage in storages:
+            storage.close()
+
+        assert self.storage.table('followed').list == [str(item) for item in range(20)]
+
+    def test_bot_storage(self):
+        fname = os.path.join(self.folder, 'followed.txt')
+        with open(fname, 'w') as f:
+            f.write('1\n2\n')
+        for processed_filter in (None, os.path.join(self.folder, 'processed.bloom')):
+            bot = Bot(storage='sqlite:///' + self.path, followed_file=fname,
+                      processed_filter=processed_filter)
+            try:
+                # Imported once, the second bot sees what the first one added
+                assert bot.followed_file.list[:2] == ['1', '2']
+                bot.followed_file.append('3')
+                assert '3' in bot.followed_file
+                assert bot.followed_file.difference(['2', '3', '4']) == {'4'}
+                assert self.storage.table('followed').list == ['1', '2', '3']
+            finally:
+                bot.storage.close()
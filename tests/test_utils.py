@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from instabot import utils
+
+
+class TestFile:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmpdir):
+        self.folder = str(tmpdir)
+        self.fname = os.path.join(self.folder, 'followed.txt')
+        self.file = utils.file(self.fname, verbose=False)
+        yield
+        self.file.close()
+
+    def test_append(self):
+        self.file.append(1)
+        self.file.append('2')
+        self.file.append(1)
+
+        assert self.file.list == ['1', '2']
+        assert self.file.set == {'1', '2'}
+        assert 1 in self.file
+        assert len(self.file) == 2
+        assert utils.file(self.fname).list == ['1', '2']
+
+    def test_remove_writes_tombstone(self):
+        for item in ('1', '2', '3'):
+            self.file.append(item)
+        self.file.remove(2)
+
+        assert self.file.list == ['1', '3']
+        with open(self.fname) as f:
+            assert f.read().split() == ['1', '2', '3']
+        assert utils.file(self.fname).list == ['1', '3']
+
+    def test_remove_then_append_again(self):
+        self.file.append('1')
+        self.file.remove('1')
+        self.file.append('1')
+
+        assert self.file.list == ['1']
+        assert utils.file(self.fname).list == ['1']
+
+    def test_compact(self):
+        for item in ('1', '2', '3'):
+            self.file.append(item)
+        self.file.remove('1')
+        self.file.compact()
+
+        with open(self.fname) as f:
+            assert f.read().split() == ['2', '3']
+        assert not os.path.exists(self.file.tombstones_fname)
+        assert self.file.list == ['2', '3']
+
+    def test_background_compaction_replaces_file(self):
+        f = utils.file(self.fname, verbose=False, compact_threshold=1)
+        for item in ('1', '2'):
+            f.append(item)
+        f.remove('1')
+        assert not f._compaction.daemon
+        f.close()  # Waits for the compaction
+
+        with open(self.fname) as fh:
+            assert fh.read().split() == ['2']
+        assert not os.path.exists(self.fname + '.tmp')
+        assert not os.path.exists(f.tombstones_fname)
+
+    def test_reload_on_external_change(self):
+        self.file.append('1')
+        with open(self.fname, 'a') as f:
+            f.write('22\n')
+
+        assert self.file.list == ['1', '22']
+
+    def test_tombstones_dropped_when_file_rewritten(self):
+        self.file.append('111')
+        self.file.remove('111')
+        self.file.close()
+        with open(self.fname, 'w') as f:
+            f.write('111\n222\n')
+
+        assert utils.file(self.fname, verbose=False).list == ['111', '222']
+        assert not os.path.exists(self.file.tombstones_fname)
+
+    def test_tombstones_kept_across_own_appends(self):
+        for item in ('1', '2', '1'):
+            self.file.append(item, allow_duplicates=True)
+        self.file.remove('1')
+        self.file.append('3')
+
+        assert self.file.list == ['2', '1', '3']
+        assert utils.file(self.fname, verbose=False).list == ['2', '1', '3']